@@ -2,6 +2,7 @@
 
 import copy
 
+from regolith.chained_db import LazyChainDB
 from regolith.database import dump_database, open_dbs
 from regolith.runcontrol import DEFAULT_RC, filter_databases, load_rcfile
 from regolith.storage import push, store_client
@@ -38,7 +39,9 @@ class Broker:
             self.store = sclient
         rc.client = open_dbs(rc)
         self._dbs = rc.client.dbs
-        self.md = rc.client.chained_db
+        # documents are changed in place by add_file, so they must write
+        # through to the databases rather than to a merged copy
+        self.md = LazyChainDB(rc.client, rc.databases, materialize=False)
         self.db_client = rc.client
 
     def add_file(self, document, name, filepath):
@@ -58,6 +61,8 @@ class Broker:
             document["files"] = {}
         document["files"][name] = output_path
         for db in self.rc.databases:
+            # the owning collection is not known, so write everything back
+            self.db_client.mark_dirty(db["name"])
             dump_database(db, self.db_client, self.rc)
         push(self.store.store, self.store.path)
 
@@ -15,6 +15,7 @@ from regolith.stylers import month_fullnames, sentencecase
 from regolith.tools import (
     all_docs_from_collection,
     awards,
+    collection_citation_index,
     filter_activities,
     filter_committees,
     filter_employment_for_advisees,
@@ -27,9 +28,10 @@ from regolith.tools import (
     filter_publications,
     filter_service,
     fuzzy_retrieval,
-    get_id_from_name,
+    get_id_from_collection,
     make_bibtex_file,
     merge_collections_all,
+    retrieve_from_collection,
 )
 
 
@@ -87,7 +89,7 @@ class ActivitylogBuilder(LatexBuilderBase):
             raise RuntimeError("ERROR: please rerun specifying --people name")
         if not rc.from_date:
             raise RuntimeError("ERROR: please rerun specifying --from")
-        build_target = get_id_from_name(all_docs_from_collection(rc.client, "people"), rc.people[0])
+        build_target = get_id_from_collection(rc.client, "people", rc.people[0])
         begin_year = int(rc.from_date.split("-")[0])
         begin_period = date_parser.parse(rc.from_date).date()
         pre_begin_period = begin_period - relativedelta(years=1)
@@ -162,7 +164,7 @@ class ActivitylogBuilder(LatexBuilderBase):
             )
 
             for person in g.get("team", []):
-                rperson = fuzzy_retrieval(self.gtx["people"], ["aka", "name"], person["name"])
+                rperson = retrieve_from_collection(rc.client, "people", ["aka", "name"], person["name"])
                 if rperson:
                     person["name"] = rperson["name"]
             if g.get("budget"):
@@ -180,7 +182,7 @@ class ActivitylogBuilder(LatexBuilderBase):
         pending_grants = [g for g in self.gtx["proposals"] if is_pending(g["status"])]
         for g in pending_grants:
             for person in g["team"]:
-                rperson = fuzzy_retrieval(self.gtx["people"], ["aka", "name"], person["name"])
+                rperson = retrieve_from_collection(rc.client, "people", ["aka", "name"], person["name"])
                 if rperson:
                     person["name"] = rperson["name"]
         pending_grants, _, _ = filter_grants(pending_grants, {pi["name"]}, pi=False, multi_pi=True)
@@ -189,7 +191,7 @@ class ActivitylogBuilder(LatexBuilderBase):
         declined_proposals = [g for g in self.gtx["proposals"] if is_declined(g["status"])]
         for g in declined_proposals:
             for person in g["team"]:
-                rperson = fuzzy_retrieval(self.gtx["people"], ["aka", "name"], person["name"])
+                rperson = retrieve_from_collection(rc.client, "people", ["aka", "name"], person["name"])
                 if rperson:
                     person["name"] = rperson["name"]
         declined_proposals, _, _ = filter_grants(declined_proposals, {pi["name"]}, pi=False, multi_pi=True)
@@ -344,7 +346,7 @@ class ActivitylogBuilder(LatexBuilderBase):
         ########################
         names = frozenset(me.get("aka", []) + [me["name"]])
         pubs = filter_publications(
-            all_docs_from_collection(rc.client, "citations"), names, reverse=True, bold=False, since=begin_period
+            collection_citation_index(rc.client), names, reverse=True, bold=False, since=begin_period
         )
         # remove unpublished papers
         # unpubs = [pub for pub in pubs if len(pub.get("doi") == 0)]
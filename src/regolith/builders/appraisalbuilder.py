@@ -11,6 +11,7 @@ from regolith.stylers import month_fullnames, sentencecase
 from regolith.tools import (
     all_docs_from_collection,
     awards,
+    collection_citation_index,
     filter_activities,
     filter_employment_for_advisees,
     filter_facilities,
@@ -258,7 +259,7 @@ class AppraisalBuilder(LatexBuilderBase):
         ########################
         names = frozenset(me.get("aka", []) + [me["name"]])
         pubs = filter_publications(
-            all_docs_from_collection(rc.client, "citations"), names, reverse=True, bold=False, since=begin_period
+            collection_citation_index(rc.client), names, reverse=True, bold=False, since=begin_period
         )
         bibfile = make_bibtex_file(pubs, pid=me["_id"], person_dir=self.bldir)
         articles = [prc for prc in pubs if prc.get("entrytype") in "article"]
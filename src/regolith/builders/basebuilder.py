@@ -1,10 +1,15 @@
 """Builder Base Classes."""
 
+import hashlib
+import json
 import os
+import shutil
+import subprocess as sp
+import time
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 from itertools import groupby
 
-from jinja2 import Environment, FileSystemLoader
 from xonsh.api import subprocess
 
 try:
@@ -15,9 +20,225 @@ try:
 except ImportError:
     HAVE_BIBTEX_PARSER = False
 
+from jinja2 import meta
+
+from regolith.chained_db import _convert_to_dict
 from regolith.sorters import category_val, date_key, doc_date_key, level_val
+from regolith.templating import shared_environment
 from regolith.tools import LATEX_OPTS, date_to_rfc822, gets, latex_safe, latex_safe_url, month_and_year, rfc822now
 
+# the directory, inside the build directory, that the latex runs write to
+LATEX_SCRATCH = "_latex"
+# the directory, inside rc.builddir, of the build manifests
+MANIFEST_DIR = "_manifest"
+
+
+def file_digest(path):
+    """The SHA-256 hash of the content of a file."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def sync_dir(src, dst):
+    """Makes a directory a copy of another one, only copying the files
+    whose content differs and removing the files that are not in the
+    source.
+
+    Returns
+    -------
+    copied : list of str
+        The paths, relative to ``dst``, of the files that were copied
+    """
+    copied = []
+    wanted = set()
+    for dirpath, dirnames, filenames in os.walk(src):
+        rel = os.path.relpath(dirpath, src)
+        os.makedirs(os.path.join(dst, rel), exist_ok=True)
+        for fname in filenames:
+            relname = os.path.normpath(os.path.join(rel, fname))
+            wanted.add(relname)
+            s, d = os.path.join(src, relname), os.path.join(dst, relname)
+            if os.path.isfile(d) and os.path.getsize(s) == os.path.getsize(d) and file_digest(s) == file_digest(d):
+                continue
+            shutil.copy2(s, d)
+            copied.append(relname)
+    for dirpath, dirnames, filenames in os.walk(dst, topdown=False):
+        rel = os.path.relpath(dirpath, dst)
+        for fname in filenames:
+            if os.path.normpath(os.path.join(rel, fname)) not in wanted:
+                os.remove(os.path.join(dirpath, fname))
+        if dirpath != dst and not os.listdir(dirpath) and not os.path.isdir(os.path.join(src, rel)):
+            os.rmdir(dirpath)
+    return copied
+
+
+class BuildManifest:
+    """The hashes of the files a builder wrote in its previous builds.
+
+    Each output file is recorded with the hash of its content and its
+    modification time and size, so a file that was changed or removed
+    since is not mistaken for the recorded one. The PDF of a latex file is
+    recorded with the hash of the sources it was compiled from, and a page
+    with the hashes of the documents it was rendered from.
+
+    Parameters
+    ----------
+    filename : str
+        The JSON file the manifest is kept in
+    root : str
+        The directory the recorded paths are relative to
+    """
+
+    def __init__(self, filename, root):
+        self.filename = filename
+        self.root = root
+        try:
+            with open(filename, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.outputs = data.get("outputs", {})
+        self.pdfs = data.get("pdfs", {})
+        self.pages = data.get("pages", {})
+
+    def _key(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def intact(self, path):
+        """Whether a file is still the one that was recorded."""
+        entry = self.outputs.get(self._key(path))
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return entry is not None and [st.st_mtime_ns, st.st_size] == entry["stat"]
+
+    def unchanged(self, path, digest):
+        """Whether a file still has the recorded content, and that content
+        has the given hash."""
+        entry = self.outputs.get(self._key(path))
+        return entry is not None and entry["hash"] == digest and self.intact(path)
+
+    def record(self, path, digest):
+        """Records the hash of a file that was just written."""
+        st = os.stat(path)
+        self.outputs[self._key(path)] = {"hash": digest, "stat": [st.st_mtime_ns, st.st_size]}
+
+    def _pdf(self, path):
+        entry = self.pdfs.get(self._key(path))
+        return entry if isinstance(entry, dict) else {}
+
+    def pdf_inputs(self, path):
+        """The files, relative to the directory of a PDF, that latex read
+        when the PDF was last compiled."""
+        return self._pdf(path).get("inputs", [])
+
+    def pdf_current(self, path, source_digest):
+        """Whether a PDF was compiled from sources with the given hash and
+        is still on disk as it was."""
+        return self._pdf(path).get("digest") == source_digest and self.intact(path)
+
+    def record_pdf(self, path, source_digest, inputs=()):
+        """Records a PDF that was just compiled, with the hash of its
+        sources and the files latex read to compile it."""
+        self.record(path, file_digest(path))
+        self.pdfs[self._key(path)] = {"digest": source_digest, "inputs": sorted(inputs)}
+
+    def page_current(self, path, record):
+        """Whether a page was rendered from the inputs of a page record, and
+        it and the other files written with it are still on disk as they
+        were."""
+        entry = self.pages.get(self._key(path))
+        if entry is None or entry["inputs"] != record["inputs"] or entry["key"] != record["key"]:
+            return False
+        return self.intact(path) and all(self.intact(os.path.join(self.root, f)) for f in entry["outputs"])
+
+    def record_page(self, path, record, outputs=()):
+        """Records the inputs a page was just rendered from, along with the
+        other files that were written with it."""
+        self.pages[self._key(path)] = dict(record, outputs=[self._key(f) for f in outputs])
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"outputs": self.outputs, "pdfs": self.pdfs, "pages": self.pages}, f, sort_keys=True)
+        os.replace(tmp, self.filename)
+
+
+def compile_latex(bldir, base):
+    """Compiles a latex file of a build directory to PDF.
+
+    The latex run writes its auxiliary files to a scratch directory of its
+    own, so that several files of the same build directory may be compiled
+    at once, and only the PDF is put in the build directory. Relative paths
+    in the latex file are still resolved from the build directory. The
+    files latex read are taken from its recorder file.
+
+    Parameters
+    ----------
+    bldir : str
+        The build directory
+    base : str
+        The name of the latex file, without its extension
+
+    Returns
+    -------
+    seconds : float
+        How long the compilation took
+    error : str or None
+        The output of the command that failed, or None on success
+    inputs : list of str
+        The files of the build directory that latex read, relative to it
+    """
+    start = time.perf_counter()
+    scratch = os.path.join(os.path.abspath(bldir), LATEX_SCRATCH, base)
+    os.makedirs(scratch, exist_ok=True)
+    opts = LATEX_OPTS + ["-interaction=nonstopmode", "-recorder", "-output-directory=" + scratch, base + ".tex"]
+    if os.name == "nt":
+        cmds = [["pdflatex"] + opts]
+    else:
+        cmds = [["latex"] + opts, ["dvipdf", os.path.join(scratch, base + ".dvi"), base + ".pdf"]]
+    error = None
+    inputs = []
+    try:
+        # xonsh runs commands by changing the working directory of the whole
+        # process, which concurrent runs cannot share
+        for cmd in cmds:
+            sp.run(cmd, cwd=bldir, check=True, stdin=sp.DEVNULL, stdout=sp.PIPE, stderr=sp.STDOUT, text=True)
+        if os.name == "nt":
+            os.replace(os.path.join(scratch, base + ".pdf"), os.path.join(bldir, base + ".pdf"))
+        inputs = recorded_inputs(os.path.join(scratch, base + ".fls"), bldir)
+    except sp.CalledProcessError as e:
+        error = e.output
+    except OSError as e:
+        error = str(e)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return time.perf_counter() - start, error, inputs
+
+
+def recorded_inputs(filename, bldir):
+    """The files of a build directory that a latex run read, according to
+    the file written by its ``-recorder`` option, relative to the build
+    directory. Files of the latex scratch directory are left out, and so
+    is everything if the file cannot be read."""
+    root = os.path.abspath(bldir)
+    inputs = set()
+    try:
+        with open(filename, encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    for line in lines:
+        if not line.startswith("INPUT "):
+            continue
+        rel = os.path.relpath(os.path.join(root, line[len("INPUT ") :]), root)
+        if rel.startswith(os.pardir) or rel.split(os.sep)[0] == LATEX_SCRATCH:
+            continue
+        inputs.add(rel.replace(os.sep, "/"))
+    return sorted(inputs)
+
 
 class BuilderBase(object):
     """Base class for builders."""
@@ -27,17 +248,10 @@ class BuilderBase(object):
         self.bldir = os.path.join(rc.builddir, self.btype)
         # allow subclasses to override
         if not hasattr(self, "env"):
-            self.env = Environment(
-                loader=FileSystemLoader(
-                    [
-                        "templates",
-                        os.path.join(
-                            os.path.dirname(os.path.dirname(__file__)),
-                            "templates",
-                        ),
-                    ]
-                )
-            )
+            self.env = shared_environment(rc)
+        self.manifest = BuildManifest(os.path.join(rc.builddir, MANIFEST_DIR, self.btype + ".json"), rc.builddir)
+        self._doc_digests = {}
+        self._template_digests = {}
         self.gtx = {}
         self.construct_global_ctx()
         self.cmds = []
@@ -79,15 +293,124 @@ class BuilderBase(object):
         ctx["static"] = ctx.get("static", os.path.relpath("static", os.path.dirname(fname)))
         ctx["root"] = ctx.get("root", os.path.relpath("/", os.path.dirname(fname)))
         result = template.render(ctx)
-        with open(os.path.join(self.bldir, fname), "wt", encoding="utf-8") as f:
-            f.write(result)
+        self.write(fname, result)
+
+    def doc_digest(self, collname, doc):
+        """The hash of the content of a document, computed once per build."""
+        key = (collname, doc["_id"])
+        if key not in self._doc_digests:
+            text = json.dumps(_convert_to_dict(doc), sort_keys=True, default=str)
+            self._doc_digests[key] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return self._doc_digests[key]
+
+    def collection_digest(self, collname, docs):
+        """The hash of the content of all the documents of a collection."""
+        h = hashlib.sha256()
+        for doc in sorted(docs, key=lambda d: str(d["_id"])):
+            h.update(self.doc_digest(collname, doc).encode("ascii"))
+        return h.hexdigest()
+
+    def template_digest(self, tname):
+        """The hash of the source of a template and of every template it
+        extends, includes or imports."""
+        if tname not in self._template_digests:
+            h = hashlib.sha256()
+            seen, todo = set(), [tname]
+            while todo:
+                name = todo.pop()
+                if name in seen:
+                    continue
+                seen.add(name)
+                source = self.env.loader.get_source(self.env, name)[0]
+                h.update(name.encode("utf-8") + b"\0" + source.encode("utf-8"))
+                todo.extend(sorted(n for n in meta.find_referenced_templates(self.env.parse(source)) if n))
+            self._template_digests[tname] = h.hexdigest()
+        return self._template_digests[tname]
+
+    def page_record(self, tname, inputs, **values):
+        """Describes what a page is rendered from, to tell whether it needs
+        to be rendered again.
+
+        Parameters
+        ----------
+        tname : str
+            Template name
+        inputs : iterable of (str, dict)
+            The collection and the document of every document the page is
+            rendered from
+        values : dict
+            Any other values the page depends on. They must be JSON
+            serializable, or have a stable string form.
+
+        Returns
+        -------
+        record : dict
+            The hash of each input, keyed by ``<collection>/<_id>``, and the
+            hash of the template and the other values
+        """
+        key = json.dumps([self.template_digest(tname), values], sort_keys=True, default=str)
+        return {
+            "inputs": {f"{collname}/{doc['_id']}": self.doc_digest(collname, doc) for collname, doc in inputs},
+            "key": hashlib.sha256(key.encode("utf-8")).hexdigest(),
+        }
+
+    def page_unchanged(self, fname, record):
+        """Whether a page of the build directory was rendered from the same
+        inputs in a previous build and is still as it was then."""
+        return self.manifest.page_current(os.path.join(self.bldir, fname), record)
+
+    def record_page(self, fname, record, outputs=()):
+        """Records the inputs a page of the build directory was just
+        rendered from.
+
+        Parameters
+        ----------
+        fname : str
+            File name of the page, relative to the build directory
+        record : dict
+            The page record, from ``page_record``
+        outputs : iterable of str, optional
+            Other files written along with the page, relative to the build
+            directory. The page is rendered again if any of them changes.
+        """
+        paths = [os.path.join(self.bldir, f) for f in outputs]
+        for path in paths:
+            if not self.manifest.intact(path):
+                self.manifest.record(path, file_digest(path))
+        self.manifest.record_page(os.path.join(self.bldir, fname), record, paths)
+
+    def write(self, fname, text):
+        """Writes text to a file of the build directory, unless the file
+        already has that content from a previous build, in which case it is
+        left as it is, with its modification time.
+
+        Parameters
+        ----------
+        fname : str
+            File name, relative to the build directory
+        text : str
+            The content of the file
+        """
+        path = os.path.join(self.bldir, fname)
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if self.manifest.unchanged(path, digest):
+            return
+        with open(path, "wt", encoding="utf-8") as f:
+            f.write(text)
+        # the hash of the text, as a file written in text mode may have other
+        # line endings
+        self.manifest.record(path, digest)
 
     def build(self):
         """Build the thing that is being built, note this runs all
         commands listed in ``self.cmds``"""
         os.makedirs(self.bldir, exist_ok=True)
-        for cmd in self.cmds:
-            getattr(self, cmd)()
+        try:
+            for cmd in self.cmds:
+                getattr(self, cmd)()
+        finally:
+            # the files written before a failure are still worth recording
+            self.manifest.save()
 
 
 class LatexBuilderBase(BuilderBase):
@@ -95,7 +418,8 @@ class LatexBuilderBase(BuilderBase):
 
     def __init__(self, rc):
         super().__init__(rc)
-        self.cmds = ["latex", "clean"]
+        self.cmds = ["latex", "compile", "clean"]
+        self.pdf_queue = []
         if HAVE_BIBTEX_PARSER:
             self.bibdb = BibDatabase()
             self.bibwriter = BibTexWriter()
@@ -111,14 +435,95 @@ class LatexBuilderBase(BuilderBase):
         """Run command in build dir."""
         subprocess.run(cmd, cwd=self.bldir, check=True)
 
+    def build(self):
+        super().build()
+        # in case the commands of a subclass do not compile
+        if self.pdf_queue:
+            self.compile()
+            self.manifest.save()
+
     def pdf(self, base):
-        """Compiles latex files to PDF."""
-        if self.rc.pdf:
-            if os.name == "nt":
-                self.run(["pdflatex"] + LATEX_OPTS + [base + ".tex"])
+        """Queues a latex file to be compiled to PDF by ``compile``."""
+        if self.rc.pdf and base not in self.pdf_queue:
+            self.pdf_queue.append(base)
+
+    def compile(self):
+        """Compiles the queued latex files to PDF concurrently.
+
+        Files whose PDF was compiled from the same sources in a previous
+        build, according to the build manifest, are skipped. The number of
+        files compiled at once is ``rc.latex_jobs``, the number of CPUs by
+        default. The time taken by each file is printed, and the output of
+        the files that failed is printed once all of them are done.
+
+        Raises
+        ------
+        RuntimeError
+            If any of the files failed to compile
+        """
+        queue = []
+        for base in self.pdf_queue:
+            digest = self.source_digest(base, self.manifest.pdf_inputs(self._pdf_path(base)))
+            if digest is not None and self.manifest.pdf_current(self._pdf_path(base), digest):
+                print(f"{base}.pdf is up to date")
             else:
-                self.run(["latex"] + LATEX_OPTS + [base + ".tex"])
-                self.run(["dvipdf", base])
+                queue.append(base)
+        self.pdf_queue = []
+        if not queue:
+            return
+        jobs = min(self.rc._get("latex_jobs") or os.cpu_count() or 1, len(queue))
+        failed = []
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            results = pool.map(lambda base: compile_latex(self.bldir, base), queue)
+            for base, (seconds, error, inputs) in zip(queue, results):
+                if error is None:
+                    print(f"compiled {base}.pdf in {seconds:.1f}s")
+                    digest = self.source_digest(base, inputs)
+                    if digest is not None:
+                        self.manifest.record_pdf(self._pdf_path(base), digest, inputs)
+                else:
+                    print(f"failed to compile {base}.tex after {seconds:.1f}s")
+                    failed.append((base, error))
+        shutil.rmtree(os.path.join(self.bldir, LATEX_SCRATCH), ignore_errors=True)
+        if failed:
+            for base, error in failed:
+                print(f"{base}.tex:\n{error}")
+            raise RuntimeError("failed to compile {}".format(", ".join(base + ".tex" for base, _ in failed)))
+
+    def _pdf_path(self, base):
+        return os.path.join(self.bldir, base + ".pdf")
+
+    def source_digest(self, base, inputs=()):
+        """The hash of a latex file of the build directory together with
+        the bibliography files of the build directory that it names and the
+        other files it read when it was last compiled, or None if the latex
+        file cannot be read.
+
+        Parameters
+        ----------
+        base : str
+            The name of the latex file, without its extension
+        inputs : list of str, optional
+            The files latex read, relative to the build directory, as
+            recorded in the build manifest
+        """
+        try:
+            with open(os.path.join(self.bldir, base + ".tex"), "rb") as f:
+                source = f.read()
+        except OSError:
+            return None
+        h = hashlib.sha256(source)
+        for bib in sorted(glob(os.path.join(self.bldir, "*.bib"))):
+            if os.path.splitext(os.path.basename(bib))[0].encode("utf-8") in source:
+                h.update(file_digest(bib).encode("ascii"))
+        for name in inputs:
+            h.update(name.encode("utf-8"))
+            try:
+                h.update(file_digest(os.path.join(self.bldir, name)).encode("ascii"))
+            except OSError:
+                # a file that went missing changes the hash too
+                h.update(b"missing")
+        return h.hexdigest()
 
     def clean(self):
         """Remove files created by latex."""
@@ -18,7 +18,12 @@ from nameparser import HumanName
 from regolith.builders.basebuilder import BuilderBase
 from regolith.dates import get_dates, is_after, month_to_int
 from regolith.sorters import position_key
-from regolith.tools import all_docs_from_collection, filter_publications, fuzzy_retrieval
+from regolith.tools import (
+    all_docs_from_collection,
+    collection_citation_index,
+    filter_publications,
+    retrieve_from_collection,
+)
 
 NUM_COAUTHOR_MONTHS = 48
 NUM_POSTDOC_MONTHS = None
@@ -145,15 +150,17 @@ def get_coauthors_from_pubs(rc, pubs, not_person):
 def retrieve_names_and_insts(rc, collabs, not_person_akas=[]):
     collab_buffer, my_collab_set = [], []
     for collab in collabs:
-        person = fuzzy_retrieval(
-            all_docs_from_collection(rc.client, "people"),
+        person = retrieve_from_collection(
+            rc.client,
+            "people",
             ["name", "aka", "_id"],
             collab["name"],
             case_sensitive=False,
         )
         if not person:
-            person = fuzzy_retrieval(
-                all_docs_from_collection(rc.client, "contacts"),
+            person = retrieve_from_collection(
+                rc.client,
+                "contacts",
                 ["name", "aka", "_id"],
                 collab["name"],
                 case_sensitive=False,
@@ -175,8 +182,9 @@ def retrieve_names_and_insts(rc, collabs, not_person_akas=[]):
             print("missing_person", person)
         collab["_id"] = person.get("_id")
         pinst = get_recent_org(person)
-        inst = fuzzy_retrieval(
-            all_docs_from_collection(rc.client, "institutions"),
+        inst = retrieve_from_collection(
+            rc.client,
+            "institutions",
             ["name", "aka", "_id"],
             pinst,
             case_sensitive=False,
@@ -212,15 +220,17 @@ def query_people_and_institutions(rc, names):
     """Get the people and institutions names."""
     people, institutions, latest_active = [], [], []
     for person_name in names:
-        person_found = fuzzy_retrieval(
-            all_docs_from_collection(rc.client, "people"),
+        person_found = retrieve_from_collection(
+            rc.client,
+            "people",
             ["name", "aka", "_id"],
             person_name[0],
             case_sensitive=False,
         )
         if not person_found:
-            person_found = fuzzy_retrieval(
-                all_docs_from_collection(rc.client, "contacts"),
+            person_found = retrieve_from_collection(
+                rc.client,
+                "contacts",
                 ["name", "aka", "_id"],
                 person_name[0],
                 case_sensitive=False,
@@ -231,8 +241,9 @@ def query_people_and_institutions(rc, names):
                 )
             else:
                 people.append(person_found["name"])
-                inst = fuzzy_retrieval(
-                    all_docs_from_collection(rc.client, "institutions"),
+                inst = retrieve_from_collection(
+                    rc.client,
+                    "institutions",
                     ["name", "aka", "_id"],
                     person_found["institution"],
                     case_sensitive=False,
@@ -245,8 +256,9 @@ def query_people_and_institutions(rc, names):
         else:
             people.append(person_found["name"])
             pinst = get_recent_org(person_found)
-            inst = fuzzy_retrieval(
-                all_docs_from_collection(rc.client, "institutions"),
+            inst = retrieve_from_collection(
+                rc.client,
+                "institutions",
                 ["name", "aka", "_id"],
                 pinst,
                 case_sensitive=False,
@@ -269,8 +281,9 @@ def get_inst_name(person, rc):
         person_inst_abbr = person.get("institution")
     else:
         person_inst_abbr = ""
-    person_inst = fuzzy_retrieval(
-        all_docs_from_collection(rc.client, "institutions"),
+    person_inst = retrieve_from_collection(
+        rc.client,
+        "institutions",
         ["name", "aka", "_id"],
         person_inst_abbr,
         case_sensitive=False,
@@ -303,8 +316,9 @@ def format_last_first_institution_names(rc, ppl_names, excluded_inst_name=None):
     """Get the last name, first name and institution name."""
     ppl = []
     for ppl_tup in ppl_names:
-        inst = fuzzy_retrieval(
-            all_docs_from_collection(rc.client, "institutions"),
+        inst = retrieve_from_collection(
+            rc.client,
+            "institutions",
             ["aka", "name", "_id"],
             ppl_tup[1],
             case_sensitive=False,
@@ -382,13 +396,13 @@ def unmerge(ws, cells):
 
 def get_person(person_id, rc):
     """Get the person's name."""
-    person_found = fuzzy_retrieval(
-        all_docs_from_collection(rc.client, "people"), ["name", "aka", "_id"], person_id, case_sensitive=False
+    person_found = retrieve_from_collection(
+        rc.client, "people", ["name", "aka", "_id"], person_id, case_sensitive=False
     )
     if person_found:
         return person_found
-    person_found = fuzzy_retrieval(
-        all_docs_from_collection(rc.client, "contacts"), ["name", "aka", "_id"], person_id, case_sensitive=False
+    person_found = retrieve_from_collection(
+        rc.client, "contacts", ["name", "aka", "_id"], person_id, case_sensitive=False
     )
     if not person_found:
         print("WARNING: {} missing from people and contacts. Check aka.".format(person_id))
@@ -459,7 +473,7 @@ class RecentCollaboratorsBuilder(BuilderBase):
             reverse=True,
         )
         gtx["institutions"] = all_docs_from_collection(rc.client, "institutions")
-        gtx["citations"] = all_docs_from_collection(rc.client, "citations")
+        gtx["citations"] = collection_citation_index(rc.client)
         gtx["all_docs_from_collection"] = all_docs_from_collection
 
     def query_ppl(self, target):
@@ -467,8 +481,8 @@ class RecentCollaboratorsBuilder(BuilderBase):
         information."""
         rc = self.rc
         gtx = self.gtx
-        person = fuzzy_retrieval(
-            all_docs_from_collection(rc.client, "people"), ["aka", "name", "_id"], target, case_sensitive=False
+        person = retrieve_from_collection(
+            rc.client, "people", ["aka", "name", "_id"], target, case_sensitive=False
         )
         if not person:
             raise RuntimeError("Person {} not found in people.".format(target).encode("utf-8"))
@@ -10,7 +10,8 @@ from regolith.stylers import month_fullnames, sentencecase
 from regolith.tools import (
     all_docs_from_collection,
     awards_grants_honors,
-    dereference_institution,
+    collection_citation_index,
+    dereference_institution_from_collection,
     filter_employment_for_advisees,
     filter_grants,
     filter_presentations,
@@ -61,7 +62,7 @@ class CVBuilder(LatexBuilderBase):
             begin_period = date(1650, 1, 1)
 
             pubs = filter_publications(
-                all_docs_from_collection(rc.client, "citations"),
+                collection_citation_index(rc.client),
                 names,
                 reverse=True,
             )
@@ -97,7 +98,7 @@ class CVBuilder(LatexBuilderBase):
 
             for grant in grants:
                 for member in grant.get("team"):
-                    dereference_institution(member, self.gtx["institutions"])
+                    dereference_institution_from_collection(rc.client, "institutions", member)
 
             pi_grants, pi_amount, _ = filter_grants(grants, names, pi=True)
             coi_grants, coi_amount, coi_sub_amount = filter_grants(grants, names, pi=False)
@@ -111,7 +112,7 @@ class CVBuilder(LatexBuilderBase):
             # TODO: pull this out so we can use it everywhere
             for ee in [emps, edu]:
                 for e in ee:
-                    dereference_institution(e, self.gtx["institutions"])
+                    dereference_institution_from_collection(rc.client, "institutions", e)
 
             undergrads = filter_employment_for_advisees(
                 self.gtx["people"], begin_period, "undergrad", person["_id"]
@@ -2,10 +2,9 @@
 
 import os
 
-from jinja2 import Environment, FileSystemLoader
-
 from regolith.broker import Broker
 from regolith.builders.basebuilder import LatexBuilderBase
+from regolith.templating import shared_environment
 from regolith.tools import fuzzy_retrieval
 
 
@@ -15,7 +14,7 @@ class FigureBuilder(LatexBuilderBase):
     btype = "figure"
 
     def __init__(self, rc):
-        self.env = Environment(loader=FileSystemLoader(["."]))
+        self.env = shared_environment(rc, ["."])
         self.db = Broker(rc)
         super().__init__(rc)
 
@@ -47,8 +47,7 @@ class GradeReportBuilder(LatexBuilderBase):
             type, value, tb = sys.exc_info()
             traceback.print_exc()
             pdb.post_mortem(tb)
-        with open(os.path.join(self.bldir, fname), "wt", encoding="utf-8") as f:
-            f.write(result)
+        self.write(fname, result)
 
     def latex(self):
         for course in self.gtx["courses"]:
@@ -3,13 +3,14 @@
 import os
 import shutil
 
-from regolith.builders.basebuilder import BuilderBase
+from regolith.builders.basebuilder import BuilderBase, sync_dir
 from regolith.dates import get_dates
 from regolith.fsclient import _id_key
 from regolith.sorters import ene_date_key, position_key
 from regolith.tools import (
     all_docs_from_collection,
-    dereference_institution,
+    collection_citation_index,
+    dereference_institution_from_collection,
     document_by_value,
     filter_projects,
     filter_publications,
@@ -52,6 +53,8 @@ class HtmlBuilder(BuilderBase):
         gtx["group"] = document_by_value(all_docs_from_collection(rc.client, "groups"), "name", rc.groupname)
         gtx["all_docs_from_collection"] = all_docs_from_collection
         gtx["institutions"] = sorted(all_docs_from_collection(rc.client, "institutions"), key=_id_key)
+        # every page lists the active people in its navigation bar
+        self.nav = [[p["_id"], p["name"], p.get("active", True)] for p in gtx["people"]]
 
     def finish(self):
         """Move files over to their destination and remove them from the
@@ -59,10 +62,10 @@ class HtmlBuilder(BuilderBase):
         # static
         stsrc = os.path.join(getattr(self.rc, "static_source", "templates"), "static")
         stdst = os.path.join(self.bldir, "static")
-        if os.path.isdir(stdst):
-            shutil.rmtree(stdst)
         if os.path.isdir(stsrc):
-            shutil.copytree(stsrc, stdst)
+            sync_dir(stsrc, stdst)
+        elif os.path.isdir(stdst):
+            shutil.rmtree(stdst)
 
     def root_index(self):
         """Render root index."""
@@ -81,15 +84,21 @@ class HtmlBuilder(BuilderBase):
         os.makedirs(peeps_dir, exist_ok=True)
         os.makedirs(former_peeps_dir, exist_ok=True)
         peeps = self.gtx["people"]
+        institutions = self.collection_digest("institutions", self.gtx["institutions"])
         for p in peeps:
             names = frozenset(p.get("aka", []) + [p["name"]])
             pubs = filter_publications(
-                all_docs_from_collection(rc.client, "citations"),
+                collection_citation_index(rc.client),
                 names,
                 reverse=True,
                 bold=False,
             )
-
+            projs = filter_projects(all_docs_from_collection(rc.client, "projects"), names)
+            fname = os.path.join("people", p["_id"] + ".html")
+            inputs = [("people", p)] + [("citations", pub) for pub in pubs] + [("projects", pj) for pj in projs]
+            record = self.page_record("person.html", inputs, nav=self.nav, institutions=institutions)
+            if self.page_unchanged(fname, record):
+                continue
             bibfile = make_bibtex_file(pubs, pid=p["_id"], person_dir=peeps_dir)
             emps = p.get("employment", [])
             emps = [em for em in emps if not em.get("not_in_cv", False)]
@@ -98,8 +107,7 @@ class HtmlBuilder(BuilderBase):
             ene = emps + p.get("education", [])
             ene.sort(key=ene_date_key, reverse=True)
             for e in ene:
-                dereference_institution(e, all_docs_from_collection(rc.client, "institutions"))
-            projs = filter_projects(all_docs_from_collection(rc.client, "projects"), names)
+                dereference_institution_from_collection(rc.client, "institutions", e)
             for serve in p.get("service", []):
                 serve_dates = get_dates(serve)
                 date = serve_dates.get("date")
@@ -114,7 +122,7 @@ class HtmlBuilder(BuilderBase):
             p["service"] = sns
             self.render(
                 "person.html",
-                os.path.join("people", p["_id"] + ".html"),
+                fname,
                 p=p,
                 title=p.get("name", ""),
                 pubs=pubs,
@@ -123,6 +131,7 @@ class HtmlBuilder(BuilderBase):
                 education_and_employment=ene,
                 projects=projs,
             )
+            self.record_page(fname, record, [os.path.relpath(bibfile, self.bldir)] if bibfile else [])
         self.render("people.html", os.path.join("people", "index.html"), title="People")
 
         self.render(
@@ -145,12 +154,12 @@ class HtmlBuilder(BuilderBase):
         posts = list(all_docs_from_collection(rc.client, "blog"))
         posts.sort(key=ene_date_key, reverse=True)
         for post in posts:
-            self.render(
-                "blog_post.html",
-                os.path.join("blog", post["_id"] + ".html"),
-                post=post,
-                title=post["title"],
-            )
+            fname = os.path.join("blog", post["_id"] + ".html")
+            record = self.page_record("blog_post.html", [("blog", post)], nav=self.nav)
+            if self.page_unchanged(fname, record):
+                continue
+            self.render("blog_post.html", fname, post=post, title=post["title"])
+            self.record_page(fname, record)
         self.render(
             "blog_index.html",
             os.path.join("blog", "index.html"),
@@ -164,12 +173,17 @@ class HtmlBuilder(BuilderBase):
         jobs_dir = os.path.join(self.bldir, "jobs")
         os.makedirs(jobs_dir, exist_ok=True)
         for job in self.gtx["jobs"]:
+            fname = os.path.join("jobs", job["_id"] + ".html")
+            record = self.page_record("job.html", [("jobs", job)], nav=self.nav)
+            if self.page_unchanged(fname, record):
+                continue
             self.render(
                 "job.html",
-                os.path.join("jobs", job["_id"] + ".html"),
+                fname,
                 job=job,
                 title="{0} ({1})".format(job["title"], job["_id"]),
             )
+            self.record_page(fname, record)
         self.render("jobs.html", os.path.join("jobs", "index.html"), title="Jobs")
 
     def abstracts(self):
@@ -177,12 +191,17 @@ class HtmlBuilder(BuilderBase):
         abs_dir = os.path.join(self.bldir, "abstracts")
         os.makedirs(abs_dir, exist_ok=True)
         for ab in self.gtx["abstracts"]:
+            fname = os.path.join("abstracts", ab["_id"] + ".html")
+            record = self.page_record("abstract.html", [("abstracts", ab)], nav=self.nav)
+            if self.page_unchanged(fname, record):
+                continue
             self.render(
                 "abstract.html",
-                os.path.join("abstracts", ab["_id"] + ".html"),
+                fname,
                 abstract=ab,
                 title="{0} {1} - {2}".format(ab["firstname"], ab["lastname"], ab["title"]),
             )
+            self.record_page(fname, record)
 
     def nojekyll(self):
         """Touches a nojekyll file in the build dir."""
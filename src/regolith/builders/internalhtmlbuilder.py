@@ -2,14 +2,14 @@
 
 import datetime as dt
 import os
-import shutil
 
-from regolith.builders.basebuilder import BuilderBase
+from regolith.builders.basebuilder import BuilderBase, sync_dir
 from regolith.dates import get_dates
 from regolith.fsclient import _id_key
 from regolith.sorters import ene_date_key, position_key
 from regolith.tools import (
     all_docs_from_collection,
+    collection_citation_index,
     dereference_institution,
     document_by_value,
     filter_projects,
@@ -60,9 +60,7 @@ class InternalHtmlBuilder(BuilderBase):
         # static
         stsrc = os.path.join(getattr(self.rc, "static_source", "templates"), "static")
         stdst = os.path.join(self.bldir, "static")
-        if os.path.isdir(stdst):
-            shutil.rmtree(stdst)
-        shutil.copytree(stsrc, stdst)
+        sync_dir(stsrc, stdst)
 
     def root_index(self):
         """Render root index."""
@@ -176,7 +174,7 @@ class InternalHtmlBuilder(BuilderBase):
         for p in peeps:
             names = frozenset(p.get("aka", []) + [p["name"]])
             pubs = filter_publications(
-                all_docs_from_collection(rc.client, "citations"),
+                collection_citation_index(rc.client),
                 names,
                 reverse=True,
                 bold=False,
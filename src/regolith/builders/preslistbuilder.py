@@ -24,6 +24,7 @@ from regolith.builders.basebuilder import LatexBuilderBase
 from regolith.fsclient import _id_key
 from regolith.sorters import position_key
 from regolith.stylers import month_fullnames, sentencecase
+from regolith.templating import shared_environment
 from regolith.tools import all_docs_from_collection, filter_presentations, group_member_ids
 
 
@@ -88,14 +89,17 @@ class PresListBuilder(LatexBuilderBase):
                         sentencecase=sentencecase,
                         monthstyle=month_fullnames,
                     )
-                    self.env.trim_blocks = True
-                    self.env.lstrip_blocks = True
-                    self.render(
-                        "preslist.txt",
-                        outfile + ".txt",
-                        pi=pi,
-                        presentations=presclean,
-                        sentencecase=sentencecase,
-                        monthstyle=month_fullnames,
-                    )
+                    # the environment is shared, so the text list gets one of its own
+                    env, self.env = self.env, shared_environment(self.rc, trim_blocks=True, lstrip_blocks=True)
+                    try:
+                        self.render(
+                            "preslist.txt",
+                            outfile + ".txt",
+                            pi=pi,
+                            presentations=presclean,
+                            sentencecase=sentencecase,
+                            monthstyle=month_fullnames,
+                        )
+                    finally:
+                        self.env = env
                     self.pdf(outfile)
@@ -4,7 +4,7 @@ from dateutil import parser as date_parser
 
 from regolith.builders.basebuilder import LatexBuilderBase
 from regolith.sorters import ene_date_key, position_key
-from regolith.tools import all_docs_from_collection, filter_publications, make_bibtex_file
+from regolith.tools import CitationIndex, all_docs_from_collection, filter_publications, make_bibtex_file
 
 LATEX_OPTS = ["-halt-on-error", "-file-line-error"]
 
@@ -13,6 +13,15 @@ class PubListBuilder(LatexBuilderBase):
     btype = "publist"
     needed_colls = ["citations", "people"]
 
+    @classmethod
+    def collection_queries(cls, rc):
+        """Only the people the lists are built for are needed."""
+        people = rc._get("people")
+        people = [people] if isinstance(people, str) else people
+        if not people or "all" in people:
+            return {}
+        return {"people": {"filter": {"_id": {"$in": list(people)}}}}
+
     def construct_global_ctx(self):
         super().construct_global_ctx()
         gtx = self.gtx
@@ -74,6 +83,8 @@ class PubListBuilder(LatexBuilderBase):
                 filestub = f"{filestub}_facility_{facility}"
                 qualifiers = f"{qualifiers} from facility {facility}"
 
+        # every person is filtered from the same citations, so they are indexed once
+        citations = CitationIndex(self.gtx["citations"])
         for p in self.gtx["people"]:
             if p.get("_id") in self.rc.people or self.rc.people == ["all"]:
                 # if self.rc.people[0] != 'all':
@@ -82,7 +93,6 @@ class PubListBuilder(LatexBuilderBase):
                 outfile = p["_id"] + filestub
                 p["qualifiers"] = qualifiers
                 names = frozenset(p.get("aka", []) + [p["name"]])
-                citations = list(self.gtx["citations"])
                 grants = self.rc.grants
                 # build the bib files first without filtering for anything so they always contain all the relevant
                 # publications, then
@@ -64,8 +64,6 @@ class ReleaseListBuilder(LatexBuilderBase):
                     sentencecase=sentencecase,
                     monthstyle=month_fullnames,
                 )
-                self.env.trim_blocks = True
-                self.env.lstrip_blocks = True
                 # self.render(
                 # "releaselist.txt",
                 # outfile + ".txt",
@@ -5,6 +5,7 @@ from regolith.sorters import ene_date_key, position_key
 from regolith.tools import (
     all_docs_from_collection,
     awards_grants_honors,
+    collection_citation_index,
     filter_grants,
     filter_projects,
     filter_publications,
@@ -47,7 +48,7 @@ class ResumeBuilder(LatexBuilderBase):
         for p in people:
             names = frozenset(p.get("aka", []) + [p["name"]])
             pubs = filter_publications(
-                all_docs_from_collection(rc.client, "citations"),
+                collection_citation_index(rc.client),
                 names,
                 reverse=True,
             )
@@ -3,9 +3,12 @@
 ChainDBSingleton Copyright 2015-2016, the xonsh developers
 """
 
+import datetime
 import itertools
 from collections import ChainMap
-from collections.abc import MutableMapping
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager
+from copy import deepcopy
 
 
 class ChainDBSingleton(object):
@@ -21,6 +24,8 @@ class ChainDBSingleton(object):
 
 Singleton = ChainDBSingleton()
 
+_IMMUTABLE_TYPES = (str, int, float, bool, type(None), datetime.date, datetime.datetime)
+
 
 class ChainDB(ChainMap):
     """A ChainMap who's ``_getitem__`` returns either a ChainDB or the
@@ -66,8 +71,238 @@ class ChainDB(ChainMap):
                     mapping[key] = value
 
 
+def _detach(value):
+    # a copy of a document that shares nothing mutable with it, cheaper
+    # than deepcopy for the dicts, lists and scalars documents are made of
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return value
+    if isinstance(value, Mapping):
+        return {k: _detach(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_detach(v) for v in value]
+    return deepcopy(value)
+
+
+def merge_maps(maps):
+    """Merges mappings into a plain dict with the override rules of
+    ``ChainDB``.
+
+    A key whose values are mappings in every map is merged recursively,
+    lists are concatenated in order, and otherwise the value of the last
+    map that has the key wins. The result is a copy that shares nothing
+    mutable with the mappings, so changing it never changes them.
+
+    Parameters
+    ----------
+    maps : list of Mapping
+        The mappings, in order of increasing precedence.
+
+    Returns
+    -------
+    merged : dict
+        The merged mapping.
+    """
+    if len(maps) == 1:
+        return _detach(maps[0])
+    # the keys in the order a ChainMap iterates over them
+    keys = {}
+    for mapping in reversed(maps):
+        keys.update(dict.fromkeys(mapping))
+    merged = {}
+    for key in keys:
+        results = [mapping.get(key, Singleton) for mapping in maps]
+        if all(isinstance(result, MutableMapping) for result in results):
+            merged[key] = merge_maps(results)
+        elif all(isinstance(result, (list, ChainDBSingleton)) for result in results):
+            merged[key] = _detach(list(itertools.chain(*(r for r in results if r is not Singleton))))
+        else:
+            merged[key] = _detach(next(r for r in reversed(results) if r is not Singleton))
+    return merged
+
+
+class DocumentView(MutableMapping):
+    """A copy-on-write view of a document.
+
+    Reading a field returns a deep copy of that field only, made the first
+    time it is accessed, and writes stay local to the view. This gives the
+    same isolation from the underlying database as a deep copy of the
+    whole document, but only pays for the fields that are actually used.
+
+    Parameters
+    ----------
+    doc : Mapping
+        The document to view, usually a ``ChainDB``.
+    """
+
+    def __init__(self, doc):
+        self._doc = doc
+        self._local = {}
+        self._deleted = set()
+
+    def __getitem__(self, key):
+        if key in self._local:
+            return self._local[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        value = self._doc[key]
+        if not isinstance(value, _IMMUTABLE_TYPES):
+            value = deepcopy(value)
+            self._local[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._deleted.discard(key)
+        self._local[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._local.pop(key, None)
+        if key in self._doc:
+            self._deleted.add(key)
+
+    def __contains__(self, key):
+        return key in self._local or (key not in self._deleted and key in self._doc)
+
+    def __iter__(self):
+        for key in self._doc:
+            if key not in self._deleted:
+                yield key
+        for key in self._local:
+            if key not in self._doc:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "{0}({1!r})".format(self.__class__.__name__, dict(self))
+
+
+class LazyChainDB(MutableMapping):
+    """A mapping from collection names to their chained documents.
+
+    A collection is loaded from every database the first time it is
+    accessed. Collections that are never used are never read.
+
+    By default the documents of each collection are merged across the
+    databases once, into plain dicts, and the merge is kept until
+    ``invalidate`` is called for that collection. The merged documents are
+    copies, whether they were found in one database or several, so changing
+    them in place never changes the databases; changes are made through
+    the client, e.g. with ``update_one``, which invalidates the collection.
+    With ``materialize=False`` the documents are instead wrapped in
+    ``ChainDB`` s, which merge on every access but write changes through to
+    the database that holds the field.
+
+    A collection first accessed after the client was closed, for example
+    through the ``chained_db`` returned by ``connect_db``, is loaded on a
+    connection that is opened for that load and closed right after it.
+
+    Parameters
+    ----------
+    client : ClientManager
+        The client that loads the collections.
+    databases : list of dict
+        The databases to chain, in order of precedence.
+    materialize : bool, optional
+        Whether to merge the documents up front, defaults to True.
+    """
+
+    def __init__(self, client, databases, materialize=True):
+        self.client = client
+        self.databases = databases
+        self.materialize = materialize
+        self._colls = {}
+        self._missing = set()
+        self._names = None
+
+    @contextmanager
+    def _open_client(self):
+        # a collection requested after the session closed is loaded on a
+        # connection that is closed again right away
+        if not getattr(self.client, "closed", False):
+            yield
+            return
+        self.client.open()
+        try:
+            yield
+        finally:
+            self.client.close()
+
+    def _chain(self, collname):
+        chained = None
+        with self._open_client():
+            for db in self.databases:
+                coll = self.client.load_collection(db, collname)
+                if coll is None:
+                    continue
+                if chained is None:
+                    chained = {}
+                for k, v in coll.items():
+                    chained.setdefault(k, []).append(v)
+        if chained is None:
+            return None
+        if self.materialize:
+            return {k: merge_maps(maps) for k, maps in chained.items()}
+        return {k: ChainDB(*maps) for k, maps in chained.items()}
+
+    def _collection_names(self):
+        # listed once per session, and again only after a write to a collection that was not listed
+        if self._names is None:
+            names = {}
+            with self._open_client():
+                for db in self.databases:
+                    names.update(dict.fromkeys(self.client.available_collections(db)))
+            self._names = names
+        return self._names
+
+    def invalidate(self, collname=None):
+        """Drops the merged documents of a collection, or of every
+        collection if ``collname`` is None, so that they are merged again
+        from the databases on the next access."""
+        if collname is None:
+            self._colls.clear()
+            self._missing.clear()
+            self._names = None
+        else:
+            self._colls.pop(collname, None)
+            self._missing.discard(collname)
+            if self._names is not None and collname not in self._names:
+                self._names = None
+
+    def __getitem__(self, key):
+        if key not in self._colls:
+            if key in self._missing:
+                raise KeyError(key)
+            chained = self._chain(key)
+            if chained is None:
+                self._missing.add(key)
+                raise KeyError(key)
+            self._colls[key] = chained
+        return self._colls[key]
+
+    def __setitem__(self, key, value):
+        self._missing.discard(key)
+        self._colls[key] = value
+
+    def __delitem__(self, key):
+        del self._colls[key]
+
+    def __iter__(self):
+        names = dict(self._collection_names())
+        names.update(dict.fromkeys(self._colls))
+        return iter(list(names))
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __contains__(self, key):
+        return key in self._colls or key in self._collection_names()
+
+
 def _convert_to_dict(cm):
-    if isinstance(cm, (ChainMap, ChainDB)):
+    if isinstance(cm, (ChainMap, ChainDB, DocumentView)):
         r = {}
         for k, v in cm.items():
             r[k] = _convert_to_dict(v)
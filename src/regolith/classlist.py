@@ -138,8 +138,10 @@ LOADERS = {"usc": load_usc, "json": load_json, "csv": load_csv}
 
 def add_students_to_db(students, rc):
     """Add new students to the student directory."""
-    for student in students:
-        rc.client.update_one(rc.db, "students", {"_id": student["_id"]}, student, upsert=True)
+    updates = [({"_id": student["_id"]}, student) for student in students]
+    _, errors = rc.client.write_many(rc.db, "students", updates=updates, upsert=True)
+    if errors:
+        raise ValueError("\n".join(errors.values()))
 
 
 def add_students_to_course(students, rc):
@@ -1,15 +1,18 @@
 from collections import defaultdict
-from copy import deepcopy
 
-from regolith.fsclient import FileSystemClient
-from regolith.mongoclient import MongoClient
+from regolith.chained_db import DocumentView
+from regolith.registry import LazyRegistry
 
-CLIENTS = {
-    "mongo": MongoClient,
-    "mongodb": MongoClient,
-    "fs": FileSystemClient,
-    "filesystem": FileSystemClient,
-}
+# pymongo is only imported when a database uses the mongo backend
+CLIENTS = LazyRegistry(
+    {
+        "mongo": "regolith.mongoclient:MongoClient",
+        "mongodb": "regolith.mongoclient:MongoClient",
+        "fs": "regolith.fsclient:FileSystemClient",
+        "filesystem": "regolith.fsclient:FileSystemClient",
+        "sqlite": "regolith.sqliteclient:SqliteClient",
+    }
+)
 
 
 class ClientManager:
@@ -38,6 +41,8 @@ class ClientManager:
         self._collfiletypes = {}
         self._collexts = {}
         self._yamlinsts = {}
+        # indexes of whole collections, such as alias indexes, by collection name
+        self._indexes = {}
 
     def __getattr__(self, attr):
         if attr == "dbs":
@@ -53,29 +58,85 @@ class ClientManager:
             if key in client.keys():
                 return client[key]
 
+    def _invalidate(self, collname=None):
+        # the merged documents and their indexes no longer match the databases after a write
+        if self.chained_db is not None and hasattr(self.chained_db, "invalidate"):
+            self.chained_db.invalidate(collname)
+        if collname is None:
+            self._indexes.clear()
+        else:
+            self._indexes.pop(collname, None)
+
+    def collection_index(self, collname, key, build):
+        """Returns an index of a collection, building it the first time it is
+        asked for.
+
+        Indexes are kept until the collection is written to through the
+        client, or the client is closed.
+
+        Parameters
+        ----------
+        collname : str
+            The name of the collection.
+        key : hashable
+            Tells the indexes of a collection apart.
+        build : callable
+            Builds the index from the list of the documents of the
+            collection. The documents are the ones of the database, so the
+            index must not change them.
+        """
+        indexes = self._indexes.setdefault(collname, {})
+        if key not in indexes:
+            indexes[key] = build(list(self.all_documents(collname, copy=False)))
+        return indexes[key]
+
     def open(self):
         """Opens the database connections."""
         for client in self.clients:
             client.open()
+        self.closed = False
 
     def close(self):
         """Closes the database connections."""
         for client in self.clients:
             client.close()
+        self._indexes.clear()
+        self.closed = True
 
     def load_database(self, db):
         for client in self.clients:
             if isinstance(client, CLIENTS[db["backend"]]):
                 client.load_database(db)
 
+    def register_database(self, db):
+        """Makes a database known to its backend client without loading any
+        of its collections."""
+        for client in self.clients:
+            if isinstance(client, CLIENTS[db["backend"]]):
+                client.register_database(db)
+
+    def load_collection(self, db, collname):
+        """Loads a single collection of a database on its backend and
+        returns it, or None if the database has no such collection."""
+        for client in self.clients:
+            if isinstance(client, CLIENTS[db["backend"]]):
+                return client.load_collection(db, collname)
+
+    def available_collections(self, db):
+        """Returns the names of all the collections in a database."""
+        for client in self.clients:
+            if isinstance(client, CLIENTS[db["backend"]]):
+                return client.available_collections(db)
+        return []
+
     def import_database(self, db: dict):
         for client in self.clients:
-            if isinstance(client, MongoClient):
+            if isinstance(client, CLIENTS["mongo"]):
                 client.import_database(db)
 
     def export_database(self, db: dict):
         for client in self.clients:
-            if isinstance(client, MongoClient):
+            if isinstance(client, CLIENTS["mongo"]):
                 client.export_database(db)
 
     def dump_database(self, db):
@@ -89,6 +150,21 @@ class ClientManager:
                         to_add.extend(temp_add)
         return to_add
 
+    def mark_dirty(self, dbname, collname=None, doc_id=None):
+        """Flags a collection as changed so that it is written back on the
+        next dump."""
+        for client in self.clients:
+            if hasattr(client, "mark_dirty") and dbname in client.keys():
+                client.mark_dirty(dbname, collname, doc_id)
+        self._invalidate(collname)
+
+    def compact(self, db):
+        """Folds the change journals of a database back into its collection
+        files on the next dump, for the backends that keep journals."""
+        for client in self.clients:
+            if isinstance(client, CLIENTS[db["backend"]]) and hasattr(client, "compact"):
+                client.compact(db)
+
     def keys(self):
         keys = []
         for client in self.clients:
@@ -102,9 +178,14 @@ class ClientManager:
                 return client.collection_names(dbname)
 
     def all_documents(self, collname, copy=True):
-        """Returns an iterable over all documents in a collection."""
+        """Returns an iterable over all documents in a collection.
+
+        With ``copy`` each document is wrapped in a copy-on-write
+        ``DocumentView`` so changes made by the caller never reach the
+        database.
+        """
         if copy:
-            return deepcopy(self.chained_db.get(collname, {})).values()
+            return [DocumentView(doc) for doc in self.chained_db.get(collname, {}).values()]
         return self.chained_db.get(collname, {}).values()
 
     def insert_one(self, dbname, collname, doc):
@@ -112,18 +193,21 @@ class ClientManager:
         for client in self.clients:
             if dbname in client.keys():
                 client.insert_one(dbname, collname, doc)
+        self._invalidate(collname)
 
     def insert_many(self, dbname, collname, docs):
         """Inserts many documents into a database/collection."""
         for client in self.clients:
             if dbname in client.keys():
                 client.insert_many(dbname, collname, docs)
+        self._invalidate(collname)
 
     def delete_one(self, dbname, collname, doc):
         """Removes a single document from a collection."""
         for client in self.clients:
             if dbname in client.keys():
                 client.delete_one(dbname, collname, doc)
+        self._invalidate(collname)
 
     def find_one(self, dbname, collname, filter):
         """Finds the first document matching filter."""
@@ -131,8 +215,57 @@ class ClientManager:
             if dbname in client.keys():
                 return client.find_one(dbname, collname, filter)
 
+    def write_many(self, dbname, collname, inserts=(), updates=(), deletes=(), ordered=True, upsert=False):
+        """Writes a batch of inserts, updates and deletes to a collection.
+
+        Backends with a bulk write path, like mongo, send the whole batch in
+        a single request. The others apply the changes one at a time.
+
+        Parameters
+        ----------
+        dbname : str
+            The name of the database.
+        collname : str
+            The name of the collection.
+        inserts : iterable of dict, optional
+            The documents to insert.
+        updates : iterable of tuple, optional
+            ``(filter, update)`` pairs, as taken by ``update_one``.
+        deletes : iterable of dict, optional
+            The documents to remove.
+        ordered : bool, optional
+            Whether the writes must be applied in order, stopping at the first
+            one that fails.
+        upsert : bool, optional
+            Whether an update of a missing document inserts it.
+
+        Returns
+        -------
+        result : object or None
+            The result of the bulk write, if the backend has one.
+        errors : dict
+            The validation errors of the documents that were not written,
+            keyed by their ``_id``.
+        """
+        self._invalidate(collname)
+        for client in self.clients:
+            if dbname in client.keys():
+                if hasattr(client, "write_many"):
+                    return client.write_many(
+                        dbname, collname, inserts, updates, deletes, ordered=ordered, upsert=upsert
+                    )
+                for doc in inserts:
+                    client.insert_one(dbname, collname, doc)
+                for filter, update in updates:
+                    client.update_one(dbname, collname, filter, update, upsert=upsert)
+                for doc in deletes:
+                    client.delete_one(dbname, collname, doc)
+                return None, {}
+        return None, {}
+
     def update_one(self, dbname, collname, filter, update, **kwargs):
         """Updates one document."""
         for client in self.clients:
             if dbname in client.keys():
                 client.update_one(dbname, collname, filter, update, **kwargs)
+        self._invalidate(collname)
@@ -1,9 +1,14 @@
 """Implementation of commands for command line."""
 
+import contextlib
+import io
 import json
+import multiprocessing
 import os
 import re
 import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 from copy import copy
 from pprint import pprint
 
@@ -11,15 +16,10 @@ from ruamel.yaml import YAML
 
 from regolith import storage
 from regolith.builder import BUILDERS, builder
-from regolith.deploy import deploy as dploy
-from regolith.emailer import emailer
-from regolith.GHextractor import extract_github, to_software_yaml
-from regolith.helper import FAST_UPDATER_WHITELIST, HELPERS, UPDATER_HELPERS, helpr
+from regolith.helper import FAST_UPDATER_WHITELIST, HELPERS, LISTER_HELPERS, UPDATER_HELPERS, helpr
 from regolith.runcontrol import RunControl
 from regolith.tools import string_types
 
-email = emailer
-
 RE_AND = re.compile(r"\s+and\s+")
 RE_SPACE = re.compile(r"\s+")
 
@@ -54,6 +54,7 @@ def _ingest_citations(rc):
     parser.customization = customizations
     with open(rc.filename, "r", encoding="utf-8") as f:
         bibs = bibtexparser.load(f, parser=parser)
+    updates = []
     for bib in bibs.entries:
         bibid = bib.pop("ID")
         bib["entrytype"] = bib.pop("ENTRYTYPE")
@@ -61,7 +62,10 @@ def _ingest_citations(rc):
             bib["author"] = [a.strip() for b in bib["author"] for a in RE_AND.split(b)]
         if "title" in bib:
             bib["title"] = RE_SPACE.sub(" ", bib["title"])
-        rc.client.update_one(rc.db, rc.coll, {"_id": bibid}, bib, upsert=True)
+        updates.append(({"_id": bibid}, bib))
+    _, errors = rc.client.write_many(rc.db, rc.coll, updates=updates, upsert=True)
+    if errors:
+        raise ValueError("\n".join(errors.values()))
 
 
 def _determine_ingest_coll(rc):
@@ -106,6 +110,39 @@ def grade(rc):
     _run_app(app, rc)
 
 
+def collection_queries_check(classes, rc):
+    """Collects the queries that builders or helpers declare, through a
+    ``collection_queries(rc)`` class method, for the collections they need.
+
+    A collection only gets a query if every one of the classes that needs it
+    declares the same query for it. It is otherwise loaded in full.
+
+    Parameters
+    ----------
+    classes : list of type
+        The builder or helper classes, which all state their ``needed_colls``.
+    rc : RunControl
+        The run control.
+
+    Returns
+    -------
+    queries : dict
+        Maps collection names to queries, i.e. dicts with an optional
+        ``filter`` and ``projection``.
+    """
+    merged = {}
+    for cls in classes:
+        get_queries = getattr(cls, "collection_queries", None)
+        queries = get_queries(rc) if get_queries is not None else {}
+        for coll in cls.needed_colls:
+            query = queries.get(coll)
+            if coll not in merged:
+                merged[coll] = query
+            elif merged[coll] != query:
+                merged[coll] = None
+    return {coll: query for coll, query in merged.items() if query}
+
+
 def build_db_check(rc):
     """Checks which DBs a builder needs."""
     dbs = set()
@@ -117,6 +154,8 @@ def build_db_check(rc):
         if not needed_colls:
             return None
         dbs.update(needed_colls)
+    # builders never write, so their collections may be loaded partially
+    rc.collection_queries = collection_queries_check([BUILDERS[t] for t in rc.build_targets], rc)
     return dbs
 
 
@@ -141,14 +180,103 @@ def helper_db_check(rc):
     if not needed_colls:
         return None
     colls.update(needed_colls)
+    # only listers never write, so only their collections may be loaded partially
+    if rc.helper_target in LISTER_HELPERS:
+        rc.collection_queries = collection_queries_check([bldr], rc)
     return colls
 
 
+def read_only_check(rc):
+    """Checks whether a command can run without dumping the databases.
+
+    Builders and lister helpers never write to the databases, so they
+    are always run read-only. Any other command may opt in by setting
+    ``read_only`` in the run control.
+    """
+    if rc._get("read_only", False):
+        return True
+    if rc.cmd == "build":
+        return True
+    if rc.cmd == "helper":
+        return rc.helper_target in LISTER_HELPERS
+    return False
+
+
+# the run control of a parallel build, inherited by the forked workers
+_BUILD_RC = None
+
+
+def _init_build_worker(jobs):
+    """Sets up a forked build worker.
+
+    The connections of the backend clients belong to the parent process, so
+    the worker closes its copy of the client; collections that were not
+    loaded before the fork are then loaded on connections of the worker's
+    own. Unless ``rc.latex_jobs`` is set, the workers share the CPUs for
+    compiling latex rather than each using all of them.
+    """
+    _BUILD_RC.client.close()
+    if not _BUILD_RC._get("latex_jobs"):
+        _BUILD_RC.latex_jobs = max(1, (os.cpu_count() or 1) // jobs)
+
+
+def _build_target(target):
+    """Builds one target in a worker, returning its output and the
+    traceback of its failure, if any."""
+    out = io.StringIO()
+    error = None
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+        try:
+            builder(target, _BUILD_RC).build()
+        except Exception:
+            error = traceback.format_exc()
+    return out.getvalue(), error
+
+
 def build(rc):
-    """Builds all of the build targets."""
-    for t in rc.build_targets:
-        bldr = builder(t, rc)
-        bldr.build()
+    """Builds all of the build targets.
+
+    With ``rc.jobs`` greater than one, the collections the targets need are
+    loaded and merged once, and the targets are then built concurrently in
+    worker processes forked from this one, which share the loaded
+    collections copy-on-write, each with connections of its own. The output
+    of each target is printed once it is done, in the order of the targets.
+    Where processes cannot be forked,
+    the targets are built one after the other.
+    """
+    global _BUILD_RC
+    jobs = min(rc._get("jobs") or 1, len(rc.build_targets))
+    if jobs <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        for t in rc.build_targets:
+            bldr = builder(t, rc)
+            bldr.build()
+        return
+    colls = build_db_check(rc)
+    for coll in rc.client.chained_db if colls is None else sorted(colls):
+        rc.client.chained_db.get(coll)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    _BUILD_RC = rc
+    try:
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_build_worker,
+            initargs=(jobs,),
+        ) as pool:
+            futures = {t: pool.submit(_build_target, t) for t in rc.build_targets}
+            failed = []
+            for t, future in futures.items():
+                output, error = future.result()
+                print(f"==> {t}")
+                print(output, end="")
+                if error is not None:
+                    print(error, end="", file=sys.stderr)
+                    failed.append(t)
+    finally:
+        _BUILD_RC = None
+    if failed:
+        raise RuntimeError("failed to build {}".format(", ".join(failed)))
 
 
 def helper(rc):
@@ -159,12 +287,37 @@ def helper(rc):
 
 def deploy(rc):
     """Deploys all of the deployment targets."""
+    from regolith.deploy import deploy as dploy
+
     if not hasattr(rc, "deploy") or len(rc.deploy) == 0:
         raise RuntimeError("run control has no deployment targets!")
     for target in rc.deploy:
         dploy(rc, **target)
 
 
+def email(rc):
+    """Sends emails."""
+    from regolith.emailer import emailer
+
+    emailer(rc)
+
+
+def daemon(rc):
+    """Serves helper commands from databases kept loaded between them."""
+    from regolith.daemon import serve
+
+    serve(rc)
+
+
+def compile_templates(rc):
+    """Compiles the templates into the template cache."""
+    from regolith.templating import compile_templates as compile_all
+    from regolith.templating import shared_environment
+
+    names = compile_all(shared_environment(rc))
+    print("compiled {} templates".format(len(names)))
+
+
 def classlist(rc):
     """Sets values for the class list."""
     from regolith.classlist import register
@@ -225,9 +378,49 @@ def mongo_to_fs(rc: RunControl) -> None:
     return
 
 
+def fs_to_sqlite(rc: RunControl) -> None:
+    """Import the databases from the filesystem layout into SQLite files.
+
+    Parameters
+    ----------
+    rc : RunControl
+        The RunControl. The databases will be imported according to the 'databases' in it.
+    """
+    from regolith.sqliteclient import SqliteClient
+
+    client = SqliteClient(rc)
+    for db in rc.databases:
+        client.import_database(db)
+    client.close()
+
+
+def sqlite_to_fs(rc: RunControl) -> None:
+    """Export the databases from SQLite files to the filesystem layout.
+
+    Parameters
+    ----------
+    rc : RunControl
+        The RunControl. The databases will be exported according to the 'databases' in it.
+    """
+    from regolith.sqliteclient import SqliteClient
+
+    client = SqliteClient(rc)
+    for db in rc.databases:
+        db.setdefault("blacklist", [])
+        client.export_database(db)
+    client.close()
+
+
+def compact(rc):
+    """Folds the change journals of the databases back into their
+    collection files."""
+    for db in rc.databases:
+        rc.client.compact(db)
+
+
 def validate(rc):
     """Validate the combined database against the schemas."""
-    from regolith.schemas import validate
+    from regolith.schemas import validate_collections
 
     print("=" * 10 + "\nVALIDATING\n")
     any_errors = False
@@ -235,23 +428,22 @@ def validate(rc):
         db = {rc.collection: rc.client.chained_db[rc.collection]}
     else:
         db = rc.client.chained_db
-    for name, collection in db.items():
-        errored_print = False
-        for doc_id, doc in collection.items():
-            v = validate(name, doc, rc.schemas)
-            if v[0] is False:
-                if errored_print is False:
-                    errored_print = True
-                    any_errors = True
-                    print(f"Errors found in {name}")
-                    print("=" * len(f"Errors found in {name}"))
-                print(f"ERROR in {doc_id}:")
-                pprint(v[1])
-                cap = copy(v[1])
-                for vv in v[1]:
-                    pprint(doc.get(vv))
-                print("-" * 15)
-                print("\n")
+    all_errors = validate_collections(db, rc.schemas, jobs=rc._get("jobs") or 1)
+    for name, errors in all_errors.items():
+        collection = db[name]
+        if errors:
+            any_errors = True
+            print(f"Errors found in {name}")
+            print("=" * len(f"Errors found in {name}"))
+        for doc_id, doc_errors in errors.items():
+            doc = collection[doc_id]
+            print(f"ERROR in {doc_id}:")
+            pprint(doc_errors)
+            cap = copy(doc_errors)
+            for vv in doc_errors:
+                pprint(doc.get(vv))
+            print("-" * 15)
+            print("\n")
     if not any_errors:
         print("\nNO ERRORS IN DBS\n" + "=" * 15)
     else:
@@ -263,6 +455,8 @@ def validate(rc):
 
 def ghextractor(rc):
     """Extract GitHub repository metadata and write software YAML."""
+    from regolith.GHextractor import extract_github, to_software_yaml
+
     owner = rc.owner
     repo = getattr(rc, "repo", None)
     all_repos = getattr(rc, "all", False)
@@ -291,6 +485,10 @@ DISCONNECTED_COMMANDS = {
     "json-to-yaml": json_to_yaml,
     "yaml-to-json": yaml_to_json,
     "gh-extractor": ghextractor,
+    "daemon": daemon,
+    "compile-templates": compile_templates,
+    "fs-to-sqlite": fs_to_sqlite,
+    "sqlite-to-fs": sqlite_to_fs,
 }
 
 CONNECTED_COMMANDS = {
@@ -305,4 +503,5 @@ CONNECTED_COMMANDS = {
     "helper": helper,
     "fs-to-mongo": fs_to_mongo,
     "mongo-to-fs": mongo_to_fs,
+    "compact": compact,
 }
@@ -0,0 +1,282 @@
+"""A background server that keeps the databases loaded between helper
+runs.
+
+``regolith daemon`` connects to the databases once and then serves
+``regolith helper`` commands, forwarded by ``regolith`` over a Unix socket,
+from that session. Before each command the filesystem databases are checked
+for changes, and the session is reloaded if any collection file changed.
+Updater helpers write their changes back as soon as they finish, and the
+changes of an updater that fails are dropped with the session.
+
+Commands are only forwarded to a socket that belongs to the current user
+and that no one else can connect to.
+"""
+
+import contextlib
+import copy
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import traceback
+from argparse import ArgumentParser
+
+from regolith.tools import dbpathname
+
+
+def socket_path(cwd=None):
+    """The path of the socket of the daemon serving a directory.
+
+    The socket is kept in ``$XDG_RUNTIME_DIR``, which only the user can
+    write to, when it is set, and in the temporary directory otherwise. The
+    path is kept short, as the length of Unix socket paths is limited.
+    """
+    cwd = os.path.abspath(cwd or os.getcwd())
+    key = hashlib.sha1(cwd.encode("utf-8")).hexdigest()[:12]
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    rundir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(rundir, f"regolith-{uid}-{key}.sock")
+
+
+def is_private_socket(path):
+    """Whether a path is a socket owned by the current user that no other
+    user can connect to."""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+
+def forward(argv, path=None):
+    """Runs a command on the daemon serving the current directory and
+    streams its output to stdout.
+
+    Parameters
+    ----------
+    argv : list of str
+        The command line arguments, starting with ``helper``
+    path : str, optional
+        The path of the socket. Defaults to the socket of the current
+        directory.
+
+    Returns
+    -------
+    status : int or None
+        The exit status of the command, or None if no daemon is running
+    """
+    path = path or socket_path()
+    if not hasattr(socket, "AF_UNIX") or not os.path.lexists(path):
+        return None
+    if not is_private_socket(path):
+        # someone else may be listening, so the command must not be sent there
+        print(f"WARNING: ignoring {path}, which is not a socket private to this user", file=sys.stderr)
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    with sock, sock.makefile("rw", encoding="utf-8") as stream:
+        stream.write(json.dumps({"argv": list(argv)}) + "\n")
+        stream.flush()
+        for line in stream:
+            message = json.loads(line)
+            if "exit" in message:
+                return message["exit"]
+            sys.stdout.write(message["out"])
+            sys.stdout.flush()
+    # the daemon went away in the middle of the command
+    return 1
+
+
+class HelperDaemon:
+    """Runs helpers against a database session that is kept open between
+    them.
+
+    Parameters
+    ----------
+    rc : RunControl
+        The run control, with the databases already filtered
+    """
+
+    def __init__(self, rc):
+        self.rc = rc
+        self._client = None
+        self._stamp = None
+
+    def _fs_stamp(self):
+        stamp = []
+        for db in self.rc.databases:
+            dbpath = dbpathname(db, self.rc)
+            if not os.path.isdir(dbpath):
+                continue
+            for entry in sorted(os.scandir(dbpath), key=lambda e: e.name):
+                if entry.is_file():
+                    st = entry.stat()
+                    stamp.append((entry.path, st.st_mtime_ns, st.st_size))
+        return stamp
+
+    def open(self):
+        """Opens the session, reopening it if a database changed on disk."""
+        from regolith.database import open_dbs
+
+        if self._client is not None and self._fs_stamp() != self._stamp:
+            self.close()
+        if self._client is None:
+            self._client = self.rc.client = open_dbs(self.rc)
+            self._stamp = self._fs_stamp()
+        return self._client
+
+    def close(self, databases=None, dump=True):
+        """Closes the session.
+
+        Parameters
+        ----------
+        databases : list of dict, optional
+            The databases whose changed collections are written back,
+            defaults to all of them
+        dump : bool, optional
+            Whether to write the changes back at all
+        """
+        from regolith.database import dump_database
+
+        if self._client is None:
+            return
+        client, self._client = self._client, None
+        try:
+            if dump:
+                for db in self.rc.databases if databases is None else databases:
+                    dump_database(db, client, self.rc)
+        finally:
+            client.close()
+
+    def run(self, argv):
+        """Runs a helper command.
+
+        Parameters
+        ----------
+        argv : list of str
+            The command line arguments, starting with ``helper``
+
+        Returns
+        -------
+        status : int
+            The exit status of the command
+        """
+        from regolith.commands import CONNECTED_COMMANDS, helper_db_check
+        from regolith.helper import HELPERS, LISTER_HELPERS
+
+        if not argv or argv[0] != "helper":
+            print("the regolith daemon only runs helpers")
+            return 2
+        p = ArgumentParser(prog="regolith helper")
+        p.add_argument("helper_target", help="helper target to run.")
+        known, _ = p.parse_known_args(argv[1:])
+        if known.helper_target not in HELPERS:
+            p.error(f"unknown helper target {known.helper_target!r}")
+        HELPERS[known.helper_target][1](p)
+        ns = p.parse_args(argv[1:])
+        client = self.open()
+        rc = copy.copy(self.rc)
+        rc._update(ns.__dict__)
+        rc.cmd = "helper"
+        if rc._get("database") is None:
+            rc.database = None
+        # sets up fast updaters like main does, the session already has every collection it needs
+        helper_db_check(rc)
+        rc.client = client
+        if rc.helper_target in LISTER_HELPERS:
+            CONNECTED_COMMANDS[rc.cmd](rc)
+            return 0
+        try:
+            CONNECTED_COMMANDS[rc.cmd](rc)
+        except BaseException:
+            # like a failed command line run, nothing of a failed updater is written back
+            self.close(dump=False)
+            raise
+        self.close(databases=rc.databases)
+        return 0
+
+
+class _StreamWriter:
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text):
+        if text:
+            self.wfile.write((json.dumps({"out": text}) + "\n").encode("utf-8"))
+            self.wfile.flush()
+        return len(text)
+
+    def flush(self):
+        self.wfile.flush()
+
+
+class _HelperRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        out = _StreamWriter(self.wfile)
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+            try:
+                status = self.server.helper_daemon.run(request["argv"])
+            except SystemExit as e:
+                if isinstance(e.code, str):
+                    print(e.code)
+                status = e.code if isinstance(e.code, int) else int(e.code is not None)
+            except Exception:
+                traceback.print_exc()
+                status = 1
+        self.wfile.write((json.dumps({"exit": status}) + "\n").encode("utf-8"))
+
+
+class HelperServer(socketserver.UnixStreamServer):
+    """Serves helper commands, one at a time, from a ``HelperDaemon``."""
+
+    def __init__(self, rc, path):
+        self.helper_daemon = HelperDaemon(rc)
+        old_umask = os.umask(0o077)
+        try:
+            super().__init__(path, _HelperRequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def server_close(self):
+        super().server_close()
+        self.helper_daemon.close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def serve(rc, path=None):
+    """Loads the databases and serves helper commands until interrupted."""
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("the regolith daemon needs Unix domain sockets")
+    path = path or socket_path()
+    if os.path.lexists(path) and not is_private_socket(path):
+        raise RuntimeError(f"{path} exists and is not a socket private to this user")
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            # left behind by a daemon that did not shut down cleanly
+            os.remove(path)
+        else:
+            raise RuntimeError(f"a regolith daemon is already serving {os.getcwd()}")
+        finally:
+            probe.close()
+    server = HelperServer(rc, path)
+    server.helper_daemon.open()
+    print(f"regolith daemon serving {os.getcwd()} on {path}, type Ctrl-C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,21 +1,26 @@
 """Contains a client database backed by the file system."""
 
 import datetime
+import hashlib
 import json
 import logging
 import os
+import pickle
 import signal
 import sys
 from collections import defaultdict
-from copy import deepcopy
 from glob import iglob
 
 import ruamel.yaml
 from ruamel.yaml import YAML
 from ruamel.yaml.comments import CommentedMap, CommentedSeq
 
+from regolith.chained_db import DocumentView
 from regolith.tools import dbpathname
 
+# the extension of the files journaling the changes to a collection
+JOURNAL_EXT = ".journal"
+
 
 class DelayedKeyboardInterrupt:
 
@@ -94,6 +99,41 @@ def load_yaml(filename, return_inst=False, loader=None):
     return (docs, inst) if return_inst else docs
 
 
+def load_yaml_cached(filename, cachedir):
+    """Loads a YAML file, reusing the parsed documents stored in ``cachedir``
+    when the file has not changed since they were cached.
+
+    Cache entries are keyed on the absolute path of the file and checked
+    against its modification time and size, so a cold load costs the same
+    as ``load_yaml`` and a warm load skips YAML parsing entirely.
+    """
+    filename = os.path.abspath(filename)
+    stat = os.stat(filename)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    key = hashlib.sha1(filename.encode("utf-8")).hexdigest()
+    cachefile = os.path.join(cachedir, key + ".pkl")
+    try:
+        with open(cachefile, "rb") as fh:
+            cached_stamp, docs = pickle.load(fh)
+        if cached_stamp == stamp:
+            return docs
+    except Exception:
+        # missing, stale or unreadable cache entries are simply rebuilt
+        pass
+    docs = load_yaml(filename)
+    tmpfile = cachefile + ".{}.tmp".format(os.getpid())
+    try:
+        # a build directory that cannot be written to only loses the cache
+        os.makedirs(cachedir, exist_ok=True)
+        with open(tmpfile, "wb") as fh:
+            pickle.dump((stamp, docs), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpfile, cachefile)
+    except (OSError, pickle.PicklingError, TypeError, AttributeError):
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+    return docs
+
+
 def dump_yaml(filename, docs, inst=None):
     """Dumps a dict of documents into a file."""
     inst = YAML() if inst is None else inst
@@ -102,15 +142,86 @@ def dump_yaml(filename, docs, inst=None):
     sorted_dict = ruamel.yaml.comments.CommentedMap()
     for k in sorted(docs):
         doc = docs[k]
-        doc.pop("_id")
         sorted_dict[k] = ruamel.yaml.comments.CommentedMap()
+        # leave ``_id`` in place so the in-memory documents survive repeated dumps
         for kk in sorted(doc.keys()):
+            if kk == "_id":
+                continue
             sorted_dict[k][kk] = doc[kk]
     with open(filename, "w", encoding="utf-8") as fh:
         with DelayedKeyboardInterrupt():
             inst.dump(sorted_dict, stream=fh)
 
 
+def _journal_default(obj):
+    if isinstance(obj, datetime.datetime):
+        return {"$datetime": obj.isoformat()}
+    if isinstance(obj, datetime.date):
+        return {"$date": obj.isoformat()}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _journal_object_hook(obj):
+    if len(obj) == 1:
+        if "$datetime" in obj:
+            return datetime.datetime.fromisoformat(obj["$datetime"])
+        if "$date" in obj:
+            return datetime.date.fromisoformat(obj["$date"])
+    return obj
+
+
+def append_journal(filename, entries):
+    """Appends entries to the journal of a collection.
+
+    Each entry is written as one line of JSON, either
+    ``{"op": "put", "_id": ..., "doc": ...}`` or ``{"op": "delete", "_id": ...}``.
+    Dates are tagged so that they are read back as dates, and not as strings.
+    """
+    lines = "".join(json.dumps(entry, sort_keys=True, default=_journal_default) + "\n" for entry in entries)
+    with open(filename, "a", encoding="utf-8") as fh:
+        with DelayedKeyboardInterrupt():
+            fh.write(lines)
+
+
+def replay_journal(filename, docs):
+    """Applies the entries of a collection journal, in order, to the
+    documents of the collection and returns the number of entries.
+
+    A last line that was only partially written is ignored.
+    """
+    n = 0
+    with open(filename, encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line, object_hook=_journal_object_hook)
+            except json.JSONDecodeError:
+                if line.endswith("\n"):
+                    raise
+                break
+            if entry["op"] == "put":
+                docs[entry["_id"]] = entry["doc"]
+            else:
+                docs.pop(entry["_id"], None)
+            n += 1
+    return n
+
+
+def replay_collection_journal(filename, docs):
+    """Applies the journal of a collection file, if it has one, to the
+    documents loaded from that file and returns the number of entries.
+
+    Anything that reads collection files without going through a
+    ``FileSystemClient`` must do this, or it misses the changes that were
+    not folded back into the files yet.
+    """
+    journal = os.path.splitext(filename)[0] + JOURNAL_EXT
+    if not os.path.exists(journal):
+        return 0
+    return replay_journal(journal, docs)
+
+
 def json_to_yaml(inp, out):
     """Converts a JSON file to a YAML one."""
     docs = load_json(inp)
@@ -143,6 +254,11 @@ class FileSystemClient:
         if self.closed:
             self.dbs = defaultdict(lambda: defaultdict(dict))
             self.chained_db = {}
+            # maps database name -> collection name -> ids of changed documents,
+            # or None when the whole collection has to be written
+            self._dirty = defaultdict(dict)
+            # maps database name -> collection name -> number of journal entries
+            self._journals = defaultdict(dict)
             self.closed = False
 
     def load_json(self, db, dbpath):
@@ -160,6 +276,7 @@ class FileSystemClient:
             self._collfiletypes[base] = "json"
             print("loading " + f + "...", file=sys.stderr)
             dbs[db["name"]][base] = load_json(f)
+            self.load_journal(db, dbpath, base)
 
     def load_yaml(self, db, dbpath):
         """Loads the YAML part of a database."""
@@ -176,9 +293,21 @@ class FileSystemClient:
             self._collexts[base] = ext
             self._collfiletypes[base] = "yaml"
             # print("loading " + f + "...", file=sys.stderr)
-            coll, inst = load_yaml(f, return_inst=True)
+            if self.rc._get("yaml_cache", True):
+                # a fresh round-trip instance is made by dump_yaml if needed
+                coll = load_yaml_cached(f, os.path.join(self.rc.builddir, "_yamlcache"))
+            else:
+                coll, inst = load_yaml(f, return_inst=True)
+                self._yamlinsts[dbpath, base] = inst
             dbs[db["name"]][base] = coll
-            self._yamlinsts[dbpath, base] = inst
+            self.load_journal(db, dbpath, base)
+
+    def load_journal(self, db, dbpath, collname):
+        """Replays the journal of a collection, if it has one, on top of the
+        documents loaded from its collection file."""
+        f = os.path.join(dbpath, collname + JOURNAL_EXT)
+        if os.path.exists(f):
+            self._journals[db["name"]][collname] = replay_journal(f, self.dbs[db["name"]][collname])
 
     def load_database(self, db):
         """Loads a database."""
@@ -186,6 +315,37 @@ class FileSystemClient:
         self.load_json(db, dbpath)
         self.load_yaml(db, dbpath)
 
+    def register_database(self, db):
+        """Makes a database known to the client without loading any of its
+        collections."""
+        self.dbs.setdefault(db["name"], defaultdict(dict))
+
+    def load_collection(self, db, collname):
+        """Loads a single collection of a database, unless it is already
+        loaded, and returns it.
+
+        None is returned if the database has no such collection.
+        """
+        colls = self.dbs[db["name"]]
+        if collname not in colls:
+            dbpath = dbpathname(db, self.rc)
+            db = dict(db, whitelist=[collname])
+            self.load_json(db, dbpath)
+            self.load_yaml(db, dbpath)
+        return colls.get(collname)
+
+    def available_collections(self, db):
+        """Returns the names of all the collections in a database, whether
+        they are loaded or not."""
+        dbpath = dbpathname(db, self.rc)
+        names = {}
+        for pattern in ("*.json", "*.y*ml"):
+            for file in iglob(os.path.join(dbpath, pattern)):
+                if file not in db["blacklist"]:
+                    names[os.path.splitext(os.path.basename(file))[0]] = None
+        names.update(dict.fromkeys(self.dbs[db["name"]]))
+        return list(names)
+
     def dump_json(self, docs, collname, dbpath):
         """Dumps json docs and returns filename."""
         f = os.path.join(dbpath, collname + ".json")
@@ -201,12 +361,49 @@ class FileSystemClient:
         filename = os.path.split(f)[-1]
         return filename
 
+    def dump_journal(self, docs, collname, dbpath, dbname, ids):
+        """Appends the changes to the given documents to the journal of a
+        collection and returns the filename."""
+        entries = [
+            {"op": "put", "_id": _id, "doc": docs[_id]} if _id in docs else {"op": "delete", "_id": _id}
+            for _id in sorted(ids, key=str)
+        ]
+        f = os.path.join(dbpath, collname + JOURNAL_EXT)
+        append_journal(f, entries)
+        journals = self._journals[dbname]
+        journals[collname] = journals.get(collname, 0) + len(entries)
+        return os.path.split(f)[-1]
+
+    def _use_journal(self, dbname, collname, ids):
+        if not self.rc._get("fs_journal", False) or ids is None or collname not in self._collfiletypes:
+            return False
+        threshold = self.rc._get("fs_journal_max_entries", 200)
+        return self._journals[dbname].get(collname, 0) + len(ids) <= threshold
+
     def dump_database(self, db):
-        """Dumps a database back to the filesystem."""
+        """Dumps the changed collections of a database back to the
+        filesystem and returns the paths of the files written.
+
+        With ``fs_journal`` set in the run control, the changed documents are
+        appended to the journal of their collection instead of rewriting the
+        collection file. A collection is compacted, i.e. written in full with
+        its journal removed, when the journal would grow past
+        ``fs_journal_max_entries`` entries or when it was flagged as
+        changed as a whole.
+        """
         dbpath = dbpathname(db, self.rc)
         os.makedirs(dbpath, exist_ok=True)
         to_add = []
+        dirty = self._dirty[db["name"]]
         for collname, collection in self.dbs[db["name"]].items():
+            if collname not in dirty:
+                continue
+            ids = dirty.pop(collname)
+            if self._use_journal(db["name"], collname, ids):
+                if ids:
+                    filename = self.dump_journal(collection, collname, dbpath, db["name"], ids)
+                    to_add.append(os.path.join(db["path"], filename))
+                continue
             # print("dumping " + collname + "...", file=sys.stderr)
             filetype = self._collfiletypes.get(collname, "yaml")
             if filetype == "json":
@@ -216,8 +413,47 @@ class FileSystemClient:
             else:
                 raise ValueError("did not recognize file type for regolith")
             to_add.append(os.path.join(db["path"], filename))
+            journal = os.path.join(dbpath, collname + JOURNAL_EXT)
+            if os.path.exists(journal):
+                os.remove(journal)
+                to_add.append(os.path.join(db["path"], collname + JOURNAL_EXT))
+            self._journals[db["name"]].pop(collname, None)
         return to_add
 
+    def compact(self, db):
+        """Flags every collection of a database that has a journal, so that
+        the next dump folds the journal back into the collection file."""
+        dbpath = dbpathname(db, self.rc)
+        for f in iglob(os.path.join(dbpath, "*" + JOURNAL_EXT)):
+            collname = os.path.basename(f)[: -len(JOURNAL_EXT)]
+            if self.load_collection(db, collname) is not None:
+                self.mark_dirty(db["name"], collname)
+
+    def mark_dirty(self, dbname, collname=None, doc_id=None):
+        """Flags a collection as changed so that it is written back on the
+        next dump.
+
+        Parameters
+        ----------
+        dbname : str
+            The name of the database.
+        collname : str or None, optional
+            The collection to flag. If None, every loaded collection of the
+            database is flagged.
+        doc_id : str or None, optional
+            The id of the changed document, if known. If None, the whole
+            collection is written back.
+        """
+        dirty = self._dirty[dbname]
+        collnames = list(self.dbs[dbname].keys()) if collname is None else [collname]
+        for name in collnames:
+            ids = dirty.get(name, set())
+            if doc_id is None or ids is None:
+                dirty[name] = None
+            else:
+                ids.add(doc_id)
+                dirty[name] = ids
+
     def close(self):
         self.dbs = None
         self.closed = True
@@ -233,26 +469,34 @@ class FileSystemClient:
         return set(self.dbs[dbname].keys())
 
     def all_documents(self, collname, copy=True):
-        """Returns an iterable over all documents in a collection."""
+        """Returns an iterable over all documents in a collection.
+
+        With ``copy`` each document is wrapped in a copy-on-write
+        ``DocumentView`` so changes made by the caller never reach the
+        database.
+        """
         if copy:
-            return deepcopy(self.chained_db.get(collname, {})).values()
+            return [DocumentView(doc) for doc in self.chained_db.get(collname, {}).values()]
         return self.chained_db.get(collname, {}).values()
 
     def insert_one(self, dbname, collname, doc):
         """Inserts one document to a database/collection."""
         coll = self.dbs[dbname][collname]
         coll[doc["_id"]] = doc
+        self.mark_dirty(dbname, collname, doc["_id"])
 
     def insert_many(self, dbname, collname, docs):
         """Inserts many documents into a database/collection."""
         coll = self.dbs[dbname][collname]
         for doc in docs:
             coll[doc["_id"]] = doc
+            self.mark_dirty(dbname, collname, doc["_id"])
 
     def delete_one(self, dbname, collname, doc):
         """Removes a single document from a collection."""
         coll = self.dbs[dbname][collname]
         del coll[doc["_id"]]
+        self.mark_dirty(dbname, collname, doc["_id"])
 
     def find_one(self, dbname, collname, filter):
         """Finds the first document matching filter."""
@@ -273,3 +517,4 @@ class FileSystemClient:
         newdoc = dict(filter if doc is None else doc)
         newdoc.update(update)
         coll[newdoc["_id"]] = newdoc
+        self.mark_dirty(dbname, collname, newdoc["_id"])
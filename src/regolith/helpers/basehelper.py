@@ -4,10 +4,10 @@ import os
 from glob import glob
 from itertools import groupby
 
-from jinja2 import Environment, FileSystemLoader
 from xonsh.api import subprocess
 
 from regolith.sorters import category_val, date_key, doc_date_key, level_val
+from regolith.templating import shared_environment
 from regolith.tools import LATEX_OPTS, date_to_rfc822, gets, latex_safe, latex_safe_url, month_and_year, rfc822now
 
 
@@ -19,17 +19,7 @@ class HelperBase(object):
         self.bldir = os.path.join(rc.builddir, self.btype)
         # allow subclasses to override
         if not hasattr(self, "env"):
-            self.env = Environment(
-                loader=FileSystemLoader(
-                    [
-                        "templates",
-                        os.path.join(
-                            os.path.dirname(os.path.dirname(__file__)),
-                            "templates",
-                        ),
-                    ]
-                )
-            )
+            self.env = shared_environment(rc)
         self.gtx = {}
         self.construct_global_ctx()
         self.cmds = []
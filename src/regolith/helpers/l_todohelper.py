@@ -111,6 +111,18 @@ class TodoListerHelper(SoutHelperBase):
     btype = HELPER_TARGET
     needed_colls = [f"{TARGET_COLL}", "refereeReports", "proposalReviews"]
 
+    @classmethod
+    def collection_queries(cls, rc):
+        """Only the todos and reviews of the person listed are needed."""
+        assigned_to = rc._get("assigned_to") or rc._get("default_user_id")
+        if not assigned_to:
+            return {}
+        return {
+            TARGET_COLL: {"filter": {"_id": assigned_to}},
+            "refereeReports": {"filter": {"reviewer": assigned_to}},
+            "proposalReviews": {"filter": {"reviewer": assigned_to}},
+        }
+
     def construct_global_ctx(self):
         """Constructs the global context."""
         super().construct_global_ctx()
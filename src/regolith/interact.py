@@ -6,4 +6,4 @@ rc = DEFAULT_RC
 rc._update(load_rcfile("regolithrc.json"))
 filter_databases(rc)
 
-chained_db, dbs = connect_db(rc)
+chained_db, dbs = connect_db(rc, read_only=True)
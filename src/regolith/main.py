@@ -4,19 +4,20 @@ from __future__ import print_function
 
 import copy
 import os
-from argparse import ArgumentParser, Namespace, RawTextHelpFormatter
+import sys
+from argparse import SUPPRESS, ArgumentParser, Namespace, RawTextHelpFormatter
 
 from regolith import __version__, commands
 from regolith.builder import BUILDERS
 from regolith.commands import CONNECTED_COMMANDS, DISCONNECTED_COMMANDS, INGEST_COLL_LU
+from regolith.daemon import forward
 from regolith.database import connect
 from regolith.helper import HELPERS
 from regolith.runcontrol import DEFAULT_RC, filter_databases, load_rcfile
-from regolith.schemas import SCHEMAS
-from regolith.tools import update_schemas
+from regolith.schemas import SCHEMAS, MergedSchemas
 
 NEED_RC = set(CONNECTED_COMMANDS.keys())
-NEED_RC |= {"rc", "deploy", "store"}
+NEED_RC |= {"rc", "deploy", "store", "daemon", "compile-templates", "fs-to-sqlite", "sqlite-to-fs"}
 
 
 def create_parser():
@@ -35,6 +36,26 @@ def create_parser():
     # rc subparser
     subp.add_parser("rc", help="prints run control")
 
+    # daemon subparser
+    subp.add_parser(
+        "daemon",
+        help="keeps the databases loaded and serves helper commands run in this directory until stopped",
+    )
+
+    # compile-templates subparser
+    ctp = subp.add_parser(
+        "compile-templates",
+        help="compiles the templates found from this directory into the template cache of a build "
+        "directory, for example right after installing regolith",
+    )
+    ctp.add_argument(
+        "--builddir",
+        dest="builddir",
+        # not set unless given, so that the builddir of regolithrc.json is used
+        default=SUPPRESS,
+        help="the build directory that holds the template cache, the builddir of regolithrc.json by default",
+    )
+
     # add subparser
     addp = subp.add_parser("add", help="adds a record to a database and collection")
     addp.add_argument("db", help="database name")
@@ -159,6 +180,14 @@ def create_parser():
         "facility:<name>, to build the publications from that facility",
         default=None,
     )
+    bldp.add_argument(
+        "--jobs",
+        "-j",
+        dest="jobs",
+        type=int,
+        default=1,
+        help="number of targets to build concurrently, each in its own process",
+    )
 
     # deploy subparser
     subp.add_parser("deploy", help="deploys what was built by regolith")
@@ -234,11 +263,19 @@ def create_parser():
     mtf.add_argument(
         "--host",
         help="Specifies a resolvable hostname for the mongod to which to connect. By "
-        "default, the mongoexport attempts to connect to a MongoDB instance running "
+        "default, the export attempts to connect to a MongoDB instance running "
         "on the localhost on port number 27017.",
         dest="host",
         default=None,
     )
+    mtf.add_argument(
+        "--jobs",
+        "-j",
+        dest="jobs",
+        type=int,
+        default=None,
+        help="number of collections to export concurrently, 4 by default",
+    )
 
     # fs-to-mongo subparser
     ftm = subp.add_parser(
@@ -251,11 +288,38 @@ def create_parser():
     ftm.add_argument(
         "--host",
         help="Specifies a resolvable hostname for the mongod to which to connect. By "
-        "default, the mongoimport attempts to connect to a MongoDB instance running "
+        "default, the import attempts to connect to a MongoDB instance running "
         "on the localhost on port number 27017.",
         dest="host",
         default=None,
     )
+    ftm.add_argument(
+        "--jobs",
+        "-j",
+        dest="jobs",
+        type=int,
+        default=None,
+        help="number of collections to import concurrently, 4 by default",
+    )
+
+    # fs-to-sqlite subparser
+    subp.add_parser(
+        "fs-to-sqlite",
+        help="Import the databases from the filesystem into a SQLite file per database, "
+        "next to the collection files, for use with the sqlite backend.",
+    )
+
+    # sqlite-to-fs subparser
+    subp.add_parser(
+        "sqlite-to-fs",
+        help="Export the databases from their SQLite files to the collection files they were imported from.",
+    )
+
+    # compact subparser
+    subp.add_parser(
+        "compact",
+        help="Folds the change journals of the filesystem databases back into their collection files.",
+    )
 
     # GitHub extractor subparser
     ghe = subp.add_parser(
@@ -275,6 +339,14 @@ def create_parser():
         default=None,
         help="If provided only validate that collection",
     )
+    val.add_argument(
+        "--jobs",
+        "-j",
+        dest="jobs",
+        type=int,
+        default=1,
+        help="number of processes to validate the collections with",
+    )
     return p
 
 
@@ -287,6 +359,12 @@ def main(args=None):
         print(__version__)
         return rc
     if args1.cmd == "helper":
+        # a running daemon has the databases loaded already
+        status = forward(["helper"] + rest)
+        if status is not None:
+            if status:
+                sys.exit(status)
+            return rc
         p = ArgumentParser(prog="regolith helper")
         p.add_argument(
             "helper_target",
@@ -310,9 +388,7 @@ def main(args=None):
         rc._update(load_rcfile("regolithrc.json"))
     rc._update(ns.__dict__)
     if "schemas" in rc._dict:
-        user_schema = copy.deepcopy(rc.schemas)
-        default_schema = copy.deepcopy(SCHEMAS)
-        rc.schemas = update_schemas(default_schema, user_schema)
+        rc.schemas = MergedSchemas(SCHEMAS, rc.schemas)
     else:
         rc.schemas = SCHEMAS
     if ns.cmd in NEED_RC:
@@ -325,7 +401,8 @@ def main(args=None):
             dbs = commands.build_db_check(rc)
         elif rc.cmd == "helper":
             dbs = commands.helper_db_check(rc)
-        with connect(rc, dbs=dbs) as rc.client:
+        read_only = commands.read_only_check(rc)
+        with connect(rc, dbs=dbs, read_only=read_only) as rc.client:
             CONNECTED_COMMANDS[rc.cmd](rc)
     return rc
 
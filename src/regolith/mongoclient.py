@@ -1,22 +1,22 @@
 """Client interface for MongoDB.
 
-Maintained such that only pymongo is necessary when using
-helper/builders, and additional command-line tools are necessary to
-install for maintenance tasks, such as fs-to-mongo.
+Maintained such that only pymongo is necessary, both when using
+helper/builders and for maintenance tasks, such as fs-to-mongo.
 """
 
 import datetime
-import itertools
+import hashlib
+import json
 import os
+import pickle
 import shutil
 import subprocess
 import sys
 import time
 import urllib
 from collections import defaultdict
-from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from tempfile import TemporaryDirectory
 
 from ruamel.yaml import YAML
 
@@ -39,8 +39,18 @@ except ImportError:
 from pymongo.collection import Collection
 
 from regolith import fsclient
+from regolith.chained_db import DocumentView
 from regolith.tools import dbpathname, fallback
 
+# the number of documents sent or fetched at once by fs-to-mongo and mongo-to-fs
+SYNC_BATCH_SIZE = 1000
+# the number of collections synced concurrently by default
+SYNC_JOBS = 4
+# the number of documents fetched at once when loading a collection
+LOAD_BATCH_SIZE = 1000
+# the collection in which the write methods stamp the documents they change
+CHANGELOG_COLL = "regolith_changelog"
+
 if not MONGO_AVAILABLE:
     ON_PYMONGO_V2 = ON_PYMONGO_V3 = False
 elif pymongo.version.split(".")[0] == "2":
@@ -51,109 +61,164 @@ else:
     ON_PYMONGO_V3 = True
 
 
-def import_jsons(dbpath: str, dbname: str, host: str = None, uri: str = None) -> None:
-    """Import the json files to mongo db.
+def mongo_yaml_loader() -> YAML:
+    """A YAML loader that leaves dates as ISO strings, which is how they are
+    stored in mongo."""
+    loader = YAML(typ="safe")
+    loader.constructor.yaml_constructors["tag:yaml.org,2002:timestamp"] = loader.constructor.yaml_constructors[
+        "tag:yaml.org,2002:str"
+    ]
+    return loader
+
+
+def load_collection_file(filename: str) -> dict:
+    """Load the documents of a JSON or YAML collection file, with the changes of its journal applied and their
+    dates as ISO strings."""
+    if str(filename).endswith(".json"):
+        docs = fsclient.load_json(filename)
+    else:
+        docs = fsclient.load_yaml(filename, loader=mongo_yaml_loader())
+    if fsclient.replay_collection_journal(filename, docs):
+        # the journal reads dates back as dates
+        docs = json.loads(json.dumps(docs, default=_bson_encoder))
+    return docs
+
+
+def import_collection(col: Collection, docs: dict, batch_size: int = SYNC_BATCH_SIZE, record: bool = False) -> int:
+    """Upsert documents into a mongo collection.
 
-    Each json file will be a collection in the database. The _id will be the same as it is in the json file.
+    The documents are sent in batches of bulk writes. Each batch first fetches the stored versions of its
+    documents in a single query, and only the documents that are new or differ from the stored ones are written.
 
     Parameters
     ----------
-    dbpath : str
-        The path to the db folder.
+    col : Collection
+        The mongodb collection.
+    docs : dict
+        The documents, keyed by their '_id'.
+    batch_size : int
+        The number of documents sent at once.
+    record : bool
+        Whether to stamp the written documents in the changelog, for the local caches of the collection.
+
+    Returns
+    -------
+    n : int
+        The number of documents written.
+    """
+    docs = list(docs.values())
+    written = 0
+    for start in range(0, len(docs), batch_size):
+        batch = docs[start : start + batch_size]
+        stored = {doc["_id"]: doc for doc in col.find({"_id": {"$in": [doc["_id"] for doc in batch]}})}
+        changed = [doc for doc in batch if stored.get(doc["_id"]) != doc]
+        if changed:
+            col.bulk_write(
+                [pymongo.ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in changed], ordered=False
+            )
+            if record:
+                record_changes(col.database, col.name, [doc["_id"] for doc in changed])
+            written += len(changed)
+    return written
+
+
+def _bson_encoder(obj):
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    # ObjectIds and the like
+    return str(obj)
+
 
-    dbname : str
-        The name of the database in mongo.
+def export_collection(col: Collection, filename: str, batch_size: int = SYNC_BATCH_SIZE) -> bool:
+    """Write a mongo collection to a JSON file in the filesystem layout.
 
-    host : str
-        The hostname or IP address or Unix domain socket path of a single mongod or mongos instance to connect
-        to, or a mongodb URI, or a list of hostnames / mongodb URIs.
+    The documents are written one per line, sorted by '_id', as ``fsclient.dump_json`` does. The file is left
+    untouched if its content would not change.
 
-    uri : str
-        Specify a resolvable URI connection string (enclose in quotes) to connect to the MongoDB deployment.
+    Parameters
+    ----------
+    col : Collection
+        The mongodb collection.
+    filename : str
+        The path of the JSON file.
+    batch_size : int
+        The number of documents fetched from the server at once.
+
+    Returns
+    -------
+    written : bool
+        Whether the file was written.
     """
-    for json_path in Path(dbpath).glob("*.json"):
-        cmd = ["mongoimport"]
-        if host is not None:
-            cmd += ["--host", host, "--db", dbname]
-        if uri is not None:
-            cmd += ["--uri", uri]
-        cmd += ["--collection", json_path.stem, "--file", str(json_path)]
-        try:
-            subprocess.check_call(cmd, stderr=subprocess.STDOUT)
-        except FileNotFoundError:
-            print(
-                "mongoimport command not found in environment path.\n\n"
-                "If mongo server v4.4+ installed, download MongoDB Database Tools from:"
-                " https://www.mongodb.com/try/download/database-tools\n"
-                "and add C:\\Program Files\\MongoDB\\Tools\\<ToolsVersion>\\bin\\ to path.\n\n"
-                "If mongo server <v4.4, ensure that C:\\Program Files\\MongoDB\\Server\\<ServerVersion>\\bin\\ \n"
-                "has been added to the environment path.\n"
-            )
-            print("..................Upload failed..................")
-        except subprocess.CalledProcessError as exc:
-            print("Status : FAIL", exc.returncode, exc.output)
-            raise exc
-    return
+    docs = sorted(col.find({}, batch_size=batch_size), key=lambda doc: str(doc["_id"]))
+    s = "\n".join(json.dumps(doc, sort_keys=True, default=_bson_encoder) for doc in docs)
+    if os.path.exists(filename):
+        with open(filename, encoding="utf-8") as fh:
+            if fh.read() == s:
+                return False
+    with open(filename, "w", encoding="utf-8") as fh:
+        fh.write(s)
+    return True
+
+
+def import_files(filenames: list, mongodb, jobs: int = SYNC_JOBS, record: bool = False) -> None:
+    """Import collection files into a mongo database, several collections at a time.
+
+    Each file will be a collection in the database, named after the file. The _id will be the same as it is
+    in a json file, or the key of each doc in a yaml file.
+
+    Parameters
+    ----------
+    filenames : list of str
+        The paths of the JSON and YAML collection files.
+    mongodb : Database
+        The mongodb database.
+    jobs : int
+        The number of collections imported concurrently.
+    record : bool
+        Whether to stamp the written documents in the changelog, for the local caches of the collections.
+    """
+
+    def work(filename):
+        collname = Path(filename).stem
+        docs = load_collection_file(filename)
+        n = import_collection(mongodb[collname], docs, record=record)
+        print(f"{collname}: {n} of {len(docs)} documents written", file=sys.stderr)
 
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        list(pool.map(work, filenames))
 
-def import_yamls(dbpath: str, dbname: str, host: str = None, uri: str = None) -> None:
-    """Import the yaml files to mongo db.
 
-    Each yaml file will be a collection in the database. The _id will be the id_key for each doc in the yaml file.
+def export_collections(mongodb, collnames: list, dbpath: str, jobs: int = SYNC_JOBS) -> list:
+    """Export collections of a mongo database to JSON files, several collections at a time.
 
     Parameters
     ----------
+    mongodb : Database
+        The mongodb database.
+    collnames : list of str
+        The names of the collections.
     dbpath : str
         The path to the db folder.
+    jobs : int
+        The number of collections exported concurrently.
 
-    dbname : str
-        The name of the database in mongo.
+    Returns
+    -------
+    filenames : list of str
+        The names of the files that were written, i.e. that changed.
+    """
 
-    host : str
-        The hostname or IP address or Unix domain socket path of a single mongod or mongos instance to connect
-        to, or a mongodb URI, or a list of hostnames / mongodb URIs.
+    def work(collname):
+        filename = collname + ".json"
+        return filename if export_collection(mongodb[collname], os.path.join(dbpath, filename)) else None
 
-    uri : str
-        Specify a resolvable URI connection string (enclose in quotes) to connect to the MongoDB deployment.
-    """
-    yaml_files = itertools.chain(Path(dbpath).glob("*.yaml"), Path(dbpath).glob("*.yml"))
-    with TemporaryDirectory() as tempd:
-        for yaml_file in yaml_files:
-            json_file = Path(tempd).joinpath(yaml_file.with_suffix(".json").name)
-            loader = YAML(typ="safe")
-            loader.constructor.yaml_constructors["tag:yaml.org,2002:timestamp"] = (
-                loader.constructor.yaml_constructors["tag:yaml.org,2002:str"]
-            )
-            fsclient.yaml_to_json(str(yaml_file), str(json_file), loader=loader)
-        import_jsons(tempd, dbname, host=host, uri=uri)
-    return
-
-
-def export_json(collection: str, dbpath: str, dbname: str, host: str = None, uri: str = None) -> None:
-    cmd = ["mongoexport", "--collection", collection]
-    if host is not None:
-        cmd += ["--host", host, "--db", dbname]
-    if uri is not None:
-        cmd += ["--uri", uri]
-    cmd += ["--out", str(os.path.join(dbpath, collection + ".json"))]
-    try:
-        subprocess.check_call(cmd, stderr=subprocess.STDOUT)
-    except FileNotFoundError:
-        print(
-            "mongoexport command not found in environment path.\n\n"
-            "If mongo server v4.4+ installed, download MongoDB Database Tools from:"
-            " https://www.mongodb.com/try/download/database-tools\n"
-            "and add C:\\Program Files\\MongoDB\\Tools\\<ToolsVersion>\\bin\\ to path.\n\n"
-            "If mongo server <v4.4, ensure that C:\\Program Files\\MongoDB\\Server\\<ServerVersion>\\bin\\ \n"
-            "has been added to the environment path.\n"
-        )
-        print("..................Upload failed..................")
-    except subprocess.CalledProcessError as exc:
-        print("Status : FAIL", exc.returncode, exc.output)
-        raise exc
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        return [filename for filename in pool.map(work, collnames) if filename is not None]
 
 
-def load_mongo_col(col: Collection) -> dict:
+def load_mongo_col(
+    col: Collection, filter: dict = None, projection=None, batch_size: int = LOAD_BATCH_SIZE
+) -> dict:
     """Load the pymongo collection to a dictionary.
 
     In the dictionary. The key will be the '_id' and in each value which is a dictionary there will also be a
@@ -163,13 +228,108 @@ def load_mongo_col(col: Collection) -> dict:
     ----------
     col : Collection
         The mongodb collection.
+    filter : dict, optional
+        The query the documents must match on the server. All documents are loaded by default.
+    projection : list or dict, optional
+        The fields of the documents to load, as taken by ``Collection.find``. All fields are loaded by default.
+    batch_size : int, optional
+        The number of documents fetched from the server at once.
 
     Returns
     -------
     dct : dict
         A dictionary with all the info in the collection.
     """
-    return {doc["_id"]: doc for doc in col.find({})}
+    return {doc["_id"]: doc for doc in col.find(filter or {}, projection, batch_size=batch_size)}
+
+
+def collection_names(mongodb) -> list:
+    """The names of the collections of a mongo database, without the changelog."""
+    return [coll for coll in mongodb.list_collection_names() if coll != CHANGELOG_COLL]
+
+
+def record_changes(mongodb, collname: str, ids) -> None:
+    """Stamp documents of a collection as changed, with the time of the server, in the changelog of the database.
+
+    The changelog holds one entry per changed document, so that local caches of the collection can fetch only
+    the documents changed since they were last synced.
+
+    Parameters
+    ----------
+    mongodb : Database
+        The mongodb database.
+    collname : str
+        The name of the collection.
+    ids : iterable
+        The '_id' of the changed, inserted or deleted documents.
+    """
+    requests = [
+        pymongo.UpdateOne(
+            {"_id": f"{collname}/{_id}"},
+            {"$set": {"coll": collname, "doc_id": _id}, "$currentDate": {"updated_at": True}},
+            upsert=True,
+        )
+        for _id in ids
+    ]
+    if requests:
+        mongodb[CHANGELOG_COLL].bulk_write(requests, ordered=False)
+
+
+def load_mongo_col_cached(col: Collection, cachefile: str) -> dict:
+    """Load the pymongo collection to a dictionary through a local cache.
+
+    The cache holds the documents of the collection and the time of the last change in the changelog that they
+    include. Only the documents stamped in the changelog since then are fetched from the server. The whole
+    collection is loaded again if the cache is missing, or if the number of documents no longer matches that of
+    the server, as happens when documents are inserted or deleted without being stamped.
+
+    Parameters
+    ----------
+    col : Collection
+        The mongodb collection.
+    cachefile : str
+        The path of the cache file of the collection.
+
+    Returns
+    -------
+    dct : dict
+        A dictionary with all the info in the collection.
+    """
+    changelog = col.database[CHANGELOG_COLL]
+    try:
+        with open(cachefile, "rb") as fh:
+            synced, docs = pickle.load(fh)
+    except Exception:
+        # missing, stale or unreadable caches are simply rebuilt
+        synced, docs = None, None
+    if docs is not None:
+        query = {"coll": col.name} if synced is None else {"coll": col.name, "updated_at": {"$gte": synced}}
+        changes = list(changelog.find(query, {"doc_id": 1, "updated_at": 1}))
+        ids = [change["doc_id"] for change in changes]
+        fetched = {doc["_id"]: doc for doc in col.find({"_id": {"$in": ids}})} if ids else {}
+        for _id in ids:
+            if _id in fetched:
+                docs[_id] = fetched[_id]
+            else:
+                docs.pop(_id, None)
+        synced = max([change["updated_at"] for change in changes] + ([synced] if synced else []), default=None)
+        if col.estimated_document_count() != len(docs):
+            docs = None
+    if docs is None:
+        # the changes made while loading are fetched again on the next sync
+        latest = changelog.find_one({"coll": col.name}, sort=[("updated_at", -1)])
+        synced = None if latest is None else latest["updated_at"]
+        docs = load_mongo_col(col)
+    os.makedirs(os.path.dirname(cachefile), exist_ok=True)
+    tmpfile = cachefile + ".{}.tmp".format(os.getpid())
+    try:
+        with open(tmpfile, "wb") as fh:
+            pickle.dump((synced, docs), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpfile, cachefile)
+    except (OSError, pickle.PicklingError, TypeError, AttributeError):
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+    return docs
 
 
 def doc_cleanup(doc: dict):
@@ -252,6 +412,8 @@ class MongoClient:
         self.client = None
         self.proc = None
         self.dbs = defaultdict(lambda: defaultdict(dict))
+        # (database, collection) pairs loaded with a query, so only in part
+        self._partial = set()
         self.chained_db = dict()
         self.closed = True
         self.local = True
@@ -367,7 +529,9 @@ class MongoClient:
     def load_database(self, db: dict):
         """Load the database information from mongo database.
 
-        It populate the 'dbs' attribute with a dictionary like {database: {collection: docs_dict}}.
+        It populate the 'dbs' attribute with a dictionary like {database: {collection: docs_dict}}. The
+        collections with a query in the 'collection_queries' of the rc only hold the documents and fields
+        that the query selects on the server.
 
         Parameters
         ----------
@@ -385,11 +549,10 @@ class MongoClient:
         try:
             for colname in [
                 coll
-                for coll in mongodb.list_collection_names()
+                for coll in collection_names(mongodb)
                 if coll not in db["blacklist"] and len(db["whitelist"]) == 0 or coll in db["whitelist"]
             ]:
-                col = mongodb[colname]
-                dbs[db["name"]][colname] = load_mongo_col(col)
+                dbs[db["name"]][colname] = self._load_col(db, mongodb, colname)
         except OperationFailure as fail:
             print("Mongo's Error Message:" + str(fail) + "\n")
             print("The user does not have permission to access " + db["name"] + "\n\n")
@@ -399,24 +562,108 @@ class MongoClient:
             )
         return
 
-    def import_database(self, db: dict):
-        """Import the database from filesystem to the mongo backend.
+    def _load_col(self, db: dict, mongodb, collname: str) -> dict:
+        """Load a collection, applying the query declared for it in the
+        'collection_queries' of the rc, if any, on the server. Whole
+        collections go through the local cache if 'mongo_cache' is set in
+        the rc."""
+        query = (self.rc._get("collection_queries") or {}).get(collname)
+        if not query:
+            if not self.rc._get("mongo_cache", False):
+                return load_mongo_col(mongodb[collname])
+            key = hashlib.sha1("{}/{}/{}".format(db.get("url"), db["name"], collname).encode("utf-8")).hexdigest()
+            cachefile = os.path.join(self.rc.builddir, "_mongocache", key + ".pkl")
+            return load_mongo_col_cached(mongodb[collname], cachefile)
+        self._partial.add((db["name"], collname))
+        return load_mongo_col(mongodb[collname], query.get("filter"), query.get("projection"))
+
+    def register_database(self, db: dict):
+        """Make a database known to the client without loading any of its
+        collections.
 
         Parameters
         ----------
         db : dict
             The dictionary of data base information, such as 'name'.
         """
+        self.dbs.setdefault(db["name"], defaultdict(dict))
+
+    def load_collection(self, db: dict, collname: str):
+        """Load a single collection from the mongo database, unless it is
+        already loaded.
+
+        Parameters
+        ----------
+        db : dict
+            The dictionary of data base information, such as 'name'.
+        collname : str
+            The name of the collection.
+
+        Returns
+        -------
+        coll : dict or None
+            The loaded collection, or None if the database has no such collection.
+        """
+        colls = self.dbs[db["name"]]
+        if collname not in colls:
+            mongodb = self.client[db["name"]]
+            if mongodb.list_collection_names(filter={"name": collname}):
+                colls[collname] = self._load_col(db, mongodb, collname)
+        return colls.get(collname)
+
+    def available_collections(self, db: dict) -> list:
+        """Return the names of all the collections in the mongo database,
+        whether they are loaded or not.
+
+        Parameters
+        ----------
+        db : dict
+            The dictionary of data base information, such as 'name'.
+        """
+        mongodb = self.client[db["name"]]
+        names = dict.fromkeys(coll for coll in collection_names(mongodb) if coll not in db["blacklist"])
+        names.update(dict.fromkeys(self.dbs[db["name"]]))
+        return list(names)
+
+    def _sync_target(self, db: dict):
+        """The client and database that fs-to-mongo and mongo-to-fs sync with: the one at the 'dst_url' of the
+        database if it has one, or else the one named after it on the host of the rc, localhost by default."""
         host = getattr(self.rc, "host", None)
         uri = db.get("dst_url", None)
         # Catch the easy/common regolith rc error of putting the db uri as localhost rather than host
         if uri == "localhost":
             uri = None
             host = "localhost"
-        dbpath = dbpathname(db, self.rc)
-        dbname = db["name"]
-        import_jsons(dbpath, dbname, host=host, uri=uri)
-        import_yamls(dbpath, dbname, host=host, uri=uri)
+        if uri is not None:
+            client = pymongo.MongoClient(uri)
+            return client, client.get_default_database(default=db["name"])
+        client = pymongo.MongoClient(host)
+        return client, client[db["name"]]
+
+    def import_database(self, db: dict):
+        """Import the database from filesystem to the mongo backend.
+
+        Parameters
+        ----------
+        db : dict
+            The dictionary of data base information, such as 'name'.
+        """
+        dbpath = Path(dbpathname(db, self.rc))
+        blacklist = db.get("blacklist", [])
+        filenames = [
+            str(f)
+            for pattern in ("*.json", "*.yaml", "*.yml")
+            for f in sorted(dbpath.glob(pattern))
+            if f.name not in blacklist
+        ]
+        client, mongodb = self._sync_target(db)
+        with client:
+            import_files(
+                filenames,
+                mongodb,
+                jobs=self.rc._get("jobs") or SYNC_JOBS,
+                record=self.rc._get("mongo_cache", False),
+            )
         return
 
     def export_database(self, db: dict):
@@ -427,42 +674,22 @@ class MongoClient:
         db : dict
             The dictionary of data base information, such as 'name'.
         """
-        host = getattr(self.rc, "host", None)
-        uri = db.get("dst_url", None)
-        # Catch the easy/common regolith rc error of putting the db uri as localhost rather than host
-        if uri == "localhost":
-            uri = None
-            host = "localhost"
         dbpath = os.path.abspath(dbpathname(db, self.rc))
-        dbname = db["name"]
-        for collection in self.dbs[dbname].keys():
-            export_json(collection, dbpath, dbname, host=host, uri=uri)
+        os.makedirs(dbpath, exist_ok=True)
+        client, mongodb = self._sync_target(db)
+        with client:
+            collnames = [coll for coll in collection_names(mongodb) if coll not in db.get("blacklist", [])]
+            export_collections(mongodb, collnames, dbpath, jobs=self.rc._get("jobs") or SYNC_JOBS)
         return
 
     def dump_database(self, db):
-        """Dumps a database dict via mongoexport."""
+        """Dumps a database to JSON files and returns the paths of the files
+        that changed."""
         dbpath = dbpathname(db, self.rc)
         os.makedirs(dbpath, exist_ok=True)
-        to_add = []
-        colls = self.client[db["name"]].collection_names(include_system_collections=False)
-        for collection in colls:
-            f = os.path.join(dbpath, collection + ".json")
-            cmd = [
-                "mongoexport",
-                "--db",
-                db["name"],
-                "--collection",
-                collection,
-                "--out",
-                f,
-            ]
-            try:
-                subprocess.check_call(cmd, stderr=subprocess.STDOUT)
-            except subprocess.CalledProcessError as exc:
-                print("Status : FAIL", exc.returncode, exc.output)
-                raise exc
-            to_add.append(os.path.join(db["path"], collection + ".json"))
-        return to_add
+        mongodb = self.client[db["name"]]
+        filenames = export_collections(mongodb, collection_names(mongodb), dbpath)
+        return [os.path.join(db["path"], filename) for filename in filenames]
 
     def close(self):
         """Closes the database connection."""
@@ -477,59 +704,123 @@ class MongoClient:
 
     def collection_names(self, dbname, include_system_collections=True):
         """Returns the collection names for the database name."""
-        return self.client[dbname].collection_names()
+        return collection_names(self.client[dbname])
 
     def all_documents(self, collname, copy=True):
-        """Returns an iterable over all documents in a collection."""
+        """Returns an iterable over all documents in a collection.
+
+        With ``copy`` each document is wrapped in a copy-on-write
+        ``DocumentView`` so changes made by the caller never reach the
+        database.
+        """
         if copy:
-            return deepcopy(self.chained_db.get(collname, {})).values()
+            return [DocumentView(doc) for doc in self.chained_db.get(collname, {}).values()]
         return self.chained_db.get(collname, {}).values()
 
-    def insert_one(self, dbname, collname, doc):
-        """Inserts one document to a database/collection."""
-        doc = doc_cleanup(doc)
-        valid, potential_error = validate_doc(collname, doc, self.rc)
-        if not valid:
-            raise ValueError(potential_error)
-        coll = self.client[dbname][collname]
-        if ON_PYMONGO_V2:
-            i = coll.insert(doc)
-            return InsertOneProxy(i, True)
-        else:
-            return coll.insert_one(doc)
+    def write_many(self, dbname, collname, inserts=(), updates=(), deletes=(), ordered=True, upsert=False):
+        """Validates a batch of changes to a collection and sends the valid
+        ones to the server in a single bulk write.
 
-    def insert_many(self, dbname, collname, docs):
-        """Inserts many documents into a database/collection."""
-        docs = [doc_cleanup(doc) for doc in docs]
+        The documents that the updates apply to are validated against their
+        copies already loaded in the session, or else fetched together in a
+        single query.
 
-        screened_docs = []
-        full_error = ""
-        for doc in docs:
+        Parameters
+        ----------
+        dbname : str
+            The name of the database.
+        collname : str
+            The name of the collection.
+        inserts : iterable of dict, optional
+            The documents to insert.
+        updates : iterable of tuple, optional
+            ``(filter, update)`` pairs, where ``filter`` holds the ``_id`` of
+            the document and ``update`` the fields to set on it.
+        deletes : iterable of dict, optional
+            The documents to remove. Only their ``_id`` is used.
+        ordered : bool, optional
+            If True, the server applies the writes in order and stops at the
+            first one that fails. If False, it may apply them in any order and
+            attempts all of them.
+        upsert : bool, optional
+            Whether an update of a missing document inserts it.
+
+        Returns
+        -------
+        result : BulkWriteResult or None
+            The result of the bulk write, or None if nothing was sent.
+        errors : dict
+            The validation errors of the documents that were not written,
+            keyed by their ``_id``.
+        """
+        coll = self.client[dbname][collname]
+        # a partially loaded collection can neither be validated against nor kept up to date
+        loaded = None if (dbname, collname) in self._partial else self.dbs[dbname].get(collname)
+        requests, mirror, errors = [], [], {}
+        for doc in inserts:
+            doc = doc_cleanup(doc)
             valid, potential_error = validate_doc(collname, doc, self.rc)
             if not valid:
-                screened_docs.append(doc)
-                full_error += potential_error
-                full_error += "\n"
-        if len(screened_docs) != 0:
+                errors[doc["_id"]] = potential_error
+                continue
+            requests.append(pymongo.InsertOne(doc))
+            mirror.append((doc["_id"], doc))
+        updates = list(updates)
+        ids = [filter["_id"] for filter, _ in updates]
+        missing = [_id for _id in ids if loaded is None or _id not in loaded]
+        current = {doc["_id"]: doc for doc in coll.find({"_id": {"$in": missing}})} if missing else {}
+        for filter, update in updates:
+            _id = filter["_id"]
+            doc = loaded[_id] if loaded is not None and _id in loaded else current.get(_id)
+            newdoc = dict(filter if doc is None else doc)
+            newdoc.update(update)
+            valid, potential_error = validate_doc(collname, newdoc, self.rc)
+            if not valid:
+                errors[_id] = potential_error
+                continue
+            update = bson_cleanup(update)
+            requests.append(pymongo.UpdateOne(filter, {"$set": update}, upsert=upsert))
+            if doc is not None or upsert:
+                stored = dict(bson_cleanup(dict(filter)) if doc is None else doc)
+                stored.update(update)
+                mirror.append((_id, stored))
+        for doc in deletes:
+            requests.append(pymongo.DeleteOne({"_id": doc["_id"]}))
+            mirror.append((doc["_id"], None))
+        if not requests:
+            return None, errors
+        result = coll.bulk_write(requests, ordered=ordered)
+        if self.rc._get("mongo_cache", False):
+            record_changes(self.client[dbname], collname, [_id for _id, _ in mirror])
+        if loaded is not None:
+            for _id, doc in mirror:
+                if doc is None:
+                    loaded.pop(_id, None)
+                else:
+                    loaded[_id] = doc
+        return result, errors
+
+    def insert_one(self, dbname, collname, doc):
+        """Inserts one document to a database/collection."""
+        result, errors = self.write_many(dbname, collname, inserts=[doc])
+        if errors:
+            raise ValueError(next(iter(errors.values())))
+        return result
+
+    def insert_many(self, dbname, collname, docs):
+        """Inserts many documents into a database/collection. Documents that
+        fail validation are reported and skipped."""
+        result, errors = self.write_many(dbname, collname, inserts=docs)
+        if errors:
             print("The following documents failed validation and were not uploaded\n")
-            for doc in screened_docs:
-                print(full_error)
-                if doc in docs:
-                    docs.remove(doc)
-        coll = self.client[dbname][collname]
-        if ON_PYMONGO_V2:
-            return coll.insert(docs)
-        else:
-            return coll.insert_many(docs)
+            for potential_error in errors.values():
+                print(potential_error)
+        return result
 
     def delete_one(self, dbname, collname, doc):
         """Removes a single document from a collection."""
-        coll = self.client[dbname][collname]
-        doc = doc_cleanup(doc)
-        if ON_PYMONGO_V2:
-            return coll.remove(doc, multi=False)
-        else:
-            return coll.delete_one(doc)
+        result, _ = self.write_many(dbname, collname, deletes=[doc])
+        return result
 
     def find_one(self, dbname, collname, filter):
         """Finds the first document matching filter."""
@@ -538,25 +829,11 @@ class MongoClient:
         doc = coll.find_one(filter)
         return doc
 
-    def update_one(self, dbname, collname, filter, update, **kwargs):
-        """Updates one document."""
-        filter["_id"].replace(".", "")
-        doc = self.find_one(dbname, collname, filter)
-        newdoc = dict(filter if doc is None else doc)
-        newdoc.update(update)
-        valid, potential_error = validate_doc(collname, newdoc, self.rc)
-        if not valid:
-            raise ValueError(potential_error)
-        coll = self.client[dbname][collname]
-        update = bson_cleanup(update)
-        if ON_PYMONGO_V2:
-            doc = coll.find_one(filter)
-            if doc is None:
-                if not kwargs.get("upsert", False):
-                    raise RuntimeError("could not update non-existing document")
-                newdoc = dict(filter)
-                newdoc.update(update["$set"])
-                return self.insert_one(dbname, collname, newdoc)
-            return coll.update(doc, update, **kwargs)
-        else:
-            return coll.find_one_and_update(filter, {"$set": update}, **kwargs)
+    def update_one(self, dbname, collname, filter, update, upsert=False, **kwargs):
+        """Updates one document, inserting it if it is missing and ``upsert``
+        is True. Other keyword arguments are accepted, as by the other
+        backends, and ignored."""
+        result, errors = self.write_many(dbname, collname, updates=[(filter, update)], upsert=upsert)
+        if errors:
+            raise ValueError(errors[filter["_id"]])
+        return result
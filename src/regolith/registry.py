@@ -0,0 +1,45 @@
+"""Registries of targets whose modules are only imported when needed."""
+
+import importlib
+from collections.abc import Mapping
+
+
+def resolve(spec):
+    """Imports the object named by a ``"module:attribute"`` string."""
+    modname, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(modname), attr)
+
+
+class LazyRegistry(Mapping):
+    """A mapping of target names to objects that are imported the first
+    time they are looked up, so that listing the targets or running one of
+    them does not import the modules of all the others.
+
+    Parameters
+    ----------
+    specs : dict
+        Maps each name to a ``"module:attribute"`` string, or to a tuple of
+        them which is resolved into a tuple of objects
+    """
+
+    def __init__(self, specs):
+        self.specs = dict(specs)
+        self._loaded = {}
+
+    def __getitem__(self, name):
+        if name not in self._loaded:
+            spec = self.specs[name]
+            if isinstance(spec, tuple):
+                self._loaded[name] = tuple(resolve(s) for s in spec)
+            else:
+                self._loaded[name] = resolve(spec)
+        return self._loaded[name]
+
+    def __iter__(self):
+        return iter(self.specs)
+
+    def __len__(self):
+        return len(self.specs)
+
+    def __contains__(self, name):
+        return name in self.specs
@@ -271,7 +271,7 @@ def filter_databases(rc):
     rc.databases = dbs
 
 
-def connect_db(rc, colls=None):
+def connect_db(rc, colls=None, read_only=False):
     """Load up the db's.
 
     Parameters
@@ -280,6 +280,8 @@ def connect_db(rc, colls=None):
         The runcontrol instance
     colls
         The list of collections that should be loaded
+    read_only
+        If True, the databases are not dumped back when the connection closes
 
     Returns
     -------
@@ -288,7 +290,7 @@ def connect_db(rc, colls=None):
     dbs:
        The databases in the form of a runcontrol client
     """
-    with connect(rc, dbs=colls) as rc.client:
+    with connect(rc, dbs=colls, read_only=read_only) as rc.client:
         dbs = rc.client.dbs
         chained_db = rc.client.chained_db
     return chained_db, dbs
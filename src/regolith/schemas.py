@@ -1,7 +1,12 @@
 """Database schemas, examples, and tools."""
 
 import copy
+import hashlib
 import json
+import os
+import pickle
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from warnings import warn
 
@@ -142,18 +147,50 @@ def _update_dict_target(d, filter, new_value):
 
 
 def insert_alloweds(doc, alloweds, key):
-    working_doc = copy.deepcopy(doc)
-    for k, v in alloweds.items():
-        working_doc = _update_dict_target(working_doc, {key: k}, v)
-    return working_doc
+    """Replace the names of alloweds found under ``key`` by their values, in
+    a single pass over the flattened document."""
+    flatd = flatten(copy.deepcopy(doc))
+    for k, v in flatd.items():
+        if key in k and isinstance(v, str) and v in alloweds:
+            flatd[k] = alloweds[v]
+    return unflatten(flatd)
 
 
-def load_schemas():
+SCHEMAS_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "regolith")
+
+
+def load_schemas(cachedir=SCHEMAS_CACHE_DIR):
+    """Load the schemas with the alloweds inserted.
+
+    The expanded schemas are pickled in ``cachedir`` under a name keyed on
+    the content of ``schemas.json`` and of the alloweds, so that they are only
+    expanded again when either changes. Pass ``None`` to skip the cache.
+    """
     here = Path(__file__).parent
     schema_file = here / "schemas.json"
-    with open(schema_file, "r", encoding="utf-8") as schema_file:
-        raw_schemas = json.load(schema_file)
+    raw = schema_file.read_bytes()
+    cachefile = None
+    if cachedir is not None:
+        key = hashlib.sha1(raw + json.dumps(alloweds, sort_keys=True).encode("utf-8")).hexdigest()
+        cachefile = os.path.join(cachedir, f"schemas-{key}.pickle")
+        try:
+            with open(cachefile, "rb") as fh:
+                return pickle.load(fh)
+        except Exception:
+            # missing or unreadable cache entries are simply rebuilt
+            pass
+    raw_schemas = json.loads(raw.decode("utf-8"))
     schemas = insert_alloweds(raw_schemas, alloweds, "eallowed")
+    if cachefile is not None:
+        tmpfile = cachefile + ".{}.tmp".format(os.getpid())
+        try:
+            os.makedirs(cachedir, exist_ok=True)
+            with open(tmpfile, "wb") as fh:
+                pickle.dump(schemas, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpfile, cachefile)
+        except OSError:
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
     return schemas
 
 
@@ -178,6 +215,47 @@ for s in SCHEMAS:
     }
 
 
+class MergedSchemas(Mapping):
+    """The default schemas with user schemas merged in.
+
+    The schema of each collection is merged, as ``regolith.tools.update_schemas``
+    does, the first time it is looked up, so that neither the default schemas
+    nor the user schemas have to be copied up front.
+
+    Parameters
+    ----------
+    default : dict
+        The default schemas
+    user : dict
+        The user schemas, keyed by collection
+    """
+
+    def __init__(self, default, user):
+        self.default = default
+        self.user = user
+        self._merged = {}
+
+    def __getitem__(self, coll):
+        if coll not in self._merged:
+            if coll not in self.user:
+                return self.default[coll]
+            default, user = self.default.get(coll), self.user[coll]
+            if isinstance(default, dict) and isinstance(user, dict):
+                from regolith.tools import update_schemas
+
+                self._merged[coll] = update_schemas(default, user)
+            else:
+                self._merged[coll] = copy.deepcopy(user)
+        return self._merged[coll]
+
+    def __iter__(self):
+        yield from self.default
+        yield from (coll for coll in self.user if coll not in self.default)
+
+    def __len__(self):
+        return len(set(self.default) | set(self.user))
+
+
 class NoDescriptionValidator(Validator):
     def _validate_description(self, description, field, value):
         """Don't validate descriptions.
@@ -202,6 +280,41 @@ class NoDescriptionValidator(Validator):
             )
 
 
+_VALIDATORS = {}
+
+
+def get_validator(coll, schemas):
+    """Get the compiled validator for a collection.
+
+    The validator is built once per collection and reused for as long as
+    the schema of the collection in ``schemas`` is the object it was built
+    from, or failing that compares equal to it, so that the schema is only
+    compared in full when it was replaced. A schema changed in place is
+    not noticed.
+
+    Parameters
+    ----------
+    coll : str
+        The name of the db in question
+    schemas : dict
+        The schema to validate against
+
+    Returns
+    -------
+    validator : NoDescriptionValidator
+        The validator for the collection
+    """
+    schema = schemas[coll]
+    cached = _VALIDATORS.get(coll)
+    if cached is None or cached[0] is not schema:
+        if cached is None or cached[0] != schema:
+            cached = (schema, NoDescriptionValidator(copy.deepcopy(schema)))
+        else:
+            cached = (schema, cached[1])
+        _VALIDATORS[coll] = cached
+    return cached[1]
+
+
 def validate(coll, record, schemas):
     """Validate a record for a given db.
 
@@ -222,8 +335,81 @@ def validate(coll, record, schemas):
         The errors encountered (if any)
     """
     if coll in schemas:
-        schema = copy.deepcopy(schemas[coll])
-        v = NoDescriptionValidator(schema)
+        v = get_validator(coll, schemas)
         return v.validate(record), v.errors
     else:
         return True, ()
+
+
+def validate_collection(coll, records, schemas):
+    """Validate all the records of a collection in one pass.
+
+    Parameters
+    ----------
+    coll : str
+        The name of the db in question
+    records : dict
+        The records to be validated, keyed by their ids
+    schemas : dict
+        The schema to validate against
+
+    Returns
+    -------
+    errors : dict
+        The errors of each invalid record, keyed by its id, in the order of
+        ``records``. Empty if all the records are valid.
+    """
+    errors = {}
+    if coll not in schemas:
+        return errors
+    v = get_validator(coll, schemas)
+    for doc_id, record in records.items():
+        if not v.validate(record):
+            errors[doc_id] = v.errors
+    return errors
+
+
+def _validate_chunk(coll, records, schema):
+    return validate_collection(coll, records, {coll: schema})
+
+
+def validate_collections(colls, schemas, jobs=1, chunksize=500):
+    """Validate several collections, optionally across a pool of processes.
+
+    Parameters
+    ----------
+    colls : dict
+        The collections to be validated, keyed by their names, each a dict
+        of records keyed by their ids
+    schemas : dict
+        The schema to validate against
+    jobs : int, optional
+        The number of worker processes. The validation runs in this process
+        when it is 1.
+    chunksize : int, optional
+        The maximum number of records sent to a worker at a time
+
+    Returns
+    -------
+    errors : dict
+        The errors of the invalid records of each collection, keyed by the
+        collection name and then the record id, in the order of ``colls``
+        and of the records in each collection
+    """
+    if jobs <= 1:
+        return {name: validate_collection(name, records, schemas) for name, records in colls.items()}
+    from regolith.chained_db import _convert_to_dict
+
+    errors = {name: {} for name in colls}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = []
+        for name, records in colls.items():
+            if name not in schemas:
+                continue
+            items = list(records.items())
+            for i in range(0, len(items), chunksize):
+                chunk = {k: _convert_to_dict(v) for k, v in items[i : i + chunksize]}
+                futures.append((name, pool.submit(_validate_chunk, name, chunk, schemas[name])))
+        for name, future in futures:
+            errors[name].update(future.result())
+    return errors
@@ -0,0 +1,370 @@
+"""Client interface for an embedded SQLite database.
+
+Each database is kept in a single SQLite file, next to where its
+collection files would be, with one table per collection. Documents are
+stored as JSON text, and the ``_id``, ``name`` and date fields are exposed
+as generated columns so that they can be indexed and queried. Dates are
+stored as ISO strings and read back as dates in the fields that the schema
+of the collection declares as dates. Every write is committed in its own
+transaction as soon as it is made.
+"""
+
+import datetime
+import json
+import os
+import sqlite3
+import sys
+from collections import defaultdict
+from collections.abc import Mapping
+from glob import iglob
+
+from regolith import fsclient
+from regolith.chained_db import DocumentView
+from regolith.tools import dbpathname
+
+# the fields exposed as indexed columns of every collection table
+INDEXED_FIELDS = ("_id", "name", "date", "begin_date", "end_date")
+_DATE_TYPES = {"date", "datetime"}
+
+
+def _encode(obj):
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(doc):
+    """Serializes a document to the JSON text stored in the database."""
+    return json.dumps(doc, sort_keys=True, default=_encode)
+
+
+def _rule_types(rule):
+    types = rule.get("type", rule.get("anyof_type", ()))
+    return {types} if isinstance(types, str) else set(types)
+
+
+def _schema_dates(value, rule):
+    """Converts back to dates the ISO strings of a value that its schema
+    rule declares as dates."""
+    if not isinstance(rule, Mapping):
+        return value
+    if isinstance(value, str):
+        types = _rule_types(rule)
+        if "date" in types and len(value) == 10:
+            try:
+                return datetime.date.fromisoformat(value)
+            except ValueError:
+                return value
+        if "datetime" in types:
+            try:
+                return datetime.datetime.fromisoformat(value)
+            except ValueError:
+                return value
+        return value
+    if isinstance(value, dict):
+        schema = rule.get("schema")
+        if isinstance(schema, Mapping):
+            for key, v in value.items():
+                value[key] = _schema_dates(v, schema.get(key))
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            value[i] = _schema_dates(v, rule.get("schema"))
+    return value
+
+
+def loads(text, schema=None):
+    """Deserializes a document stored in the database.
+
+    Parameters
+    ----------
+    text : str
+        The JSON text of the document
+    schema : Mapping, optional
+        The schema of the collection. The fields it declares as dates are
+        read back as dates, everything else is left as stored.
+    """
+    doc = json.loads(text)
+    if schema:
+        doc = _schema_dates(doc, {"type": "dict", "schema": schema})
+    return doc
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _json_path(key):
+    return '$."' + key.replace('"', '\\"') + '"'
+
+
+class SqliteClient:
+    """A client database backed by SQLite files."""
+
+    def __init__(self, rc):
+        self.rc = rc
+        self.closed = True
+        self.dbs = None
+        self.chained_db = None
+        self.open()
+
+    def is_alive(self):
+        return not self.closed
+
+    def open(self):
+        if self.closed:
+            self.dbs = defaultdict(lambda: defaultdict(dict))
+            self.chained_db = {}
+            self._conns = {}
+            self._tables = defaultdict(set)
+            # names of the databases written to in this session
+            self._changed = set()
+            self.closed = False
+
+    def sqlite_path(self, db):
+        """The path of the SQLite file of a database."""
+        return os.path.join(dbpathname(db, self.rc), db["name"] + ".sqlite")
+
+    def _connect(self, db):
+        if db["name"] not in self._conns:
+            path = self.sqlite_path(db)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            conn = sqlite3.connect(path)
+            tables = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+            self._tables[db["name"]] = {name for (name,) in tables if not name.startswith("sqlite_")}
+            self._conns[db["name"]] = conn
+        return self._conns[db["name"]]
+
+    def _create_table(self, dbname, collname):
+        """Creates the table of a collection, with its indexes, if it does
+        not exist yet. Must be called within a transaction."""
+        if collname in self._tables[dbname]:
+            return
+        table = _quote(collname)
+        columns = ", ".join(
+            f"{_quote(field)} GENERATED ALWAYS AS (json_extract(doc, '{_json_path(field)}')) VIRTUAL"
+            for field in INDEXED_FIELDS
+        )
+        conn = self._conns[dbname]
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (doc TEXT NOT NULL, {columns})")
+        for field in INDEXED_FIELDS:
+            unique = "UNIQUE " if field == "_id" else ""
+            index = _quote(f"{collname}_{field}")
+            conn.execute(f"CREATE {unique}INDEX IF NOT EXISTS {index} ON {table} ({_quote(field)})")
+        self._tables[dbname].add(collname)
+
+    def _loads(self, collname, text):
+        schemas = self.rc._get("schemas") or {}
+        return loads(text, schemas.get(collname))
+
+    def load_database(self, db):
+        """Loads a database."""
+        for collname in self.available_collections(db):
+            if len(db["whitelist"]) == 0 or collname in db["whitelist"]:
+                self.load_collection(db, collname)
+
+    def register_database(self, db):
+        """Makes a database known to the client without loading any of its
+        collections."""
+        self._connect(db)
+        self.dbs.setdefault(db["name"], defaultdict(dict))
+
+    def load_collection(self, db, collname):
+        """Loads a single collection of a database, unless it is already
+        loaded, and returns it.
+
+        None is returned if the database has no such collection.
+        """
+        conn = self._connect(db)
+        colls = self.dbs[db["name"]]
+        if collname not in colls and collname in self._tables[db["name"]]:
+            rows = conn.execute(f"SELECT doc FROM {_quote(collname)} ORDER BY _id")
+            colls[collname] = {doc["_id"]: doc for doc in (self._loads(collname, text) for (text,) in rows)}
+        return colls.get(collname)
+
+    def available_collections(self, db):
+        """Returns the names of all the collections in a database, whether
+        they are loaded or not."""
+        self._connect(db)
+        names = dict.fromkeys(sorted(n for n in self._tables[db["name"]] if n not in db["blacklist"]))
+        names.update(dict.fromkeys(self.dbs[db["name"]]))
+        return list(names)
+
+    def import_database(self, db):
+        """Imports the collection files of a database, in the filesystem
+        layout and with their journals applied, into its SQLite file.
+        Imported collections replace the tables of the same name."""
+        dbpath = dbpathname(db, self.rc)
+        conn = self._connect(db)
+        files = list(iglob(os.path.join(dbpath, "*.json"))) + list(iglob(os.path.join(dbpath, "*.y*ml")))
+        for f in sorted(files):
+            if os.path.basename(f) in db.get("blacklist", []) or f in db.get("blacklist", []):
+                continue
+            collname = os.path.splitext(os.path.basename(f))[0]
+            print("importing " + f + "...", file=sys.stderr)
+            docs = fsclient.load_json(f) if f.endswith(".json") else fsclient.load_yaml(f)
+            fsclient.replay_collection_journal(f, docs)
+            with conn:
+                self._create_table(db["name"], collname)
+                conn.execute(f"DELETE FROM {_quote(collname)}")
+                conn.executemany(
+                    f"INSERT INTO {_quote(collname)} (doc) VALUES (?)", [(dumps(d),) for d in docs.values()]
+                )
+            self.dbs[db["name"]].pop(collname, None)
+            self._changed.add(db["name"])
+
+    def export_database(self, db):
+        """Exports the collections of a database from its SQLite file to
+        files in the filesystem layout.
+
+        A collection is written to the file it was imported from, so a
+        collection of a ``.json`` or ``.yml`` file keeps it, and new
+        collections are written to YAML. The journals of the collections,
+        which were applied when they were imported, are removed.
+        """
+        dbpath = dbpathname(db, self.rc)
+        os.makedirs(dbpath, exist_ok=True)
+        for collname in self.available_collections(db):
+            docs = self.load_collection(db, collname)
+            base = os.path.join(dbpath, collname)
+            if os.path.exists(base + ".json"):
+                fsclient.dump_json(base + ".json", docs, date_handler=fsclient.date_encoder)
+            elif os.path.exists(base + ".yml"):
+                fsclient.dump_yaml(base + ".yml", docs)
+            else:
+                fsclient.dump_yaml(base + ".yaml", docs)
+            if os.path.exists(base + fsclient.JOURNAL_EXT):
+                os.remove(base + fsclient.JOURNAL_EXT)
+
+    def dump_database(self, db):
+        """Returns the path of the SQLite file of the database if it was
+        written to in this session. The changes themselves are committed as
+        they are made."""
+        if db["name"] not in self._changed:
+            return []
+        self._changed.discard(db["name"])
+        return [os.path.join(db["path"], os.path.basename(self.sqlite_path(db)))]
+
+    def mark_dirty(self, dbname, collname=None, doc_id=None):
+        """Writes documents of the loaded collections that were changed in
+        place back to the database.
+
+        Parameters
+        ----------
+        dbname : str
+            The name of the database.
+        collname : str or None, optional
+            The collection to write. If None, every loaded collection of the
+            database is written.
+        doc_id : str or None, optional
+            The id of the changed document. If None, the whole collection is
+            written.
+        """
+        collnames = list(self.dbs[dbname].keys()) if collname is None else [collname]
+        for name in collnames:
+            coll = self.dbs[dbname].get(name, {})
+            docs = list(coll.values()) if doc_id is None else [coll[doc_id]] if doc_id in coll else []
+            self._write(dbname, name, docs=docs)
+
+    def close(self):
+        for conn in self._conns.values():
+            conn.close()
+        self._conns = {}
+        self.dbs = None
+        self.closed = True
+
+    def keys(self):
+        return self.dbs.keys()
+
+    def __getitem__(self, key):
+        return self.dbs[key]
+
+    def collection_names(self, dbname, include_system_collections=True):
+        """Returns the collection names for a database."""
+        return set(self._tables[dbname]) | set(self.dbs[dbname].keys())
+
+    def all_documents(self, collname, copy=True):
+        """Returns an iterable over all documents in a collection.
+
+        With ``copy`` each document is wrapped in a copy-on-write
+        ``DocumentView`` so changes made by the caller never reach the
+        database.
+        """
+        if copy:
+            return [DocumentView(doc) for doc in self.chained_db.get(collname, {}).values()]
+        return self.chained_db.get(collname, {}).values()
+
+    def _write(self, dbname, collname, docs=(), delete_ids=()):
+        """Deletes and (re)inserts documents in a single transaction and
+        mirrors the change in the loaded collection."""
+        conn = self._conns[dbname]
+        table = _quote(collname)
+        docs = list(docs)
+        with conn:
+            self._create_table(dbname, collname)
+            ids = list(delete_ids) + [doc["_id"] for doc in docs]
+            conn.executemany(f"DELETE FROM {table} WHERE _id = ?", [(i,) for i in ids])
+            conn.executemany(f"INSERT INTO {table} (doc) VALUES (?)", [(dumps(doc),) for doc in docs])
+        self._changed.add(dbname)
+        coll = self.dbs[dbname].get(collname)
+        if coll is not None:
+            for _id in delete_ids:
+                coll.pop(_id, None)
+            for doc in docs:
+                coll[doc["_id"]] = doc
+
+    def insert_one(self, dbname, collname, doc):
+        """Inserts one document to a database/collection."""
+        self._write(dbname, collname, docs=[doc])
+
+    def insert_many(self, dbname, collname, docs):
+        """Inserts many documents into a database/collection."""
+        self._write(dbname, collname, docs=docs)
+
+    def delete_one(self, dbname, collname, doc):
+        """Removes a single document from a collection."""
+        self._write(dbname, collname, delete_ids=[doc["_id"]])
+
+    def find_one(self, dbname, collname, filter):
+        """Finds the first document matching filter."""
+        if collname not in self._tables[dbname]:
+            return None
+        clauses, params = [], []
+        for key, value in filter.items():
+            if isinstance(value, (datetime.date, datetime.datetime)):
+                value = value.isoformat()
+            if value is None or not isinstance(value, (str, int, float)):
+                # only scalars can be compared in SQL
+                return self._scan(dbname, collname, filter)
+            if key in INDEXED_FIELDS:
+                clauses.append(f"{_quote(key)} = ?")
+            else:
+                clauses.append("json_extract(doc, ?) = ?")
+                params.append(_json_path(key))
+            params.append(value)
+        where = " AND ".join(clauses) or "1"
+        row = (
+            self._conns[dbname]
+            .execute(f"SELECT doc FROM {_quote(collname)} WHERE {where} LIMIT 1", params)
+            .fetchone()
+        )
+        if row is None:
+            return None
+        doc = self._loads(collname, row[0])
+        return self.dbs[dbname].get(collname, {}).get(doc["_id"], doc)
+
+    def _scan(self, dbname, collname, filter):
+        for (text,) in self._conns[dbname].execute(f"SELECT doc FROM {_quote(collname)} ORDER BY _id"):
+            doc = self._loads(collname, text)
+            if all(key in doc and doc[key] == value for key, value in filter.items()):
+                return self.dbs[dbname].get(collname, {}).get(doc["_id"], doc)
+
+    def update_one(self, dbname, collname, filter, update, **kwargs):
+        """Updates one document."""
+        doc = self.find_one(dbname, collname, filter)
+        newdoc = dict(filter if doc is None else doc)
+        newdoc.update(update)
+        self._write(dbname, collname, docs=[newdoc])
@@ -0,0 +1,91 @@
+"""Jinja2 environments shared by the builders and helpers.
+
+Templates are looked up in the ``templates`` directory of the current
+directory first, and then in the templates that ship with regolith. Each
+search path gets a single environment per process, so a template that is
+used by several builders is only compiled once per run, and the compiled
+templates are kept in a bytecode cache under ``rc.builddir`` so that later
+runs do not compile them again.
+"""
+
+import hashlib
+import os
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, TemplateError
+
+PACKAGE_TEMPLATES = os.path.join(os.path.dirname(__file__), "templates")
+# the directory, inside rc.builddir, of the template bytecode cache
+BYTECODE_CACHE_DIR = "_jinjacache"
+
+_ENVIRONMENTS = {}
+
+
+class _BytecodeCache(FileSystemBytecodeCache):
+    """A bytecode cache that only creates its directory once there is
+    something to write to it."""
+
+    def dump_bytecode(self, bucket):
+        os.makedirs(self.directory, exist_ok=True)
+        super().dump_bytecode(bucket)
+
+
+def template_searchpath():
+    """The directories templates are looked up in, in order."""
+    return ["templates", PACKAGE_TEMPLATES]
+
+
+def shared_environment(rc, searchpath=None, **options):
+    """Returns the environment of a template search path, creating it the
+    first time it is asked for.
+
+    Parameters
+    ----------
+    rc : RunControl
+        The run control, whose ``builddir`` holds the bytecode cache
+    searchpath : list of str, optional
+        The directories to look templates up in, defaults to
+        ``template_searchpath()``
+    options : dict
+        Options of the environment, such as ``trim_blocks``. Environments
+        with different options are kept apart, as are their compiled
+        templates.
+
+    Returns
+    -------
+    env : jinja2.Environment
+        The environment, which must not be changed by the caller
+    """
+    searchpath = tuple(os.path.abspath(p) for p in (searchpath or template_searchpath()))
+    cache_dir = os.path.abspath(os.path.join(rc.builddir, BYTECODE_CACHE_DIR))
+    key = (searchpath, cache_dir, tuple(sorted(options.items())))
+    if key not in _ENVIRONMENTS:
+        if options:
+            # the cached bytecode does not record the options it was compiled with
+            tag = hashlib.sha1(repr(key[2]).encode("utf-8")).hexdigest()[:12]
+            cache_dir = os.path.join(cache_dir, tag)
+        _ENVIRONMENTS[key] = Environment(
+            loader=FileSystemLoader(list(searchpath)), bytecode_cache=_BytecodeCache(cache_dir), **options
+        )
+    return _ENVIRONMENTS[key]
+
+
+def compile_templates(env):
+    """Compiles every template an environment can find into its bytecode
+    cache.
+
+    Files of the template directories that are not templates, such as
+    images, are skipped.
+
+    Returns
+    -------
+    names : list of str
+        The names of the templates that were compiled
+    """
+    names = []
+    for name in env.list_templates():
+        try:
+            env.get_template(name)
+        except (TemplateError, UnicodeDecodeError):
+            continue
+        names.append(name)
+    return names
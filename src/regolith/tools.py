@@ -14,16 +14,9 @@ from copy import copy, deepcopy
 from datetime import date, datetime
 from urllib.parse import urlparse
 
-import requests
 from dateutil import parser as date_parser
-from dateutil.relativedelta import relativedelta
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from habanero import Crossref
-from requests.exceptions import ConnectionError, HTTPError
 
+from regolith.chained_db import DocumentView
 from regolith.dates import date_to_float, get_dates, is_current, month_to_int
 from regolith.schemas import alloweds
 from regolith.sorters import doc_date_key_high, ene_date_key, id_key
@@ -143,6 +136,72 @@ def get_team_from_grant(grantcol):
         return gets(grant["team"], "name")
 
 
+class CitationIndex(object):
+    """Inverted index over a list of citations.
+
+    Maps every author and editor name to the citations it appears on, and
+    remembers the publication date and the grant and facility matches of
+    each citation once they are computed, so that filtering the same
+    citations for many people does not rescan them.
+
+    Parameters
+    ----------
+    citations : list of dict
+        The publication citations
+    """
+
+    def __init__(self, citations):
+        self.citations = citations = list(citations)
+        self._by_name = {}
+        for i, pub in enumerate(citations):
+            for name in set(pub.get("author", [])) | set(pub.get("editor", [])):
+                self._by_name.setdefault(name, []).append(i)
+        self._dates = {}
+        self._grants = {}
+        self._facilities = {}
+
+    def by_names(self, names):
+        """Returns the positions, in citation order, of the citations that
+        have any of the names as an author or editor."""
+        positions = set()
+        for name in names:
+            positions.update(self._by_name.get(name, ()))
+        return sorted(positions)
+
+    def date(self, i):
+        """Returns the publication date of the i-th citation."""
+        if i not in self._dates:
+            pub = self.citations[i]
+            self._dates[i] = date(
+                int(pub.get("year")), month_to_int(pub.get("month", 12)), int(pub.get("day", 28))
+            )
+        return self._dates[i]
+
+    def has_grant(self, i, grant):
+        """Returns whether the i-th citation acknowledges the grant."""
+        if (i, grant) not in self._grants:
+            self._grants[i, grant] = grant in self.citations[i].get("grant", "")
+        return self._grants[i, grant]
+
+    def has_facility(self, i, facility):
+        """Returns whether the i-th citation used the facility."""
+        if (i, facility) not in self._facilities:
+            self._facilities[i, facility] = facility in self.citations[i].get("facility", "")
+        return self._facilities[i, facility]
+
+
+def collection_citation_index(client, collname="citations"):
+    """Returns the CitationIndex of a whole collection of citations.
+
+    The index is built once per collection and kept by the client until
+    the collection is written to. Clients that do not keep indexes get a
+    new one on every call.
+    """
+    if hasattr(client, "collection_index"):
+        return client.collection_index(collname, "citations", CitationIndex)
+    return CitationIndex(list(all_docs_from_collection(client, collname, copy=False)))
+
+
 def filter_publications(
     citations,
     authors,
@@ -158,8 +217,10 @@ def filter_publications(
 
     Parameters
     ----------
-    citations : list of dict
-        The publication citations
+    citations : list of dict or CitationIndex
+        The publication citations, or an index of them. Pass an index, for
+        example from ``collection_citation_index``, when filtering the same
+        citations many times.
     authors : set of str
         The authors to be filtered against
     reverse : bool, optional
@@ -178,13 +239,26 @@ def filter_publications(
     facilities: string, optional
         The facilities to filter over
     """
-    pubs_by_date, pubs_by_grant, pubs_by_facilities = [], [], []
-    if not isinstance(citations, list):
+    if isinstance(citations, CitationIndex):
+        index = citations
+        citations = index.citations
+    else:
         citations = list(citations)
-    cites = deepcopy(citations)
-    for pub in cites:
-        if len((set(pub.get("author", [])) | set(pub.get("editor", []))) & authors) == 0:
+        index = CitationIndex(citations)
+    if isinstance(grants, str):
+        grants = [grants]
+    pubs = []
+    for i in index.by_names(authors):
+        if since:
+            bibdate = index.date(i)
+            if not bibdate > since or (before and not bibdate < before):
+                continue
+        if grants and not any(index.has_grant(i, grant) for grant in grants):
             continue
+        if facilities and not index.has_facility(i, facilities):
+            continue
+        # only the matched publications are copied
+        pub = deepcopy(citations[i])
         if bold:
             bold_self = []
             for a in pub["author"]:
@@ -200,34 +274,7 @@ def filter_publications(
                     f"Acknowledgement:\\newline\\noindent "
                     f"{pub.get('ackno')}\\newline\\newline\\noindent "
                 )
-        if since:
-            bibdate = date(int(pub.get("year")), month_to_int(pub.get("month", 12)), int(pub.get("day", 28)))
-            if bibdate > since:
-                if before:
-                    if bibdate < before:
-                        pubs_by_date.append(pub)
-                else:
-                    pubs_by_date.append(pub)
-        else:
-            pubs_by_date.append(pub)
-
-        if grants:
-            if isinstance(grants, str):
-                grants = [grants]
-            for grant in grants:
-                if grant in pub.get("grant", ""):
-                    pubs_by_grant.append(pub)
-        else:
-            pubs_by_grant.append(pub)
-
-        if facilities:
-            if facilities in pub.get("facility", ""):
-                pubs_by_facilities.append(pub)
-        else:
-            pubs_by_facilities.append(pub)
-
-    pubs = [x for x in pubs_by_date if x in pubs_by_grant]
-    pubs = [x for x in pubs if x in pubs_by_facilities]
+        pubs.append(pub)
     pubs.sort(key=doc_date_key_high, reverse=reverse)
     return pubs
 
@@ -1065,6 +1112,118 @@ def document_by_value(documents, address, value):
             return g_doc
 
 
+class AliasIndex(object):
+    """Index from the values of some fields of a collection of documents,
+    such as their name, aka and _id, to the documents.
+
+    A value maps to the first document, in collection order, that has it in
+    any of the indexed fields, which is the document a linear scan with
+    ``fuzzy_retrieval`` would find.
+
+    Parameters
+    ----------
+    documents: iterable of dicts
+        The documents to index
+    sources: iterable of str
+        The fields to index
+    case_sensitive: bool
+        When False, string values are indexed and looked up lower-cased
+    """
+
+    def __init__(self, documents, sources, case_sensitive=True):
+        self.case_sensitive = case_sensitive
+        self._lookup = {}
+        for doc in documents:
+            for k in sources:
+                ret = doc.get(k, [])
+                if not isinstance(ret, list):
+                    ret = [ret]
+                for reti in ret:
+                    if not case_sensitive:
+                        if not isinstance(reti, str):
+                            continue
+                        reti = reti.lower()
+                    try:
+                        self._lookup.setdefault(reti, doc)
+                    except TypeError:
+                        # unhashable values can never be matched
+                        pass
+
+    def get(self, value):
+        """Returns the document with this value, or None."""
+        if not self.case_sensitive:
+            if not isinstance(value, str):
+                return None
+            value = value.lower()
+        try:
+            return self._lookup.get(value)
+        except TypeError:
+            return None
+
+
+def collection_alias_index(client, collname, sources, case_sensitive=True):
+    """Returns an AliasIndex of a whole collection.
+
+    The index is built once per collection and set of fields and kept by
+    the client until the collection is written to. Clients that do not keep
+    indexes get a new one on every call.
+
+    Parameters
+    ----------
+    client : ClientManager
+        The database client
+    collname : str
+        The name of the collection
+    sources: iterable of str
+        The fields to index
+    case_sensitive: bool
+        When False, string values are indexed and looked up lower-cased
+
+    Returns
+    -------
+    AliasIndex:
+        The index
+    """
+    sources = tuple(sources)
+
+    def build(documents):
+        return AliasIndex(documents, sources, case_sensitive=case_sensitive)
+
+    if hasattr(client, "collection_index"):
+        return client.collection_index(collname, ("alias", sources, case_sensitive), build)
+    return build(all_docs_from_collection(client, collname, copy=False))
+
+
+def retrieve_from_collection(client, collname, sources, value, case_sensitive=True):
+    """Retrieve a document of a collection where value is compared against
+    multiple potential sources.
+
+    This finds the same document as ``fuzzy_retrieval`` on
+    ``all_docs_from_collection(client, collname)``, but looks it up in the
+    collection's ``AliasIndex`` instead of scanning the collection.
+
+    Parameters
+    ----------
+    client : ClientManager
+        The database client
+    collname : str
+        The name of the collection
+    sources: iterable of str
+        The potential data sources
+    value:
+        The value to compare against to find the document of interest
+    case_sensitive: Bool
+        When true will match case (Default = True)
+
+    Returns
+    -------
+    DocumentView:
+        A copy-on-write view of the document, or None if there is none
+    """
+    doc = collection_alias_index(client, collname, sources, case_sensitive=case_sensitive).get(value)
+    return None if doc is None else DocumentView(doc)
+
+
 def fuzzy_retrieval(documents, sources, value, case_sensitive=True):
     """Retrieve a document from the documents where value is compared
     against multiple potential sources.
@@ -1091,6 +1250,9 @@ def fuzzy_retrieval(documents, sources, value, case_sensitive=True):
 
     This would get the person entry for which either the alias or the name was
     ``pi_name``.
+
+    Use ``retrieve_from_collection`` to look up many values in a whole
+    collection without rescanning it each time.
     """
     for doc in documents:
         returns = []
@@ -1146,12 +1308,41 @@ def dereference_institution(input_record, institutions, verbose=False):
     -------
     nothing
     """
+    _dereference_institution(
+        input_record, lambda inst: fuzzy_retrieval(institutions, ["name", "_id", "aka"], inst), verbose
+    )
+
+
+def dereference_institution_from_collection(client, collname, input_record, verbose=False):
+    """Replaces the placeholders for institutions of a record in place, as
+    ``dereference_institution`` does, looking the institution up in the
+    ``AliasIndex`` of a collection instead of scanning the collection.
+
+    Parameters
+    ----------
+    client : ClientManager
+        The database client
+    collname : str
+        The name of the institutions collection
+    input_record : dict
+        The record to dereference
+    verbose : bool
+        Whether to warn about records with no institution
+    """
+    _dereference_institution(
+        input_record,
+        lambda inst: retrieve_from_collection(client, collname, ["name", "_id", "aka"], inst),
+        verbose,
+    )
+
+
+def _dereference_institution(input_record, find, verbose):
     inst = input_record.get("institution") or input_record.get("organization")
     if verbose:
         if not inst:
             print(f"WARNING: no institution or organization in entry: {input_record}")
             return
-    db_inst = fuzzy_retrieval(institutions, ["name", "_id", "aka"], inst)
+    db_inst = find(inst)
     if not db_inst:
         print(
             f"WARNING: {input_record.get('institution', input_record.get('organization', 'unknown'))} "
@@ -1332,6 +1523,34 @@ def get_person_contact(name, people_coll, contacts_coll):
         return None
 
 
+def get_person_contact_from_collections(client, name, people="people", contacts="contacts"):
+    """Return a person document if found in either the people or the contacts
+    collection, as ``get_person_contact`` does, looking the person up in the
+    ``AliasIndex`` of each collection instead of scanning it.
+
+    Parameters
+    ----------
+    client : ClientManager
+        The database client
+    name: str
+      The name or id of the person to look for
+    people: str
+      The name of the people collection
+    contacts: str
+      The name of the contacts collection
+
+    Returns
+    -------
+    person: DocumentView
+      The found person document, or None
+    """
+    for collname in (people, contacts):
+        person = retrieve_from_collection(client, collname, ["aka", "name", "_id"], name, case_sensitive=False)
+        if person:
+            return person
+    return None
+
+
 def _latest_employment(employment, now=None):
     """Return the current employment entry, or the most recently ended
     one."""
@@ -1908,6 +2127,76 @@ def get_id_from_name(coll, name):
         return None
 
 
+def get_id_from_collection(client, collname, name):
+    """The ``_id`` of the document of a collection with this name, alias or
+    id, as ``get_id_from_name`` finds it, looked up in the collection's
+    ``AliasIndex``, or None."""
+    person = retrieve_from_collection(client, collname, ["name", "aka", "_id"], name, case_sensitive=False)
+    if person:
+        return person["_id"]
+    else:
+        return None
+
+
+# The end date given to appointments that have none, as in is_current
+OPEN_END_DATE = date(5000, 12, 31)
+
+
+def appointment_interval(appt):
+    """Parses the dates of an appointment once.
+
+    Parameters
+    ----------
+    appt: dict
+        The appointment
+
+    Returns
+    -------
+    tuple:
+        The proleptic ordinals of the first and the last day of the appointment. Appointments
+        without an end date are open until the year 5000, as in ``is_current``
+    """
+    dates = get_dates(appt)
+    begin, end = dates.get("begin_date"), dates.get("end_date") or OPEN_END_DATE
+    if not begin:
+        raise RuntimeError(f"Cannot find begin_date in document:\n {appt.get('_id')}")
+    return begin.toordinal(), end.toordinal()
+
+
+def appointment_segments(intervals, begin, end):
+    """Splits a span of days into the segments over which the same
+    appointments are current.
+
+    Parameters
+    ----------
+    intervals: list of tuples
+        The intervals of the appointments, as (first day ordinal, last day ordinal, appointment)
+    begin: int
+        The ordinal of the first day of the span
+    end: int
+        The ordinal of the last day of the span
+
+    Returns
+    -------
+    list:
+        The (first day ordinal, last day ordinal, current appointments) of each segment,
+        in order. The current appointments are in the order of ``intervals``
+    """
+    bounds = {begin}
+    for a_begin, a_end, _ in intervals:
+        if begin < a_begin <= end:
+            bounds.add(a_begin)
+        if begin < a_end + 1 <= end:
+            bounds.add(a_end + 1)
+    bounds = sorted(bounds)
+    segments = []
+    for i, seg_begin in enumerate(bounds):
+        seg_end = bounds[i + 1] - 1 if i + 1 < len(bounds) else end
+        current = [appt for a_begin, a_end, appt in intervals if a_begin <= seg_begin <= a_end]
+        segments.append((seg_begin, seg_end, current))
+    return segments
+
+
 def is_fully_appointed(person, begin_date, end_date):
     """Checks if a collection of appointments for a person is valid and
     fully loaded for a given interval of time.
@@ -1950,36 +2239,35 @@ def is_fully_appointed(person, begin_date, end_date):
         begin_date = date_parser.parse(begin_date).date()
     if isinstance(end_date, str):
         end_date = date_parser.parse(end_date).date()
-    timespan = end_date - begin_date
-    good_period, start_gap = True, None
-    for x in range(timespan.days + 1):
+    intervals = [appointment_interval(appt) + (appt,) for appt in appts.values()]
+    segments = appointment_segments(intervals, begin_date.toordinal(), end_date.toordinal())
+    gaps, start_gap = [], None
+    for seg_begin, seg_end, current in segments:
         day_loading = 0.0
-        day = begin_date + relativedelta(days=x)
-        for appt in appts:
-            if is_current(appts[appt], now=day):
-                day_loading += appts[appt].get("loading")
+        for appt in current:
+            day_loading += appt.get("loading")
         if day_loading > 1.0 or day_loading < 1.0:
             status = False
-            if good_period:
-                start_gap = day
-                good_period = False
-        else:
-            if not good_period:
-                print(
-                    "WARNING: appointment gap for {} from {} to {}".format(
-                        person.get("_id"), str(start_gap), str(day - relativedelta(days=1))
-                    )
-                )
-            good_period = True
-        if x == timespan.days and not good_period:
-            if day != start_gap:
-                print(
-                    "WARNING: appointment gap for {} from {} to {}".format(
-                        person.get("_id"), str(start_gap), str(day)
-                    )
+            if start_gap is None:
+                start_gap = seg_begin
+        elif start_gap is not None:
+            gaps.append((start_gap, seg_begin - 1))
+            start_gap = None
+    for gap_begin, gap_end in gaps:
+        print(
+            "WARNING: appointment gap for {} from {} to {}".format(
+                person.get("_id"), str(date.fromordinal(gap_begin)), str(date.fromordinal(gap_end))
+            )
+        )
+    if start_gap is not None:
+        if start_gap != end_date.toordinal():
+            print(
+                "WARNING: appointment gap for {} from {} to {}".format(
+                    person.get("_id"), str(date.fromordinal(start_gap)), str(end_date)
                 )
-            else:
-                print("WARNING: appointment gap for {} on {}".format(person.get("_id"), str(day)))
+            )
+        else:
+            print("WARNING: appointment gap for {} on {}".format(person.get("_id"), str(end_date)))
     return status
 
 
@@ -2075,6 +2363,11 @@ def search_collection(collection, arguments, keys=None):
     return collection_str(collection, keys)
 
 
+def _overlaps(appt, begin_date, end_date):
+    a_begin, a_end = appointment_interval(appt)
+    return a_begin <= end_date.toordinal() and begin_date.toordinal() <= a_end
+
+
 def collect_appts(ppl_coll, filter_key=None, filter_value=None, begin_date=None, end_date=None):
     """Retrieves a list of all the appointments on the given grant(s) in
     the given interval of time for each person in the given people
@@ -2135,22 +2428,16 @@ def collect_appts(ppl_coll, filter_key=None, filter_value=None, begin_date=None,
             if filter_key:
                 if all(p_appts[a].get(filter_key[x]) == filter_value[x] for x in range(len(filter_key))):
                     if begin_date:
-                        for y in range(timespan.days + 1):
-                            day = begin_date + relativedelta(days=y)
-                            if is_current(p_appts[a], now=day):
-                                appts.append(p_appts[a])
-                                appts[-1].update({"person": p.get("_id"), "_id": a})
-                                break
+                        if _overlaps(p_appts[a], begin_date, end_date):
+                            appts.append(p_appts[a])
+                            appts[-1].update({"person": p.get("_id"), "_id": a})
                     else:
                         appts.append(p_appts[a])
                         appts[-1].update({"person": p.get("_id"), "_id": a})
             elif timespan:
-                for y in range(timespan.days + 1):
-                    day = begin_date + relativedelta(days=y)
-                    if is_current(p_appts[a], now=day):
-                        appts.append(p_appts[a])
-                        appts[-1].update({"person": p.get("_id"), "_id": a})
-                        break
+                if _overlaps(p_appts[a], begin_date, end_date):
+                    appts.append(p_appts[a])
+                    appts[-1].update({"person": p.get("_id"), "_id": a})
             else:
                 appts.append(p_appts[a])
                 appts[-1].update({"person": p.get("_id"), "_id": a})
@@ -2189,6 +2476,8 @@ def grant_burn(grant, appts, begin_date=None, end_date=None):
          datetime.date(2020, 9, 2): {'student_days': 4.0, 'postdoc_days': 11.5, 'ss_days': 15.0}, \
          datetime.date(2020, 9, 3): {'student_days': 3.0, 'postdoc_days': 11.0, 'ss_days': 10.0}}
     """
+    import numpy as np
+
     if not grant.get("budget"):
         raise ValueError("{} has no specified budget".format(grant.get("_id")))
     if bool(begin_date) ^ bool(end_date):
@@ -2197,38 +2486,37 @@ def grant_burn(grant, appts, begin_date=None, end_date=None):
     end_date = date_parser.parse(end_date).date() if isinstance(end_date, str) else end_date
     if isinstance(appts, dict):
         appts = collect_appts([{"appointments": appts}])
-    grad_val, pd_val, ss_val = 0.0, 0.0, 0.0
+    grant_ids = (grant.get("_id"), grant.get("alias"))
+    intervals = [appointment_interval(a) + (a,) for a in appts if a.get("grant") in grant_ids]
+    vals = {"gra": 0.0, "pd": 0.0, "ss": 0.0}
     grant_amounts = {}
-    budget_dates = get_dates(grant.get("budget")[0])
-    budget_begin, budget_end = budget_dates["begin_date"], budget_dates["end_date"]
     for period in grant.get("budget"):
         period_dates = get_dates(period)
         period_begin, period_end = period_dates["begin_date"], period_dates["end_date"]
-        budget_begin = period_begin if period_begin < budget_begin else budget_begin
-        budget_end = period_end if period_end > budget_end else budget_end
-        grad_val += (period.get("student_months", 0) - period.get("student_writeoff", 0)) * 30.5
-        pd_val += (period.get("postdoc_months", 0) - period.get("postdoc_writeoff", 0)) * 30.5
-        ss_val += (period.get("ss_months", 0) - period.get("ss_writeoff", 0)) * 30.5
-        span = period_end - period_begin
-        for x in range(span.days + 1):
-            day = period_begin + relativedelta(days=x)
-            for a in appts:
-                if (a.get("grant") == grant.get("_id") or a.get("grant") == grant.get("alias")) and is_current(
-                    a, now=day
-                ):
-                    if a.get("type") == "gra":
-                        grad_val -= a.get("loading") * 1
-                    elif a.get("type") == "pd":
-                        pd_val -= a.get("loading") * 1
-                    elif a.get("type") == "ss":
-                        ss_val -= a.get("loading") * 1
-            if (not begin_date) or (begin_date <= day <= end_date):
-                gvals = {
-                    "student_days": round(grad_val, 2),
-                    "postdoc_days": round(pd_val, 2),
-                    "ss_days": round(ss_val, 2),
-                }
-                grant_amounts.update({day: gvals})
+        vals["gra"] += (period.get("student_months", 0) - period.get("student_writeoff", 0)) * 30.5
+        vals["pd"] += (period.get("postdoc_months", 0) - period.get("postdoc_writeoff", 0)) * 30.5
+        vals["ss"] += (period.get("ss_months", 0) - period.get("ss_writeoff", 0)) * 30.5
+        first, last = period_begin.toordinal(), period_end.toordinal()
+        if last < first:
+            continue
+        burns = {appt_type: np.zeros(last - first + 1) for appt_type in vals}
+        for seg_begin, seg_end, current in appointment_segments(intervals, first, last):
+            for appt_type, burn in burns.items():
+                loading = sum(a.get("loading") * 1 for a in current if a.get("type") == appt_type)
+                burn[seg_begin - first : seg_end - first + 1] = loading
+        remaining = {}
+        for appt_type, burn in burns.items():
+            remaining[appt_type] = (vals[appt_type] - np.cumsum(burn)).tolist()
+            vals[appt_type] = remaining[appt_type][-1]
+        window_begin, window_end = first, last
+        if begin_date:
+            window_begin, window_end = max(first, begin_date.toordinal()), min(last, end_date.toordinal())
+        for day in range(window_begin, window_end + 1):
+            grant_amounts[date.fromordinal(day)] = {
+                "student_days": round(remaining["gra"][day - first], 2),
+                "postdoc_days": round(remaining["pd"][day - first], 2),
+                "ss_days": round(remaining["ss"][day - first], 2),
+            }
     return grant_amounts
 
 
@@ -2329,6 +2617,9 @@ def get_formatted_crossref_reference(doi):
       the date of the reference
     returns None None in the article cannot be found given the doi
     """
+    from habanero import Crossref
+    from requests.exceptions import ConnectionError, HTTPError
+
     cr = Crossref()
     try:
         article = cr.works(ids=doi)
@@ -2444,6 +2735,10 @@ def add_to_google_calendar(event):
     Returns:
         None
     """
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
+
     tokendir = os.path.expanduser("~/.config/regolith/tokens/google_calendar_api")
     creds = None
     os.makedirs(tokendir, exist_ok=True)
@@ -2481,6 +2776,8 @@ def google_cal_auth_flow():
     """First time authentication, this function opens a window to
     request user consent to use google calendar API, and then returns a
     token."""
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     tokendir = os.path.expanduser("~/.config/regolith/tokens/google_calendar_api")
     os.makedirs(tokendir, exist_ok=True)
     tokenfile = os.path.join(tokendir, "token.json")
@@ -2603,6 +2900,9 @@ def create_repo(destination_id, token_info_id, rc):
         Success message (repo target_repo has been created in talks) if repo is successfully created in target_repo
         Warning/setup messages if unsuccessful (or if repo info or token are not valid)
     """
+    import requests
+    from requests.exceptions import HTTPError
+
     repo_info = get_target_repo_info(destination_id, rc.repos)
     token = get_target_token(token_info_id, rc.tokens)
     if repo_info and token:
@@ -1,3 +1,5 @@
+import hashlib
+import json
 import os
 
 # from xonsh.lib import subprocess
@@ -10,6 +12,8 @@ import openpyxl
 import pytest
 
 from regolith.broker import load_db
+from regolith.builders.basebuilder import LATEX_SCRATCH, BuildManifest, LatexBuilderBase, sync_dir
+from regolith.builders.htmlbuilder import HtmlBuilder
 from regolith.builders.presentationbuilder import PresentationBuilder, number_affiliations
 from regolith.main import main
 
@@ -498,3 +502,150 @@ def test_presentation_builder_selected_raises(kwargs, expected_error):
     with pytest.raises(ValueError) as excinfo:
         builder._selected(PRESENTATIONS)
     assert expected_error in str(excinfo.value)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs fork")
+def test_builder_jobs(make_db):
+    repo = Path(make_db)
+    os.chdir(repo)
+    main(["build", "preslist", "resume", "--no-pdf", "--jobs", "2"])
+    for bm in ["preslist", "resume"]:
+        expected = {file.name for file in (Path(__file__).parent / "outputs" / bm).rglob("*") if file.is_file()}
+        actual = {file.name for file in (repo / "_build" / bm).rglob("*") if file.is_file()}
+        assert expected <= actual
+
+
+FAKE_LATEX = """#!/bin/sh
+# writes an empty dvi file to the output directory, and fails on bad.tex;
+# records that it read the .sty file of the same name
+for arg in "$@"; do
+  case $arg in
+    -output-directory=*) out=${arg#-output-directory=} ;;
+    *.tex) tex=$arg ;;
+  esac
+done
+[ "$tex" = bad.tex ] && echo "! Undefined control sequence." && exit 1
+touch "$out/${tex%.tex}.dvi" "$out/${tex%.tex}.aux"
+printf 'PWD %s\nINPUT %s\nINPUT ./%s.sty\nINPUT /usr/share/texmf/article.cls\nINPUT %s/%s.aux\n' \
+  "$PWD" "$tex" "${tex%.tex}" "$out" "${tex%.tex}" > "$out/${tex%.tex}.fls"
+"""
+
+
+@pytest.mark.skipif(os.name == "nt", reason="fakes the latex commands with shell scripts")
+def test_latex_compile_queue(tmp_path, monkeypatch, capsys):
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    (bindir / "latex").write_text(FAKE_LATEX)
+    (bindir / "dvipdf").write_text('#!/bin/sh\ncp "$1" "$2"\n')
+    for script in bindir.iterdir():
+        script.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bindir) + os.pathsep + os.environ["PATH"])
+    builder = LatexBuilderBase.__new__(LatexBuilderBase)
+    builder.rc = FakeRc()
+    builder.rc.pdf = True
+    builder.rc.latex_jobs = 2
+    builder.rc._get = lambda key, default=None: getattr(builder.rc, key, default)
+    builder.bldir = str(tmp_path)
+    builder.pdf_queue = []
+    builder.manifest = BuildManifest(str(tmp_path / "manifest.json"), str(tmp_path))
+    for base in ["a", "b", "a", "c"]:
+        (tmp_path / f"{base}.tex").write_text("")
+        builder.pdf(base)
+    assert builder.pdf_queue == ["a", "b", "c"]
+    builder.compile()
+    assert sorted(p.name for p in tmp_path.glob("*.pdf")) == ["a.pdf", "b.pdf", "c.pdf"]
+    assert not (tmp_path / LATEX_SCRATCH).exists()
+    assert "compiled b.pdf in" in capsys.readouterr().out
+    builder.pdf("bad")
+    builder.pdf("d")
+    with pytest.raises(RuntimeError, match="failed to compile bad.tex"):
+        builder.compile()
+    assert (tmp_path / "d.pdf").exists()
+    assert "! Undefined control sequence." in capsys.readouterr().out
+    assert builder.pdf_queue == []
+
+    # only the PDFs whose sources changed are compiled again
+    builder.manifest.save()
+    builder.manifest = BuildManifest(str(tmp_path / "manifest.json"), str(tmp_path))
+    (tmp_path / "b.tex").write_text("changed")
+    (tmp_path / "c.pdf").unlink()
+    for base in ["a", "b", "c"]:
+        builder.pdf(base)
+    builder.compile()
+    out = capsys.readouterr().out
+    assert "a.pdf is up to date" in out
+    assert "compiled b.pdf" in out and "compiled c.pdf" in out
+    assert builder.manifest.pdf_inputs(str(tmp_path / "a.pdf")) == ["a.sty", "a.tex"]
+
+    # and so are those whose other inputs changed
+    (tmp_path / "a.sty").write_text("changed")
+    for base in ["a", "b"]:
+        builder.pdf(base)
+    builder.compile()
+    out = capsys.readouterr().out
+    assert "compiled a.pdf" in out and "b.pdf is up to date" in out
+
+
+def test_builder_write_unchanged(tmp_path):
+    builder = LatexBuilderBase.__new__(LatexBuilderBase)
+    builder.bldir = str(tmp_path)
+    builder.manifest = BuildManifest(str(tmp_path / "manifest.json"), str(tmp_path))
+    builder.write("a.tex", "hello")
+    path = tmp_path / "a.tex"
+    os.utime(path, ns=(0, 0))
+    builder.manifest.record(str(path), builder.manifest.outputs["a.tex"]["hash"])
+    # the recorded hash is that of the text, whatever the line endings
+    assert builder.manifest.outputs["a.tex"]["hash"] == hashlib.sha256(b"hello").hexdigest()
+    builder.write("a.tex", "hello")
+    assert path.stat().st_mtime_ns == 0
+    builder.write("a.tex", "hello world")
+    assert path.read_text() == "hello world"
+    assert path.stat().st_mtime_ns != 0
+    # a file changed since it was recorded is written again
+    path.write_text("edited")
+    builder.write("a.tex", "hello world")
+    assert path.read_text() == "hello world"
+
+
+def test_html_incremental(make_db, monkeypatch):
+    repo = Path(make_db)
+    os.chdir(repo)
+    rendered = []
+    render = HtmlBuilder.render
+
+    def counting_render(self, tname, fname, **kwargs):
+        rendered.append(fname)
+        render(self, tname, fname, **kwargs)
+
+    monkeypatch.setattr(HtmlBuilder, "render", counting_render)
+    main(["build", "html", "--no-pdf"])
+    # the page of each person, post, job and abstract
+    pages = [f for f in rendered if os.path.dirname(f) and f.endswith(".html") and not f.endswith("index.html")]
+    people = [f for f in pages if f.startswith("people")]
+    assert people
+    rendered.clear()
+    main(["build", "html", "--no-pdf"])
+    assert not set(rendered) & set(pages)
+    # a page is rendered again once one of its documents changes
+    manifest_file = repo / "_build" / "_manifest" / "html.json"
+    manifest = json.loads(manifest_file.read_text())
+    page = manifest["pages"]["html/" + people[0].replace(os.sep, "/")]
+    page["inputs"][next(iter(page["inputs"]))] = "changed"
+    manifest_file.write_text(json.dumps(manifest))
+    rendered.clear()
+    main(["build", "html", "--no-pdf"])
+    assert set(rendered) & set(pages) == {people[0]}
+
+
+def test_sync_dir(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    (src / "css").mkdir(parents=True)
+    (src / "css" / "main.css").write_text("body {}")
+    (src / "logo.svg").write_text("<svg/>")
+    assert sorted(sync_dir(str(src), str(dst))) == [os.path.join("css", "main.css"), "logo.svg"]
+    (src / "logo.svg").write_text("<svg></svg>")
+    (dst / "stale.js").write_text("")
+    (dst / "old").mkdir()
+    (dst / "old" / "x.png").write_text("")
+    assert sync_dir(str(src), str(dst)) == ["logo.svg"]
+    assert sorted(p.name for p in dst.rglob("*")) == ["css", "logo.svg", "main.css"]
@@ -1,4 +1,4 @@
-from regolith.chained_db import ChainDB
+from regolith.chained_db import ChainDB, DocumentView, LazyChainDB, _convert_to_dict, merge_maps
 
 
 def test_dddi():
@@ -156,3 +156,133 @@ def test_dicts_in_lists_mutation():
     extend_list = z["a"]["b"]
     extend_list.extend([{"hi": "world"}, {"spam": "eggs"}])
     assert z["a"]["b"] != extend_list
+
+
+class FakeClient:
+    def __init__(self, data):
+        self.data = data
+        self.loaded = []
+        self.listed = 0
+        self.opened = 0
+        self.closed = False
+
+    def open(self):
+        self.opened += 1
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def load_collection(self, db, collname):
+        assert not self.closed
+        self.loaded.append((db["name"], collname))
+        return self.data[db["name"]].get(collname)
+
+    def available_collections(self, db):
+        assert not self.closed
+        self.listed += 1
+        return list(self.data[db["name"]])
+
+
+def test_lazy_chain_db():
+    client = FakeClient(
+        {
+            "public": {"people": {"me": {"_id": "me", "name": "Me"}}, "todos": {}},
+            "private": {"people": {"me": {"_id": "me", "email": "me@example.com"}}},
+        }
+    )
+    z = LazyChainDB(client, [{"name": "public"}, {"name": "private"}])
+    assert client.loaded == []
+    assert list(z) == ["people", "todos"]
+    assert client.loaded == []
+    assert type(z["people"]["me"]) is dict
+    assert z["people"]["me"]["name"] == "Me"
+    assert z["people"]["me"]["email"] == "me@example.com"
+    assert client.loaded == [("public", "people"), ("private", "people")]
+    z["people"]
+    assert len(client.loaded) == 2
+    assert z.get("missing", {}) == {}
+    client.data["public"]["people"]["you"] = {"_id": "you"}
+    assert "you" not in z["people"]
+    z.invalidate("people")
+    # documents are copies, whether they come from one database or several
+    assert z["people"]["you"] == client.data["public"]["people"]["you"]
+    z["people"]["you"]["name"] = "You"
+    z["people"]["me"]["name"] = "Myself"
+    assert client.data["public"]["people"]["you"] == {"_id": "you"}
+    assert client.data["public"]["people"]["me"]["name"] == "Me"
+
+
+def test_lazy_chain_db_names_and_closed_client():
+    client = FakeClient({"public": {"people": {"me": {"_id": "me"}}}, "private": {"todos": {}}})
+    z = LazyChainDB(client, [{"name": "public"}, {"name": "private"}])
+    assert "todos" in z
+    assert "missing" not in z and "missing" not in z
+    assert client.listed == 2
+    z.invalidate("people")
+    assert "people" in z and client.listed == 2
+    # a write to a new collection lists them again
+    z.invalidate("projects")
+    assert "projects" not in z and client.listed == 4
+    client.close()
+    # a late access loads on a connection of its own, which is closed again
+    assert z["people"]["me"] == {"_id": "me"}
+    assert client.opened == 1 and client.closed
+
+
+def test_lazy_chain_db_write_through():
+    public = {"people": {"me": {"_id": "me", "name": "Me", "info": {"a": 1}}}}
+    private = {"people": {"me": {"_id": "me", "info": {"b": 2}}}}
+    client = FakeClient({"public": public, "private": private})
+    z = LazyChainDB(client, [{"name": "public"}, {"name": "private"}], materialize=False)
+    assert isinstance(z["people"]["me"], ChainDB)
+    z["people"]["me"]["info"]["b"] = 3
+    z["people"]["me"]["name"] = "Myself"
+    assert private["people"]["me"]["info"] == {"b": 3}
+    assert public["people"]["me"]["name"] == "Myself"
+
+
+def test_merge_maps():
+    m1 = {"a": {"m": {"x": 0}, "n": 1}, "b": [1, 2], "c": "x", "d": {"y": 1}, "e": [5]}
+    m2 = {"a": {"m": {"y": 1}, "n": 2}, "b": [3], "c": {"z": 0}, "f": True}
+    m3 = {"e": [6], "d": "last"}
+    maps = [m1, m2, m3]
+    merged = merge_maps(maps)
+    chained = ChainDB(*maps)
+    assert merged == _convert_to_dict(chained)
+    assert list(merged) == list(chained)
+    # mappings are only merged when every map has one
+    assert merged["a"] == m2["a"]
+    assert merge_maps([m1, m2])["a"] == {"m": {"x": 0, "y": 1}, "n": 2}
+    assert merged["b"] == [1, 2, 3]
+    assert merged["c"] == m2["c"]
+    assert merged["d"] == "last"
+    assert merged["e"] == [5, 6]
+    # and nothing mutable is shared with the maps
+    assert merged["a"] is not m2["a"] and merged["a"]["m"] is not m2["a"]["m"]
+    single = merge_maps([m1])
+    assert single == m1 and single["a"]["m"] is not m1["a"]["m"]
+
+
+def test_document_view_isolation():
+    m1 = {"_id": "me", "name": "Me", "employment": [{"organization": "here"}], "info": {"a": 1}}
+    m2 = {"_id": "me", "employment": [{"organization": "there"}], "info": {"b": 2}}
+    doc = ChainDB(m1)
+    doc.maps.append(m2)
+    view = DocumentView(doc)
+    assert view["name"] == "Me"
+    assert view["employment"] == [{"organization": "here"}, {"organization": "there"}]
+    assert view["info"]["b"] == 2
+    view["employment"].append({"organization": "elsewhere"})
+    view["employment"][0]["organization"] = "changed"
+    view["name"] = "You"
+    view["new"] = True
+    del view["info"]
+    assert m1["name"] == "Me"
+    assert m1["employment"] == [{"organization": "here"}]
+    assert len(doc["employment"]) == 2
+    assert "info" in doc and "info" not in view
+    assert len(view["employment"]) == 3
+    assert sorted(view) == ["_id", "employment", "name", "new"]
+    assert dict(view)["name"] == "You"
+    assert _convert_to_dict(view)["new"] is True
@@ -4,9 +4,12 @@ import os
 import subprocess
 import sys
 from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
 
+from regolith import commands
+from regolith.commands import build, build_db_check, helper_db_check, read_only_check
 from regolith.database import connect
 from regolith.dates import convert_doc_iso_to_date
 from regolith.main import main
@@ -116,3 +119,78 @@ def replace_rc_dbs(repo):
         json.dump(data, f, indent=4)
         f.truncate()
     os.chdir(cwd)
+
+
+@pytest.mark.parametrize(
+    "cmd, target, opt_in, expected",
+    [
+        ("build", None, False, True),
+        ("helper", "l_todo", False, True),
+        ("helper", "a_todo", False, False),
+        ("helper", "a_todo", True, True),
+        ("validate", None, False, False),
+    ],
+)
+def test_read_only_check(cmd, target, opt_in, expected):
+    rc = copy.copy(DEFAULT_RC)
+    rc.cmd = cmd
+    rc.helper_target = target
+    if opt_in:
+        rc.read_only = True
+    assert read_only_check(rc) is expected
+
+
+def test_build_db_check_queries():
+    rc = copy.copy(DEFAULT_RC)
+    rc.build_targets = ["publist"]
+    rc.people = ["sbillinge"]
+    assert build_db_check(rc) == {"citations", "people"}
+    assert rc.collection_queries == {"people": {"filter": {"_id": {"$in": ["sbillinge"]}}}}
+    # the cv builder needs all the people, so they are loaded in full
+    rc.build_targets = ["publist", "cv"]
+    build_db_check(rc)
+    assert rc.collection_queries == {}
+
+
+class FakeBuilder:
+    def __init__(self, target, rc):
+        self.target = target
+        self.rc = rc
+
+    def build(self):
+        print(f"building {self.target} in {os.getpid()}")
+        print(f"closed: {self.rc.client.closed}, latex_jobs: {self.rc.latex_jobs}")
+        if self.target == "cv":
+            raise ValueError("no cv today")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs fork")
+def test_build_jobs(monkeypatch, capsys):
+    monkeypatch.setattr(commands, "builder", FakeBuilder)
+    rc = copy.copy(DEFAULT_RC)
+    rc.build_targets = ["publist", "cv", "resume"]
+    rc.people = ["sbillinge"]
+    rc.jobs = 2
+    rc.client = SimpleNamespace(chained_db={}, closed=False)
+    rc.client.close = lambda: setattr(rc.client, "closed", True)
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    with pytest.raises(RuntimeError, match="failed to build cv"):
+        build(rc)
+    out, err = capsys.readouterr()
+    lines = out.splitlines()
+    assert [line for line in lines if line.startswith("==>")] == ["==> publist", "==> cv", "==> resume"]
+    assert lines[1].startswith("building publist in") and lines[1] != f"building publist in {os.getpid()}"
+    # the workers close their copy of the client and share the CPUs for latex
+    assert lines[2] == "closed: True, latex_jobs: 4"
+    assert not rc.client.closed and "latex_jobs" not in rc
+    assert "ValueError: no cv today" in err
+
+
+@pytest.mark.parametrize("target, expected", [("l_todo", {"_id": "sbillinge"}), ("u_todo", None)])
+def test_helper_db_check_queries(target, expected):
+    rc = copy.copy(DEFAULT_RC)
+    rc.database = "test"
+    rc.helper_target = target
+    rc.assigned_to = "sbillinge"
+    helper_db_check(rc)
+    assert rc._get("collection_queries", {}).get("todos", {}).get("filter") == expected
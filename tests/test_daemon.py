@@ -0,0 +1,104 @@
+import copy
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from regolith import commands
+from regolith.daemon import HelperDaemon, forward, socket_path
+from regolith.main import main
+from regolith.runcontrol import DEFAULT_RC
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "getuid"), reason="needs Unix domain sockets")
+
+L_TODO = ["helper", "l_todo", "--assigned-to", "sbillinge", "--date", "2020-05-01"]
+A_TODO = ["helper", "a_todo", "daemon todo", "6", "50", "--assigned-to", "sbillinge", "--begin-date", "2020-05-01"]
+
+
+@contextmanager
+def running_daemon(repo):
+    path = socket_path(repo)
+    proc = subprocess.Popen(
+        [sys.executable, "-c", "from regolith.main import main; main(['daemon'])"],
+        cwd=repo,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(300):
+            if os.path.exists(path):
+                break
+            time.sleep(0.1)
+        yield path
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def test_forward_without_daemon(tmp_path):
+    assert forward(["helper", "l_todo"], socket_path(str(tmp_path))) is None
+
+
+def test_forward_ignores_foreign_socket(tmp_path, capsys):
+    path = str(tmp_path / "d.sock")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen()
+    try:
+        os.chmod(path, 0o777)
+        assert forward(["helper", "l_todo"], path) is None
+        assert "not a socket private to this user" in capsys.readouterr().err
+    finally:
+        sock.close()
+
+
+def test_daemon_drops_failed_updater(tmp_path, monkeypatch):
+    rc = copy.copy(DEFAULT_RC)
+    rc.databases = [{"name": "test", "url": str(tmp_path), "path": "db", "local": True, "public": True}]
+    rc.builddir = str(tmp_path / "_build")
+    (tmp_path / "db").mkdir()
+    todos = tmp_path / "db" / "todos.yaml"
+    todos.write_text("sbillinge:\n  todos: []\n")
+
+    def failing_helper(rc):
+        rc.client.insert_one("test", "todos", {"_id": "other", "todos": []})
+        raise RuntimeError("the helper failed")
+
+    monkeypatch.setitem(commands.CONNECTED_COMMANDS, "helper", failing_helper)
+    daemon = HelperDaemon(rc)
+    with pytest.raises(RuntimeError):
+        daemon.run(A_TODO)
+    assert "other" not in todos.read_text()
+    assert "other" not in daemon.open().chained_db["todos"]
+    daemon.close()
+
+
+def test_daemon_runs_helpers(make_db, tmp_path, capsys):
+    repo = make_db
+    os.chdir(repo)
+    main(L_TODO)
+    direct = capsys.readouterr().out
+    # the database is shared with the other tests
+    dbpath = os.path.join(repo, "db")
+    shutil.copytree(dbpath, tmp_path / "db")
+    try:
+        with running_daemon(repo) as path:
+            assert forward(L_TODO, path) == 0
+            assert capsys.readouterr().out == direct
+            # the updater writes its changes back, and the listing picks them up
+            assert forward(A_TODO, path) == 0
+            assert "daemon todo" in capsys.readouterr().out
+            with open(os.path.join(dbpath, "todos.yaml")) as f:
+                assert "daemon todo" in f.read()
+            assert forward(L_TODO, path) == 0
+            assert "daemon todo" in capsys.readouterr().out
+            assert forward(["helper", "no_such_helper"], path) == 2
+    finally:
+        shutil.rmtree(dbpath)
+        shutil.copytree(tmp_path / "db", dbpath)
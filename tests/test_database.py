@@ -0,0 +1,21 @@
+import os
+from copy import copy
+
+from regolith import database
+from regolith.database import connect
+from regolith.runcontrol import DEFAULT_RC, load_rcfile
+
+
+def test_connect_read_only(make_db, monkeypatch):
+    repo = make_db
+    os.chdir(repo)
+    dumped = []
+    monkeypatch.setattr(database, "dump_database", lambda db, client, rc: dumped.append(db["name"]))
+    rc = copy(DEFAULT_RC)
+    rc._update(load_rcfile("regolithrc.json"))
+    with connect(rc, read_only=True) as client:
+        assert "people" in client.chained_db
+    assert dumped == []
+    with connect(rc) as client:
+        assert "people" in client.chained_db
+    assert dumped == [db["name"] for db in rc.databases]
@@ -1,8 +1,12 @@
 import datetime
+import os
 import tempfile
+from copy import copy
 from pathlib import Path
 
-from regolith.fsclient import date_encoder, dump_json
+from regolith import fsclient
+from regolith.fsclient import FileSystemClient, date_encoder, dump_json, dump_yaml, load_yaml_cached
+from regolith.runcontrol import DEFAULT_RC
 
 
 def test_date_encoder():
@@ -43,3 +47,101 @@ def test_dump_json():
 #         json.dump(json_doc, f)
 #     actual = load_json(filename)
 #     assert actual == expected
+
+
+def test_dump_database_only_dirty(tmp_path):
+    rc = copy(DEFAULT_RC)
+    rc.builddir = str(tmp_path / "_build")
+    db = {"name": "test", "url": str(tmp_path), "path": "db", "local": True, "blacklist": [], "whitelist": []}
+    rc.databases = [db]
+    dbpath = tmp_path / "db"
+    dbpath.mkdir()
+    dump_yaml(dbpath / "people.yaml", {"me": {"_id": "me", "name": "Me"}})
+    dump_yaml(dbpath / "todos.yaml", {"me": {"_id": "me", "todos": []}})
+    client = FileSystemClient(rc)
+    client.load_database(db)
+    assert client.dump_database(db) == []
+    client.update_one("test", "todos", {"_id": "me"}, {"todos": [{"description": "test"}]})
+    assert client.dump_database(db) == [os.path.join("db", "todos.yaml")]
+    assert client.dump_database(db) == []
+    client.mark_dirty("test")
+    assert sorted(client.dump_database(db)) == [
+        os.path.join("db", "people.yaml"),
+        os.path.join("db", "todos.yaml"),
+    ]
+
+
+def test_load_yaml_cached(tmp_path, monkeypatch):
+    filename = tmp_path / "people.yaml"
+    cachedir = tmp_path / "cache"
+    dump_yaml(filename, {"me": {"_id": "me", "name": "Me", "date": datetime.date(2021, 5, 1)}})
+    expected = {"me": {"_id": "me", "name": "Me", "date": datetime.date(2021, 5, 1)}}
+    assert load_yaml_cached(filename, cachedir) == expected
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the cached documents should have been used")
+
+    monkeypatch.setattr(fsclient, "load_yaml", fail)
+    assert load_yaml_cached(filename, cachedir) == expected
+    monkeypatch.undo()
+    dump_yaml(filename, {"me": {"_id": "me", "name": "Me Again"}})
+    assert load_yaml_cached(filename, cachedir) == {"me": {"_id": "me", "name": "Me Again"}}
+    # a cache directory that cannot be created falls back to plain YAML
+    (tmp_path / "file").write_text("")
+    assert load_yaml_cached(filename, tmp_path / "file" / "cache") == {"me": {"_id": "me", "name": "Me Again"}}
+
+
+def test_dump_database_journal(tmp_path):
+    rc = copy(DEFAULT_RC)
+    rc.fs_journal = True
+    rc.builddir = str(tmp_path / "_build")
+    rc.fs_journal_max_entries = 3
+    db = {"name": "test", "url": str(tmp_path), "path": "db", "local": True, "blacklist": [], "whitelist": []}
+    rc.databases = [db]
+    dbpath = tmp_path / "db"
+    dbpath.mkdir()
+    dump_yaml(dbpath / "people.yaml", {"me": {"_id": "me", "name": "Me"}, "you": {"_id": "you", "name": "You"}})
+    base = (dbpath / "people.yaml").read_text()
+    client = FileSystemClient(rc)
+    client.load_database(db)
+    client.update_one("test", "people", {"_id": "me"}, {"date": datetime.date(2021, 5, 1)})
+    client.delete_one("test", "people", {"_id": "you"})
+    assert client.dump_database(db) == [os.path.join("db", "people.journal")]
+    assert (dbpath / "people.yaml").read_text() == base
+    assert len((dbpath / "people.journal").read_text().splitlines()) == 2
+
+    client = FileSystemClient(rc)
+    client.load_database(db)
+    assert client["test"]["people"] == {"me": {"_id": "me", "name": "Me", "date": datetime.date(2021, 5, 1)}}
+    # past the threshold the journal is folded back into the collection file
+    client.insert_many("test", "people", [{"_id": "them", "name": "Them"}, {"_id": "us", "name": "Us"}])
+    assert client.dump_database(db) == [os.path.join("db", "people.yaml"), os.path.join("db", "people.journal")]
+    assert not (dbpath / "people.journal").exists()
+    assert set(fsclient.load_yaml(dbpath / "people.yaml")) == {"me", "them", "us"}
+
+
+def test_compact(tmp_path):
+    rc = copy(DEFAULT_RC)
+    rc.fs_journal = True
+    rc.builddir = str(tmp_path / "_build")
+    db = {"name": "test", "url": str(tmp_path), "path": "db", "local": True, "blacklist": [], "whitelist": []}
+    rc.databases = [db]
+    dbpath = tmp_path / "db"
+    dbpath.mkdir()
+    dump_yaml(dbpath / "people.yaml", {"me": {"_id": "me", "name": "Me"}})
+    client = FileSystemClient(rc)
+    client.register_database(db)
+    client.load_collection(db, "people")
+    client.insert_one("test", "people", {"_id": "you", "name": "You"})
+    client.dump_database(db)
+    # a partially written last entry is ignored
+    with open(dbpath / "people.journal", "a", encoding="utf-8") as fh:
+        fh.write('{"op": "delete"')
+    client = FileSystemClient(rc)
+    client.register_database(db)
+    client.compact(db)
+    assert client.dump_database(db) == [os.path.join("db", "people.yaml"), os.path.join("db", "people.journal")]
+    assert fsclient.load_yaml(dbpath / "people.yaml") == {
+        "me": {"_id": "me", "name": "Me"},
+        "you": {"_id": "you", "name": "You"},
+    }
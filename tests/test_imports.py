@@ -0,0 +1,51 @@
+import subprocess
+import sys
+
+import pytest
+
+# generous, the point is to catch heavy modules creeping back into the import of the CLI
+IMPORT_TIME_BUDGET = 2.0  # seconds
+
+HEAVY_MODULES = [
+    "googleapiclient",
+    "google_auth_oauthlib",
+    "habanero",
+    "matplotlib",
+    "openpyxl",
+    "pandas",
+    "pymongo",
+]
+
+
+def _import_times(statement):
+    """Returns the cumulative import time, in seconds, of each module
+    imported by running the statement in a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_main_import_budget():
+    times = _import_times("import regolith.main")
+    assert times["regolith.main"] < IMPORT_TIME_BUDGET
+    assert not [m for m in HEAVY_MODULES if m in times]
+
+
+@pytest.mark.parametrize("target", ["l_todo", "u_todo", "l_milestones"])
+def test_helper_imports_only_its_module(target):
+    statement = (
+        f"import sys; from regolith.helper import HELPERS; HELPERS[{target!r}]; "
+        "print(' '.join(m for m in sys.modules if m.startswith('regolith.helpers.') or '.' not in m))"
+    )
+    proc = subprocess.run([sys.executable, "-c", statement], capture_output=True, text=True, check=True)
+    modules = set(proc.stdout.split())
+    helpers = {m for m in modules if m.startswith("regolith.helpers.")} - {"regolith.helpers.basehelper"}
+    assert len(helpers) == 1
+    assert not [m for m in HEAVY_MODULES if m in modules]
@@ -0,0 +1,189 @@
+import datetime
+from copy import copy
+
+import pytest
+
+from regolith import mongoclient
+from regolith.fsclient import JOURNAL_EXT, append_journal, dump_yaml, load_json
+from regolith.mongoclient import (
+    CHANGELOG_COLL,
+    MongoClient,
+    export_collection,
+    import_collection,
+    import_files,
+    load_collection_file,
+    load_mongo_col_cached,
+)
+from regolith.runcontrol import DEFAULT_RC
+
+mongomock = pytest.importorskip("mongomock")
+
+
+SCHEMAS = {"things": {"_id": {"type": "string", "required": True}, "n": {"type": "integer"}}}
+
+
+@pytest.fixture(autouse=True)
+def bulk_without_sort(monkeypatch):
+    # pymongo 4.9 and later pass a sort option to the update and replace
+    # operations of a bulk write, which mongomock does not take; no write
+    # of regolith sorts, so it is dropped
+    builder = mongomock.collection.BulkOperationBuilder
+    for name in ["add_update", "add_replace"]:
+
+        def add_without_sort(self, *args, _add=getattr(builder, name), sort=None, **kwargs):
+            assert sort is None
+            return _add(self, *args, **kwargs)
+
+        monkeypatch.setattr(builder, name, add_without_sort)
+
+
+@pytest.fixture
+def mock_client():
+    rc = copy(DEFAULT_RC)
+    rc.schemas = SCHEMAS
+    client = MongoClient(rc)
+    client.client = mongomock.MongoClient()
+    client.closed = False
+    client.client["test"]["things"].insert_many([{"_id": "a", "n": 1}, {"_id": "b", "n": 2}])
+    return client
+
+
+def test_write_many(mock_client):
+    coll = mock_client.client["test"]["things"]
+    result, errors = mock_client.write_many(
+        "test",
+        "things",
+        inserts=[{"_id": "c", "n": 3}, {"_id": "bad", "n": "three"}],
+        updates=[({"_id": "a"}, {"n": 10}), ({"_id": "b"}, {"n": "twenty"}), ({"_id": "d"}, {"n": 4})],
+        deletes=[{"_id": "b", "n": 2, "ignored": True}],
+        upsert=True,
+    )
+    assert set(errors) == {"bad", "b"}
+    assert (result.inserted_count, result.modified_count, result.upserted_count) == (1, 1, 1)
+    assert result.deleted_count == 1
+    assert {doc["_id"]: doc["n"] for doc in coll.find({})} == {"a": 10, "c": 3, "d": 4}
+
+
+def test_write_many_updates_loaded(mock_client):
+    db = {"name": "test", "blacklist": [], "whitelist": []}
+    loaded = mock_client.load_collection(db, "things")
+    mock_client.update_one("test", "things", {"_id": "a"}, {"n": 10})
+    mock_client.delete_one("test", "things", {"_id": "b"})
+    assert loaded == {"a": {"_id": "a", "n": 10}}
+    with pytest.raises(ValueError):
+        mock_client.update_one("test", "things", {"_id": "a"}, {"n": "ten"})
+    # a missing document is only created with upsert
+    mock_client.update_one("test", "things", {"_id": "e"}, {"n": 5})
+    assert "e" not in loaded
+    mock_client.update_one("test", "things", {"_id": "e"}, {"n": 5}, upsert=True)
+    assert loaded["e"] == {"_id": "e", "n": 5}
+    # keyword arguments for the other backends are ignored
+    mock_client.update_one("test", "things", {"_id": "e"}, {"n": 6}, bypass_document_validation=True)
+    assert loaded["e"] == {"_id": "e", "n": 6}
+    assert mock_client.client["test"]["things"].find_one({"_id": "e"}) == {"_id": "e", "n": 6}
+
+
+def test_insert_many_skips_invalid(mock_client, capsys):
+    mock_client.insert_many("test", "things", [{"_id": "c", "n": 3}, {"_id": "bad", "n": "three"}])
+    assert "ERROR in bad" in capsys.readouterr().out
+    assert sorted(doc["_id"] for doc in mock_client.client["test"]["things"].find({})) == ["a", "b", "c"]
+
+
+def test_import_collection_only_differing(mock_client):
+    coll = mock_client.client["test"]["things"]
+    docs = {"a": {"_id": "a", "n": 1}, "b": {"_id": "b", "n": 3}, "c": {"_id": "c", "n": 4}}
+    assert import_collection(coll, docs, batch_size=2) == 2
+    assert {doc["_id"]: doc["n"] for doc in coll.find({})} == {"a": 1, "b": 3, "c": 4}
+    assert import_collection(coll, docs) == 0
+
+
+def test_import_files(mock_client, tmp_path):
+    dump_yaml(tmp_path / "people.yaml", {"me": {"_id": "me", "name": "Me", "date": datetime.date(2021, 5, 1)}})
+    (tmp_path / "things.json").write_text('{"_id": "a", "n": 5}', encoding="utf-8")
+    mongodb = mock_client.client["test"]
+    import_files([str(tmp_path / "people.yaml"), str(tmp_path / "things.json")], mongodb, jobs=2)
+    assert mongodb["people"].find_one({"_id": "me"}) == {"_id": "me", "name": "Me", "date": "2021-05-01"}
+    assert mongodb["things"].find_one({"_id": "a"}) == {"_id": "a", "n": 5}
+
+
+def test_load_collection_file_journal(tmp_path):
+    filename = tmp_path / "people.yaml"
+    dump_yaml(filename, {"me": {"_id": "me", "date": datetime.date(2021, 5, 1)}, "you": {"_id": "you"}})
+    append_journal(
+        tmp_path / ("people" + JOURNAL_EXT),
+        [
+            {"op": "put", "_id": "them", "doc": {"_id": "them", "date": datetime.date(2022, 1, 2)}},
+            {"op": "delete", "_id": "you"},
+        ],
+    )
+    assert load_collection_file(str(filename)) == {
+        "me": {"_id": "me", "date": "2021-05-01"},
+        "them": {"_id": "them", "date": "2022-01-02"},
+    }
+
+
+def test_export_collection(mock_client, tmp_path):
+    filename = tmp_path / "things.json"
+    coll = mock_client.client["test"]["things"]
+    assert export_collection(coll, filename)
+    assert load_json(filename) == {"a": {"_id": "a", "n": 1}, "b": {"_id": "b", "n": 2}}
+    assert not export_collection(coll, filename)
+    coll.insert_one({"_id": "c", "n": 3})
+    assert export_collection(coll, filename)
+    assert set(load_json(filename)) == {"a", "b", "c"}
+
+
+def test_load_collection_query(mock_client):
+    mock_client.client["test"]["things"].update_one({"_id": "b"}, {"$set": {"extra": True}})
+    mock_client.rc.collection_queries = {"things": {"filter": {"n": {"$gte": 2}}, "projection": ["n"]}}
+    db = {"name": "test", "blacklist": [], "whitelist": ["things"]}
+    mock_client.load_database(db)
+    assert mock_client.dbs["test"]["things"] == {"b": {"_id": "b", "n": 2}}
+
+
+def test_load_mongo_col_cached(mock_client, tmp_path, monkeypatch):
+    cachefile = str(tmp_path / "things.pkl")
+    mongodb = mock_client.client["test"]
+    coll = mongodb["things"]
+    assert load_mongo_col_cached(coll, cachefile) == {"a": {"_id": "a", "n": 1}, "b": {"_id": "b", "n": 2}}
+
+    def fail(*args, **kwargs):
+        raise AssertionError("only the changed documents should have been fetched")
+
+    monkeypatch.setattr(mongoclient, "load_mongo_col", fail)
+    coll.update_one({"_id": "a"}, {"$set": {"n": 10}})
+    coll.delete_one({"_id": "b"})
+    coll.insert_one({"_id": "c", "n": 3})
+    mongodb[CHANGELOG_COLL].insert_many(
+        [
+            {"_id": f"things/{_id}", "coll": "things", "doc_id": _id, "updated_at": datetime.datetime(2024, 1, 1)}
+            for _id in "abc"
+        ]
+    )
+    expected = {"a": {"_id": "a", "n": 10}, "c": {"_id": "c", "n": 3}}
+    assert load_mongo_col_cached(coll, cachefile) == expected
+    assert load_mongo_col_cached(coll, cachefile) == expected
+    monkeypatch.undo()
+    # documents inserted without a stamp in the changelog are caught by their count
+    coll.insert_one({"_id": "d", "n": 4})
+    assert set(load_mongo_col_cached(coll, cachefile)) == {"a", "c", "d"}
+
+
+def test_writes_are_stamped(mock_client):
+    mock_client.update_one("test", "things", {"_id": "a"}, {"n": 10})
+    assert CHANGELOG_COLL not in mock_client.client["test"].list_collection_names()
+    mock_client.rc.mongo_cache = True
+    mock_client.update_one("test", "things", {"_id": "a"}, {"n": 10})
+    mock_client.insert_one("test", "things", {"_id": "c", "n": 3})
+    changelog = mock_client.client["test"][CHANGELOG_COLL]
+    assert sorted(change["doc_id"] for change in changelog.find({"coll": "things"})) == ["a", "c"]
+    assert all(isinstance(change["updated_at"], datetime.datetime) for change in changelog.find({}))
+    assert mock_client.collection_names("test") == ["things"]
+
+
+def test_load_collection_mongo_cache(mock_client, tmp_path):
+    mock_client.rc.mongo_cache = True
+    mock_client.rc.builddir = str(tmp_path)
+    db = {"name": "test", "url": "localhost", "blacklist": [], "whitelist": []}
+    assert set(mock_client.load_collection(db, "things")) == {"a", "b"}
+    assert len(list((tmp_path / "_mongocache").glob("*.pkl"))) == 1
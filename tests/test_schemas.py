@@ -1,4 +1,18 @@
-from regolith.schemas import _update_dict_target, insert_alloweds
+import copy
+
+from regolith.chained_db import ChainDB
+from regolith.schemas import (
+    SCHEMAS,
+    MergedSchemas,
+    _update_dict_target,
+    get_validator,
+    insert_alloweds,
+    load_schemas,
+    validate,
+    validate_collection,
+    validate_collections,
+)
+from regolith.tools import update_schemas
 
 
 def test_update_dict_target():
@@ -71,3 +85,50 @@ def test_insert_alloweds():
     }
     actual = insert_alloweds(doc, alloweds, "eallowed")
     assert actual == expected
+
+
+def test_validate_collection():
+    schemas = {"things": {"_id": {"type": "string"}, "n": {"type": "integer"}}}
+    records = {"a": {"_id": "a", "n": 1}, "b": {"_id": "b", "n": "x"}, "c": {"_id": "c", "n": 3}}
+    v = get_validator("things", schemas)
+    assert get_validator("things", schemas) is v
+    assert validate_collection("things", records, schemas) == {"b": {"n": ["must be of integer type"]}}
+    assert validate("things", records["b"], schemas)[0] is False
+    assert validate_collection("nothings", records, schemas) == {}
+    # an equal schema keeps the validator, and a different one replaces it
+    assert get_validator("things", copy.deepcopy(schemas)) is v
+    schemas["things"] = {"_id": {"type": "string"}, "n": {"type": "string"}}
+    assert get_validator("things", schemas) is not v
+    assert list(validate_collection("things", records, schemas)) == ["a", "c"]
+
+
+def test_validate_collections_jobs():
+    schemas = {"things": {"_id": {"type": "string"}, "n": {"type": "integer"}}}
+    colls = {
+        "others": {"z": {"_id": "z"}},
+        "things": {f"t{i}": ChainDB({"_id": f"t{i}", "n": i if i % 3 else str(i)}) for i in range(10)},
+    }
+    serial = validate_collections(colls, schemas)
+    parallel = validate_collections(colls, schemas, jobs=2, chunksize=3)
+    assert list(serial["things"]) == ["t0", "t3", "t6", "t9"]
+    assert serial == parallel
+    assert list(parallel) == ["others", "things"]
+
+
+def test_load_schemas_cache(tmp_path):
+    schemas = load_schemas(cachedir=str(tmp_path))
+    assert schemas == load_schemas(cachedir=None)
+    assert len(list(tmp_path.iterdir())) == 1
+    assert load_schemas(cachedir=str(tmp_path)) == schemas
+
+
+def test_merged_schemas():
+    user = {"people": {"name": {"required": False}}, "things": {"_id": {"type": "string"}}}
+    merged = MergedSchemas(SCHEMAS, user)
+    assert merged["people"]["name"]["required"] is False
+    assert merged["people"]["name"]["type"] == SCHEMAS["people"]["name"]["type"]
+    assert SCHEMAS["people"]["name"]["required"] is True
+    assert merged["things"] == user["things"]
+    assert merged["grants"] is SCHEMAS["grants"]
+    assert "things" in merged and len(merged) == len(SCHEMAS) + 1
+    assert merged == update_schemas(SCHEMAS, user)
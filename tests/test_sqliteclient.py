@@ -0,0 +1,172 @@
+import datetime
+from copy import copy
+
+import pytest
+
+from regolith.database import connect
+from regolith.fsclient import JOURNAL_EXT, append_journal, dump_json, dump_yaml, load_json, load_yaml
+from regolith.runcontrol import DEFAULT_RC
+from regolith.sqliteclient import SqliteClient, dumps, loads
+
+SCHEMAS = {
+    "people": {
+        "begin_date": {"anyof_type": ["string", "date"]},
+        "code": {"type": "string"},
+        "nested": {"type": "list", "schema": {"type": "dict", "schema": {"end_date": {"type": "date"}}}},
+    }
+}
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    rc = copy(DEFAULT_RC)
+    db = {"name": "test", "url": str(tmp_path), "path": "db", "local": True, "blacklist": [], "whitelist": []}
+    rc.databases = [db]
+    rc.schemas = SCHEMAS
+    dbpath = tmp_path / "db"
+    dbpath.mkdir()
+    dump_yaml(
+        dbpath / "people.yaml",
+        {
+            "me": {"_id": "me", "name": "Me", "begin_date": datetime.date(2020, 1, 1), "groups": ["a"]},
+            "you": {"_id": "you", "name": "You", "active": False, "code": "2021-05-01"},
+        },
+    )
+    dump_yaml(dbpath / "todos.yaml", {"me": {"_id": "me", "todos": []}})
+    client = SqliteClient(rc)
+    client.import_database(db)
+    client.close()
+    return rc, db, dbpath
+
+
+def test_dumps_loads_dates():
+    doc = {
+        "_id": "a",
+        "begin_date": datetime.date(2021, 5, 1),
+        "nested": [{"end_date": datetime.date(2021, 6, 1)}],
+    }
+    assert loads(dumps(doc), SCHEMAS["people"]) == doc
+    # only the fields declared as dates are read back as dates
+    assert loads(dumps({"code": "2021-05-01"}), SCHEMAS["people"]) == {"code": "2021-05-01"}
+    assert loads(dumps(doc))["begin_date"] == "2021-05-01"
+
+
+def test_import_load(sqlite_db):
+    rc, db, dbpath = sqlite_db
+    client = SqliteClient(rc)
+    assert (dbpath / "test.sqlite").exists()
+    assert client.available_collections(db) == ["people", "todos"]
+    client.load_database(db)
+    assert client["test"]["people"]["me"]["begin_date"] == datetime.date(2020, 1, 1)
+    assert client["test"]["people"]["you"]["active"] is False
+    assert client.dump_database(db) == []
+    client.close()
+
+
+def test_import_replays_journal(sqlite_db):
+    rc, db, dbpath = sqlite_db
+    append_journal(
+        dbpath / ("people" + JOURNAL_EXT),
+        [{"op": "put", "_id": "them", "doc": {"_id": "them", "name": "Them"}}, {"op": "delete", "_id": "you"}],
+    )
+    client = SqliteClient(rc)
+    client.import_database(db)
+    assert set(client.load_collection(db, "people")) == {"me", "them"}
+    client.close()
+
+
+def test_load_collection_lazily(sqlite_db):
+    rc, db, _ = sqlite_db
+    client = SqliteClient(rc)
+    client.register_database(db)
+    assert dict(client["test"]) == {}
+    assert set(client.load_collection(db, "todos")) == {"me"}
+    assert list(client["test"]) == ["todos"]
+    assert client.load_collection(db, "missing") is None
+    client.close()
+
+
+def test_writes(sqlite_db):
+    rc, db, _ = sqlite_db
+    client = SqliteClient(rc)
+    client.load_database(db)
+    assert client.find_one("test", "people", {"name": "Me"})["_id"] == "me"
+    assert client.find_one("test", "people", {"begin_date": datetime.date(2020, 1, 1)})["_id"] == "me"
+    assert client.find_one("test", "people", {"active": False})["_id"] == "you"
+    assert client.find_one("test", "people", {"groups": ["a"]})["_id"] == "me"
+    assert client.find_one("test", "people", {"name": "Nobody"}) is None
+    client.insert_one("test", "people", {"_id": "them", "name": "Them"})
+    client.update_one("test", "people", {"_id": "me"}, {"name": "Myself"})
+    client.delete_one("test", "people", {"_id": "you"})
+    client.insert_many("test", "projects", [{"_id": "p1"}, {"_id": "p2"}])
+    assert set(client["test"]["people"]) == {"me", "them"}
+    assert client.dump_database(db) == ["db/test.sqlite"]
+    client.close()
+
+    client = SqliteClient(rc)
+    client.load_database(db)
+    people = client["test"]["people"]
+    assert set(people) == {"me", "them"}
+    assert people["me"]["name"] == "Myself"
+    assert people["me"]["groups"] == ["a"]
+    assert set(client["test"]["projects"]) == {"p1", "p2"}
+    client.close()
+
+
+def test_mark_dirty(sqlite_db):
+    rc, db, _ = sqlite_db
+    client = SqliteClient(rc)
+    client.load_database(db)
+    client["test"]["people"]["me"]["files"] = {"cv": "cv.pdf"}
+    client.mark_dirty("test", "people", "me")
+    client.close()
+    client = SqliteClient(rc)
+    assert client.load_collection(db, "people")["me"]["files"] == {"cv": "cv.pdf"}
+    client.close()
+
+
+def test_export(sqlite_db):
+    rc, db, dbpath = sqlite_db
+    client = SqliteClient(rc)
+    client.load_database(db)
+    client.insert_one("test", "people", {"_id": "them", "name": "Them"})
+    (dbpath / "people.yaml").unlink()
+    client.export_database(db)
+    client.close()
+    people = load_yaml(dbpath / "people.yaml")
+    assert set(people) == {"me", "them", "you"}
+    assert people["me"]["begin_date"] == datetime.date(2020, 1, 1)
+    assert people["you"]["code"] == "2021-05-01"
+
+
+def test_export_round_trip(tmp_path):
+    rc = copy(DEFAULT_RC)
+    db = {"name": "test", "url": str(tmp_path), "path": "db", "local": True, "blacklist": [], "whitelist": []}
+    rc.databases = [db]
+    rc.schemas = SCHEMAS
+    dbpath = tmp_path / "db"
+    dbpath.mkdir()
+    dump_json(dbpath / "things.json", {"a": {"_id": "a", "n": 1}})
+    dump_yaml(dbpath / "people.yml", {"me": {"_id": "me", "begin_date": datetime.date(2020, 1, 1)}})
+    append_journal(dbpath / ("things" + JOURNAL_EXT), [{"op": "put", "_id": "b", "doc": {"_id": "b", "n": 2}}])
+    client = SqliteClient(rc)
+    client.import_database(db)
+    client.insert_one("test", "todos", {"_id": "me", "todos": []})
+    client.export_database(db)
+    client.close()
+    assert sorted(p.name for p in dbpath.iterdir()) == ["people.yml", "test.sqlite", "things.json", "todos.yaml"]
+    assert load_json(dbpath / "things.json") == {"a": {"_id": "a", "n": 1}, "b": {"_id": "b", "n": 2}}
+    assert load_yaml(dbpath / "people.yml")["me"]["begin_date"] == datetime.date(2020, 1, 1)
+
+
+def test_connect(sqlite_db):
+    rc, db, _ = sqlite_db
+    db["backend"] = "sqlite"
+    with connect(rc) as client:
+        assert client.chained_db["people"]["me"]["name"] == "Me"
+        assert client.chained_db["todos"]["me"]["todos"] == []
+        client.update_one("test", "todos", {"_id": "me"}, {"todos": [{"description": "test"}]})
+        assert client.chained_db["todos"]["me"]["todos"] == [{"description": "test"}]
+    client = SqliteClient(rc)
+    assert client.load_collection(db, "todos")["me"]["todos"] == [{"description": "test"}]
+    client.close()
@@ -0,0 +1,46 @@
+import copy
+import json
+
+from regolith.main import main
+from regolith.runcontrol import DEFAULT_RC
+from regolith.templating import BYTECODE_CACHE_DIR, compile_templates, shared_environment
+
+
+def test_shared_environment(tmp_path, monkeypatch):
+    rc = copy.copy(DEFAULT_RC)
+    rc.builddir = str(tmp_path / "_build")
+    (tmp_path / "templates").mkdir()
+    (tmp_path / "templates" / "hello.txt").write_text("{% if True %}\nhello {{ name }}\n{% endif %}\n")
+    monkeypatch.chdir(tmp_path)
+    env = shared_environment(rc)
+    assert shared_environment(rc) is env
+    trimmed = shared_environment(rc, trim_blocks=True)
+    assert trimmed is not env
+    assert env.get_template("hello.txt").render(name="me") == "\nhello me\n"
+    assert trimmed.get_template("hello.txt").render(name="me") == "hello me\n"
+    # a different working directory has templates of its own
+    other = tmp_path / "other"
+    other.mkdir()
+    monkeypatch.chdir(other)
+    assert shared_environment(rc, ["templates"]) is not env
+    assert len(list((tmp_path / "_build" / BYTECODE_CACHE_DIR).rglob("*.cache"))) == 2
+
+
+def test_compile_templates(tmp_path, monkeypatch):
+    rc = copy.copy(DEFAULT_RC)
+    rc.builddir = str(tmp_path / "_build")
+    monkeypatch.chdir(tmp_path)
+    names = compile_templates(shared_environment(rc))
+    assert "cv.tex" in names and "base.html" in names
+    assert "reimb.xlsx" not in names
+    assert len(list((tmp_path / "_build" / BYTECODE_CACHE_DIR).glob("*.cache"))) == len(names)
+
+
+def test_compile_templates_command(tmp_path, monkeypatch):
+    (tmp_path / "regolithrc.json").write_text(json.dumps({"builddir": "out", "databases": []}))
+    monkeypatch.chdir(tmp_path)
+    main(["compile-templates"])
+    assert list((tmp_path / "out" / BYTECODE_CACHE_DIR).glob("*.cache"))
+    main(["compile-templates", "--builddir", "other"])
+    assert list((tmp_path / "other" / BYTECODE_CACHE_DIR).glob("*.cache"))
+    assert not (tmp_path / "_build").exists()
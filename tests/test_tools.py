@@ -5,17 +5,25 @@ import habanero
 import pytest
 import requests_mock
 
+from regolith.database import connect
+from regolith.dates import is_current
 from regolith.runcontrol import DEFAULT_RC
 from regolith.tools import (
     MISSING_INFO,
+    AliasIndex,
+    CitationIndex,
+    appointment_segments,
     awards_grants_honors,
     collect_appts,
+    collection_alias_index,
+    collection_citation_index,
     collection_str,
     compound_dict,
     compound_list,
     create_repo,
     date_to_rfc822,
     dereference_institution,
+    dereference_institution_from_collection,
     filter_employment_for_advisees,
     filter_presentations,
     filter_publications,
@@ -25,9 +33,11 @@ from regolith.tools import (
     fuzzy_retrieval,
     get_appointments,
     get_formatted_crossref_reference,
+    get_id_from_collection,
     get_id_from_name,
     get_person_affiliation,
     get_person_contact,
+    get_person_contact_from_collections,
     get_tags,
     get_target_repo_info,
     get_target_token,
@@ -46,6 +56,7 @@ from regolith.tools import (
     month_and_year,
     number_suffix,
     remove_duplicate_docs,
+    retrieve_from_collection,
     search_collection,
     string_to_slice,
     strip_str,
@@ -357,6 +368,27 @@ def test_author_publications():
     filter_publications(citations, {"SJLB"})
 
 
+def test_citation_index():
+    citations = [
+        {"_id": "a", "author": ["CJ", "SJLB"], "year": 2019, "grant": "dmref15"},
+        {"_id": "b", "author": ["AMS"], "editor": ["SJLB"], "year": 2021, "facility": "nslsii"},
+        {"_id": "c", "author": ["AMS"], "year": 2020},
+    ]
+    index = CitationIndex(citations)
+    assert index.by_names({"SJLB"}) == [0, 1]
+    assert index.by_names({"AMS", "CJ"}) == [0, 1, 2]
+    assert index.date(2) == dt.date(2020, 12, 28)
+    assert index.has_grant(0, "dmref15")
+    assert not index.has_grant(1, "dmref15")
+    assert index.has_facility(1, "nslsii")
+    pubs = filter_publications(index, {"SJLB"}, bold=False, since=dt.date(2020, 1, 1))
+    assert [pub["_id"] for pub in pubs] == ["b"]
+    assert pubs[0] is not citations[1]
+    pubs = filter_publications(citations, {"SJLB", "AMS"}, grants=["other", "dmref15"])
+    assert [pub["_id"] for pub in pubs] == ["a"]
+    assert citations[0]["author"] == ["CJ", "SJLB"]
+
+
 def test_fuzzy_retrieval():
     person = {
         "_id": "scopatz",
@@ -382,6 +414,81 @@ def test_fuzzy_retrieval():
     )
 
 
+def test_fuzzy_retrieval_index():
+    people = [
+        {"_id": "scopatz", "aka": ["Scopatz, A"], "name": "Anthony Scopatz"},
+        {"_id": "other", "aka": ["Scopatz, A"], "name": "Another Scopatz"},
+        {"_id": "sbillinge", "name": "Simon Billinge"},
+    ]
+    index = AliasIndex(people, ["aka", "name", "_id"], case_sensitive=False)
+    assert index.get("SCOPATZ, A") is people[0]
+    assert index.get("another scopatz") is people[1]
+    assert index.get(3) is None
+
+
+def test_collection_indexes(tmp_path):
+    rc = copy.copy(DEFAULT_RC)
+    db = {"name": "test", "url": str(tmp_path), "path": "db", "local": True, "blacklist": [], "whitelist": []}
+    rc.databases = [db]
+    rc.builddir = str(tmp_path / "_build")
+    (tmp_path / "db").mkdir()
+    (tmp_path / "db" / "people.yaml").write_text("scopatz:\n  name: Anthony Scopatz\n  aka: ['Scopatz, A']\n")
+    (tmp_path / "db" / "institutions.yaml").write_text("columbiau:\n  name: Columbia University\n")
+    (tmp_path / "db" / "citations.yaml").write_text("a:\n  author: ['Scopatz, A']\n  year: 2020\n")
+    with connect(rc) as client:
+        index = collection_alias_index(client, "people", ["aka", "name", "_id"], case_sensitive=False)
+        assert collection_alias_index(client, "people", ["aka", "name", "_id"], case_sensitive=False) is index
+        person = retrieve_from_collection(
+            client, "people", ["aka", "name", "_id"], "scopatz, a", case_sensitive=False
+        )
+        assert person["name"] == "Anthony Scopatz"
+        person["name"] = "changed"
+        assert index.get("scopatz")["name"] == "Anthony Scopatz"
+        citations = collection_citation_index(client)
+        institutions = collection_alias_index(client, "institutions", ["_id"])
+        assert [pub["_id"] for pub in filter_publications(citations, {"Scopatz, A"})] == ["a"]
+        # a write only drops the indexes of the collection written to
+        client.insert_one("test", "people", {"_id": "sbillinge", "name": "Simon Billinge"})
+        assert collection_alias_index(client, "people", ["aka", "name", "_id"], case_sensitive=False) is not index
+        assert retrieve_from_collection(client, "people", ["name"], "Simon Billinge")["_id"] == "sbillinge"
+        assert collection_citation_index(client) is citations
+        assert collection_alias_index(client, "institutions", ["_id"]) is institutions
+
+
+def test_lookups_from_collection(tmp_path):
+    rc = copy.copy(DEFAULT_RC)
+    db = {"name": "test", "url": str(tmp_path), "path": "db", "local": True, "blacklist": [], "whitelist": []}
+    rc.databases = [db]
+    rc.builddir = str(tmp_path / "_build")
+    (tmp_path / "db").mkdir()
+    (tmp_path / "db" / "people.yaml").write_text("scopatz:\n  name: Anthony Scopatz\n  aka: ['Scopatz, A']\n")
+    (tmp_path / "db" / "contacts.yaml").write_text("afriend:\n  name: A Friend\n")
+    (tmp_path / "db" / "institutions.yaml").write_text(
+        "columbiau:\n  name: Columbia University\n  city: New York\n  country: USA\n  state: NY\n"
+        "  departments:\n    apam:\n      name: Applied Physics\n      aka: [APAM]\n"
+    )
+    with connect(rc) as client:
+        assert get_id_from_collection(client, "people", "scopatz, a") == "scopatz"
+        assert get_person_contact_from_collections(client, "a friend")["_id"] == "afriend"
+        assert get_person_contact_from_collections(client, "nobody") is None
+        record = {"institution": "Columbia University", "department": "APAM"}
+        dereference_institution_from_collection(client, "institutions", record)
+        assert record["city"] == "New York" and record["department"] == "Applied Physics"
+        # the lookups share the index of the collection, and leave its documents as they were
+        index = collection_alias_index(client, "institutions", ["name", "_id", "aka"])
+        assert index.get("columbiau")["departments"]["apam"] == {"name": "Applied Physics", "aka": ["APAM"]}
+        dereference_institution_from_collection(client, "institutions", {"institution": "columbiau"})
+        assert collection_alias_index(client, "institutions", ["name", "_id", "aka"]) is index
+        # and see the documents written since
+        client.insert_one(
+            "test", "institutions", {"_id": "upenn", "name": "UPenn", "city": "Philly", "country": "USA"}
+        )
+        record = {"institution": "UPenn"}
+        dereference_institution_from_collection(client, "institutions", record)
+        assert record["city"] == "Philly"
+        assert collection_alias_index(client, "institutions", ["name", "_id", "aka"]) is not index
+
+
 def test_get_formatted_crossref_reference(monkeypatch):
     def mockreturn(*args, **kwargs):
         mock_article = {
@@ -3977,3 +4084,59 @@ def test_get_person_affiliation_skips_not_in_cv(name_or_id, expected_department,
     actual = get_person_affiliation(name_or_id, AFFILIATION_PEOPLE, AFFILIATION_CONTACTS, AFFILIATION_INSTITUTIONS)
     assert actual["department"] == expected_department
     assert actual["institution"] == expected_institution
+
+
+def test_appointment_segments():
+    a = {"begin_date": "2020-01-03", "end_date": "2020-01-05", "loading": 0.5}
+    b = {"begin_date": "2020-01-05", "loading": 0.5}
+    intervals = [
+        (dt.date(2020, 1, 3).toordinal(), dt.date(2020, 1, 5).toordinal(), a),
+        (dt.date(2020, 1, 5).toordinal(), dt.date(5000, 12, 31).toordinal(), b),
+    ]
+    begin, end = dt.date(2020, 1, 1).toordinal(), dt.date(2020, 1, 10).toordinal()
+    segments = appointment_segments(intervals, begin, end)
+    assert [(s - begin, e - begin, current) for s, e, current in segments] == [
+        (0, 1, []),
+        (2, 3, [a]),
+        (4, 4, [a, b]),
+        (5, 9, [b]),
+    ]
+
+
+def test_grant_burn_matches_daily_sum():
+    grant = {
+        "_id": "g",
+        "budget": [
+            {"begin_date": "2020-01-01", "end_date": "2020-06-30", "student_months": 12, "postdoc_months": 6},
+            {"begin_date": "2020-07-01", "end_date": "2020-12-31", "ss_months": 3, "postdoc_writeoff": 1},
+        ],
+    }
+    appts = [
+        {"grant": "g", "type": t, "loading": load, "begin_date": b, "end_date": e}
+        for t, load, b, e in [
+            ("gra", 0.75, "2020-01-15", "2020-08-31"),
+            ("gra", 0.25, "2020-03-01", "2020-03-31"),
+            ("pd", 1.0, "2020-05-01", "2020-11-30"),
+            ("ss", 0.5, "2019-12-01", "2021-02-28"),
+        ]
+    ]
+    appts.append({"grant": "other", "type": "gra", "loading": 1.0, "begin_date": "2020-01-01"})
+    expected, vals = {}, {"gra": 0.0, "pd": 0.0, "ss": 0.0}
+    for period in grant["budget"]:
+        vals["gra"] += period.get("student_months", 0) * 30.5
+        vals["pd"] += (period.get("postdoc_months", 0) - period.get("postdoc_writeoff", 0)) * 30.5
+        vals["ss"] += period.get("ss_months", 0) * 30.5
+        day = dt.date.fromisoformat(period["begin_date"])
+        while day <= dt.date.fromisoformat(period["end_date"]):
+            for a in appts:
+                if a["grant"] == "g" and is_current(a, now=day):
+                    vals[a["type"]] -= a["loading"]
+            expected[day] = {
+                "student_days": round(vals["gra"], 2),
+                "postdoc_days": round(vals["pd"], 2),
+                "ss_days": round(vals["ss"], 2),
+            }
+            day += dt.timedelta(days=1)
+    assert grant_burn(grant, appts) == expected
+    window = grant_burn(grant, appts, begin_date="2020-06-29", end_date="2020-07-02")
+    assert window == {d: v for d, v in expected.items() if dt.date(2020, 6, 29) <= d <= dt.date(2020, 7, 2)}